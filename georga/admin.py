@@ -1,9 +1,17 @@
 # For copyright and license terms, see COPYRIGHT.md (top level of repository)
 # Repository: https://github.com/georga-app/georga-server-django
 
-from django.contrib import admin
+from os.path import splitext
+
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django_fsm import FSMField
 
+from .importer import FORMATS, PersonImport, read_rows
+
 # Register your models here.
 from .models import (
     ACE,
@@ -53,6 +61,56 @@ class GeorgaModelAdmin(UUIDModelAdmin, TimestampsModelAdmin, FSMModelAdmin):
     pass
 
 
+class PersonImportForm(forms.Form):
+    file = forms.FileField(help_text=f"{'/'.join(FORMATS)} file with a header row of column names")
+    organization = forms.ModelChoiceField(queryset=Organization.objects.all())
+    defer_passwords = forms.BooleanField(
+        required=False, help_text="Ignore the password column, persons set their password via password reset")
+    schedule_activation = forms.BooleanField(required=False, initial=True)
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        file_format = splitext(file.name)[1].lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise forms.ValidationError(f"Unknown format '{file_format}'")
+        file.format = file_format
+        return file
+
+
+class PersonModelAdmin(GeorgaModelAdmin):
+    change_list_template = 'admin/georga/person/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='georga_person_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:georga_person_changelist')
+        form = PersonImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            importer = PersonImport(
+                form.cleaned_data['organization'],
+                defer_passwords=form.cleaned_data['defer_passwords'],
+                schedule_activation=form.cleaned_data['schedule_activation'],
+            )
+            file = form.cleaned_data['file']
+            importer.run(read_rows(file.file, file.format))
+            messages.success(
+                request, f"created: {importer.created}, skipped: {importer.skipped}, invalid: {len(importer.errors)}")
+            for line, errors in importer.errors[:10]:
+                messages.warning(request, f"line {line}: {' '.join(errors)}")
+            return redirect('admin:georga_person_changelist')
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title="Import persons",
+            form=form,
+        )
+        return TemplateResponse(request, 'admin/georga/person/import.html', context)
+
+
 admin.site.register(ACE, GeorgaModelAdmin)
 admin.site.register(Device, GeorgaModelAdmin)
 admin.site.register(Equipment, GeorgaModelAdmin)
@@ -62,7 +120,7 @@ admin.site.register(Message, GeorgaModelAdmin)
 admin.site.register(Operation, GeorgaModelAdmin)
 admin.site.register(Organization, GeorgaModelAdmin)
 admin.site.register(Participant, GeorgaModelAdmin)
-admin.site.register(Person, GeorgaModelAdmin)
+admin.site.register(Person, PersonModelAdmin)
 admin.site.register(PersonProperty, GeorgaModelAdmin)
 admin.site.register(PersonPropertyGroup, GeorgaModelAdmin)
 admin.site.register(PersonToObject, GeorgaModelAdmin)
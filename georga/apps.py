@@ -7,3 +7,6 @@ from django.apps import AppConfig
 class GeorgaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'georga'
+
+    def ready(self):
+        from . import signals  # noqa
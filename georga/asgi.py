@@ -9,21 +9,84 @@ For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
+import asyncio
+import logging
 import os
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
 from django.core.asgi import get_asgi_application
 from django.urls import path
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels_graphql_ws import GraphqlWsConsumer
+from graphql_jwt.exceptions import PermissionDenied
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.shortcuts import get_user_by_token
 
-from .schemas import schema
+from .backpressure import SendQueue, websocket_connections
+from .models import Person
+from .schemas import PresenceChangedSubscription, schema
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'georga.settings')
 
+logger = logging.getLogger(__name__)
+
+# close code for slow consumers (4000-4999 are available for applications)
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
 
 class MyGraphqlWsConsumer(GraphqlWsConsumer):
-    """Channels WebSocket consumer which provides GraphQL API."""
+    """
+    Channels WebSocket consumer which provides GraphQL API.
+
+    Authentication:
+    - The JWT is sent in the payload of the `connection_init` message, e.g.
+      `{"Authorization": "JWT <token>"}` or `{"token": "<token>"}`.
+      Connections with invalid tokens are rejected, connections without
+      token keep the user of the session.
+
+    User context:
+    - The Person is cached in `scope['user']` for the lifetime of the
+      connection, including its cached permission id sets.
+    - Before each operation and with each heartbeat, only the
+      `Person.permission_version` is fetched from the cache. The Person is
+      reloaded, if it has changed, and the groups of the active
+      subscriptions are updated for the new permissions.
+
+    Presence:
+    - The presence of the user for the operations of its `presenceChanged`
+      subscriptions (`scope['presence']`) is refreshed by heartbeats every
+      third of `settings.SUBSCRIPTION_PRESENCE_TTL` and withdrawn on
+      disconnect.
+
+    Backpressure:
+    - Outgoing messages are queued per connection and sent by a writer task
+      (see `SendQueue`). If `settings.SUBSCRIPTION_SEND_QUEUE_LIMIT`
+      messages are queued, `settings.SUBSCRIPTION_SLOW_CONSUMER_POLICY`
+      applies to further notifications: drop oldest, coalesce or disconnect.
+    - The ASGI server accepts messages without waiting for the client, so
+      clients acknowledge the received bytes, if they announce it with
+      `{"ack": true}` in the connection_init payload: The server sends
+      `{"type": "ping", "payload": {"bytes": <sent>}}` and the client replies
+      with `{"type": "pong", "payload": {"bytes": <sent>}}`. At most
+      `settings.SUBSCRIPTION_SEND_WINDOW` bytes are sent unacknowledged,
+      further messages are queued. Clients not acknowledging within
+      `settings.SUBSCRIPTION_ACK_TIMEOUT` seconds are disconnected.
+    - Clients without acknowledgements (plain graphql-ws clients) are not
+      flow controlled, their queue fills only if the event loop lags behind.
+    - Queue depth, unacknowledged bytes, send latencies, dropped and
+      coalesced notifications are tracked per connection and for the
+      process (see `ConnectionRegistry`).
+    """
     schema = schema
+    presence_task = None
+    send_queue = None
+    send_task = None
+    slow_consumer = False
+    flow_control = False
 
     # Uncomment to send keepalive message every 42 seconds.
     # send_keepalive_every = 42
@@ -32,14 +95,169 @@ class MyGraphqlWsConsumer(GraphqlWsConsumer):
     # strict_ordering = True
 
     async def on_connect(self, payload):
-        """New client connection handler."""
-        # You can `raise` from here to reject the connection.
-        print("New client connected!")
+        """Authenticates the JWT of the connection_init payload."""
+        self.flow_control = isinstance(payload, dict) and payload.get('ack') is True
+        token = self.get_token(payload)
+        if token:
+            self.scope['user'] = await database_sync_to_async(get_user_by_token)(token)
+        await database_sync_to_async(self.load_user_context)()
+        self.presence_task = asyncio.create_task(self.presence_heartbeat())
+
+    async def disconnect(self, code):
+        """Stops the heartbeats and the writer and withdraws the presence."""
+        if self.presence_task:
+            self.presence_task.cancel()
+        if self.send_task:
+            self.send_task.cancel()
+        websocket_connections.close(self.channel_name, disconnected=self.slow_consumer)
+        await super().disconnect(code)
+        await sync_to_async(PresenceChangedSubscription.leave_all, thread_sensitive=False)(
+            self.scope, self.channel_name)
+
+    async def send_json(self, content, close=False):
+        """Queues the message, applies the slow consumer policy if needed."""
+        if self.slow_consumer:
+            return
+        if self.send_queue is None:
+            self.send_queue = SendQueue(
+                settings.SUBSCRIPTION_SEND_QUEUE_LIMIT, settings.SUBSCRIPTION_SLOW_CONSUMER_POLICY,
+                settings.SUBSCRIPTION_SEND_WINDOW if self.flow_control else None)
+            user = self.scope.get('user')
+            websocket_connections.open(self.channel_name, user and user.id, self.send_queue)
+            self.send_task = asyncio.create_task(self.send_messages())
+        droppable = content.get('type') == 'data' and content.get('id') in self._subscriptions
+        if not self.send_queue.put(content, droppable):
+            await self.close_slow_consumer()
+        elif close:
+            await self.close()
+
+    async def send_messages(self):
+        """Sends the queued messages one by one within the window of unacknowledged bytes."""
+        while True:
+            message, queued = await self.send_queue.get()
+            text = await self.encode_json(message)
+            await self.send(text_data=text)
+            self.send_queue.record(queued, len(text.encode()))
+            ping = self.send_queue.ping()
+            if ping:
+                await self.send(text_data=await self.encode_json(ping))
+            if self.send_queue.blocked and not await self.send_queue.wait_credit(settings.SUBSCRIPTION_ACK_TIMEOUT):
+                # pending messages are not sent anymore
+                self.send_queue.idle.set()
+                await self.close_slow_consumer()
+                return
+
+    async def close_slow_consumer(self):
+        logger.warning("Closing slow consumer %s", self.channel_name)
+        self.slow_consumer = True
+        await super().close(code=SLOW_CONSUMER_CLOSE_CODE)
+
+    async def receive_json(self, content):
+        """Records the acknowledgements of the client."""
+        if isinstance(content, dict) and content.get('type') == 'pong':
+            if self.send_queue is not None:
+                self.send_queue.ack((content.get('payload') or {}).get('bytes'))
+            return
+        await super().receive_json(content)
+
+    async def close(self, code=None, reason=None):
+        """Sends the queued messages before closing."""
+        if self.send_task is not None and not self.send_task.done():
+            await self.send_queue.idle.wait()
+        await super().close(code, reason)
+
+    async def presence_heartbeat(self):
+        """Refreshes the user context and the presence of the user."""
+        while True:
+            await asyncio.sleep(settings.SUBSCRIPTION_PRESENCE_TTL / 3)
+            await self.refresh_context()
+            await sync_to_async(PresenceChangedSubscription.heartbeat, thread_sensitive=False)(
+                self.scope, self.channel_name)
+
+    async def on_operation(self, op_id, payload):
+        """Refreshes the user context, if the permission version changed."""
+        await self.refresh_context()
+
+    async def refresh_context(self):
+        """Reloads the user and updates the groups, if the permission version changed."""
+        if await database_sync_to_async(self.refresh_user_context)():
+            await self.refresh_groups()
+
+    async def refresh_groups(self):
+        """
+        Updates the groups of the active subscriptions for the reloaded user.
+
+        Subscriptions register the functions returning their groups (see
+        `track_groups()`). Groups the user lost are left, new ones joined,
+        subscriptions the user may not subscribe to anymore are stopped.
+        """
+        # pylint: disable=protected-access
+        tracked = self.scope.get('subscription_groups', {})
+        for op_id, (subscription, get_groups) in list(tracked.items()):
+            subinf = self._subscriptions.get(op_id)
+            if subinf is None:
+                del tracked[op_id]
+                continue
+            try:
+                groups = await database_sync_to_async(get_groups)(self.scope['user'])
+            except PermissionDenied:
+                del tracked[op_id]
+                await self._on_gql_stop(op_id)
+                continue
+            groups = [subscription._group_name(), *(subscription._group_name(group) for group in groups)]
+            for group in set(subinf.groups) - set(groups):
+                self._sids_by_group[group].remove(op_id)
+                if not self._sids_by_group[group]:
+                    del self._sids_by_group[group]
+                    await self._channel_layer.group_discard(group, self.channel_name)
+            for group in set(groups) - set(subinf.groups):
+                if not self._sids_by_group.get(group):
+                    await self._channel_layer.group_add(group, self.channel_name)
+                self._sids_by_group.setdefault(group, []).append(op_id)
+            subinf.groups = groups
+
+    @staticmethod
+    def get_token(payload):
+        """Returns the JWT of the connection_init payload or None."""
+        if not isinstance(payload, dict):
+            return None
+        if payload.get('token'):
+            return payload['token']
+        header = payload.get('Authorization') or payload.get('authorization') or ''
+        prefix, _, token = header.partition(' ')
+        if prefix == jwt_settings.JWT_AUTH_HEADER_PREFIX and token:
+            return token
+        return None
+
+    def load_user_context(self):
+        """Caches the permission version and id sets of the user."""
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            return
+        # fetch the version first to miss no changes while loading
+        self.scope['permission_version'] = user.permission_version
+        user.permission_fingerprint
+
+    def refresh_user_context(self):
+        """
+        Reloads the user, if its permission version changed.
+
+        Returns:
+            bool: True if the user was reloaded.
+        """
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            return False
+        if user.permission_version == self.scope.get('permission_version'):
+            return False
+        self.scope['user'] = Person.objects.filter(pk=user.pk, is_active=True).first() or AnonymousUser()
+        self.load_user_context()
+        return True
 
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": URLRouter([
+    "websocket": AuthMiddlewareStack(URLRouter([
         path("graphql", MyGraphqlWsConsumer.as_asgi()),
-    ])
+    ]))
 })
@@ -0,0 +1,299 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+# slow consumer policies of SendQueue
+POLICIES = ['drop_oldest', 'coalesce', 'disconnect']
+
+
+class SendQueue:
+    """
+    Bounded queue of the outgoing messages of a websocket connection.
+
+    Messages are sent one by one by a writer task, so a lagging writer delays
+    only its own messages. If `limit` messages are queued, the slow consumer
+    policy applies to droppable messages (subscription notifications):
+
+    - `drop_oldest`: The oldest queued notification is dropped.
+    - `coalesce`: A queued notification of the same subscription and object
+      (`id` field) is replaced by the new one, otherwise the oldest queued
+      notification is dropped. Created objects keep the CREATED action.
+    - `disconnect`: The connection is closed.
+
+    Other messages (e.g. acknowledgements, query results) are always queued.
+
+    Flow control: ASGI servers like Daphne buffer outgoing websocket frames
+    without blocking, so the acknowledgements of the client are the only
+    signal of a slow client. With a `window`, the writer sends at most
+    `window` bytes not acknowledged by the client yet. It then requests an
+    acknowledgement (`ping()`) and waits for it (`ack()`), so the messages of
+    a slow client pile up in the queue, where the policy applies. A client not
+    acknowledging within a timeout is stalled (see `wait_credit()`). Without
+    a window, the queue fills only if the writer lags behind on the event
+    loop.
+
+    Args:
+        limit (int): Number of queued messages to apply the policy from.
+        policy (str): One of `POLICIES`.
+        window (int): Maximum number of unacknowledged bytes, None to disable
+            flow control.
+    """
+    def __init__(self, limit, policy, window=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}', valid policies: {', '.join(POLICIES)}")
+        self.limit = limit
+        self.policy = policy
+        self.window = window
+        self.credit = asyncio.Event()
+        self.credit.set()
+        self.sent_bytes = 0
+        self.acked_bytes = 0
+        self.pinged_bytes = 0
+        self.entries = deque()
+        self.keys = {}
+        self.ready = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        # metrics
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @staticmethod
+    def key(message):
+        """Returns the subscription and object of a notification or None."""
+        data = (message.get('payload') or {}).get('data')
+        if not isinstance(data, dict) or len(data) != 1:
+            return None
+        fields = next(iter(data.values()))
+        if not isinstance(fields, dict) or not fields.get('id'):
+            return None
+        return message.get('id'), fields['id']
+
+    def put(self, message, droppable=False):
+        """
+        Queues a message.
+
+        Args:
+            message (dict): JSON message.
+            droppable (bool): True for subscription notifications.
+
+        Returns:
+            bool: False if the connection has to be closed.
+        """
+        key = droppable and self.key(message)
+        if droppable and len(self.entries) >= self.limit:
+            if self.policy == 'disconnect':
+                return False
+            if self.policy == 'coalesce' and key in self.keys:
+                entry = self.keys[key]
+                entry[1] = self.merge(entry[1], message)
+                self.coalesced += 1
+                return True
+            self.drop_oldest()
+        entry = [key, message, time.monotonic(), droppable]
+        if key:
+            self.keys[key] = entry
+        self.entries.append(entry)
+        self.ready.set()
+        self.idle.clear()
+        return True
+
+    @staticmethod
+    def merge(queued, message):
+        """Returns the new notification, keeping the CREATED action of the queued one."""
+        name, fields = next(iter(message['payload']['data'].items()))
+        previous = queued['payload']['data'][name].get('action')
+        if previous != 'CREATED' or fields.get('action') != 'UPDATED':
+            return message
+        payload = dict(message['payload'], data={name: dict(fields, action=previous)})
+        return dict(message, payload=payload)
+
+    def drop_oldest(self):
+        for entry in self.entries:
+            if entry[3]:
+                self.entries.remove(entry)
+                self.forget(entry)
+                self.dropped += 1
+                return
+
+    def forget(self, entry):
+        if entry[0] and self.keys.get(entry[0]) is entry:
+            del self.keys[entry[0]]
+
+    async def get(self):
+        """
+        Returns the next message to send.
+
+        Returns:
+            tuple(dict, float): Message and its queuing time (monotonic).
+        """
+        while not self.entries:
+            self.ready.clear()
+            await self.ready.wait()
+        entry = self.entries.popleft()
+        self.forget(entry)
+        return entry[1], entry[2]
+
+    def record(self, queued, size=0):
+        """Records the latency and size of a message sent, queued at `queued`."""
+        latency = time.monotonic() - queued
+        self.sent += 1
+        self.sent_bytes += size
+        if self.blocked:
+            self.credit.clear()
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        if not self.entries:
+            self.idle.set()
+
+    @property
+    def unacked(self):
+        """int: Number of bytes sent, but not acknowledged by the client, None without flow control."""
+        if self.window is None:
+            return None
+        return self.sent_bytes - self.acked_bytes
+
+    @property
+    def blocked(self):
+        """bool: True if the window is exhausted."""
+        return self.window is not None and self.unacked >= self.window
+
+    def ping(self):
+        """
+        Returns an acknowledgement request for the bytes sent, if due.
+
+        Requests are due for each quarter of the window and when the window is
+        exhausted.
+
+        Returns:
+            dict|None: JSON message or None.
+        """
+        if self.window is None or self.pinged_bytes == self.sent_bytes:
+            return None
+        if not self.blocked and self.sent_bytes - self.pinged_bytes < self.window / 4:
+            return None
+        self.pinged_bytes = self.sent_bytes
+        return {'type': 'ping', 'payload': {'bytes': self.sent_bytes}}
+
+    def ack(self, size):
+        """Records the acknowledgement of the client for `size` bytes sent."""
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            return
+        self.acked_bytes = max(self.acked_bytes, min(size, self.sent_bytes))
+        if not self.blocked:
+            self.credit.set()
+
+    async def wait_credit(self, timeout):
+        """
+        Waits until the window is not exhausted.
+
+        Args:
+            timeout (float): Seconds to wait for acknowledgements.
+
+        Returns:
+            bool: False if the client stalled.
+        """
+        try:
+            await asyncio.wait_for(self.credit.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    @property
+    def metrics(self):
+        """dict: Queue depth, unacknowledged bytes, sent, dropped and coalesced messages and send latencies in seconds."""
+        return {
+            'depth': len(self.entries),
+            'unacked': self.unacked,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'latency_avg': self.latency_total / self.sent if self.sent else 0.0,
+            'latency_max': self.latency_max,
+        }
+
+
+class ConnectionRegistry:
+    """
+    Metrics of the websocket connections of the process.
+
+    Keeps the SendQueues of open connections and the totals of closed ones.
+
+    Example::
+
+        connections = ConnectionRegistry()
+        connections.open(channel_name, person_id, queue)
+        connections.close(channel_name, disconnected=False)
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = {}
+        self.persons = {}
+        self.closed = {'sent': 0, 'dropped': 0, 'coalesced': 0, 'latency_total': 0.0, 'latency_max': 0.0}
+        self.disconnected = 0
+
+    def open(self, connection, person_id, queue):
+        with self.lock:
+            self.connections[connection] = queue
+            self.persons[connection] = person_id
+
+    def close(self, connection, disconnected=False):
+        with self.lock:
+            queue = self.connections.pop(connection, None)
+            self.persons.pop(connection, None)
+            self.disconnected += disconnected
+            if queue is None:
+                return
+            for name in ['sent', 'dropped', 'coalesced', 'latency_total']:
+                self.closed[name] += getattr(queue, name)
+            self.closed['latency_max'] = max(self.closed['latency_max'], queue.latency_max)
+
+    def list(self):
+        """
+        Returns the metrics of the open connections.
+
+        Returns:
+            list(dict): Metrics of `SendQueue` with `connection` and `person_id`.
+        """
+        with self.lock:
+            return [
+                dict(queue.metrics, connection=connection, person_id=self.persons.get(connection))
+                for connection, queue in self.connections.items()
+            ]
+
+    @property
+    def metrics(self):
+        """dict: Aggregated metrics of all connections of the process, latencies in seconds."""
+        with self.lock:
+            queues = list(self.connections.values())
+            totals = dict(self.closed)
+            disconnected = self.disconnected
+        for queue in queues:
+            for name in ['sent', 'dropped', 'coalesced', 'latency_total']:
+                totals[name] += getattr(queue, name)
+            totals['latency_max'] = max(totals['latency_max'], queue.latency_max)
+        depths = [len(queue.entries) for queue in queues]
+        return {
+            'connections': len(queues),
+            'depth': sum(depths),
+            'depth_max': max(depths, default=0),
+            'sent': totals['sent'],
+            'dropped': totals['dropped'],
+            'coalesced': totals['coalesced'],
+            'disconnected': disconnected,
+            'latency_avg': totals['latency_total'] / totals['sent'] if totals['sent'] else 0.0,
+            'latency_max': totals['latency_max'],
+        }
+
+
+# websocket connections of the process
+websocket_connections = ConnectionRegistry()
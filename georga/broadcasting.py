@@ -0,0 +1,131 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from asgiref.sync import async_to_sync
+from channels_graphql_ws.serializer import Serializer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastBuffer:
+    """
+    Transaction-aware buffer of subscription broadcasts.
+
+    Broadcasts added within an atomic block (e.g. a mutation with
+    `ATOMIC_MUTATIONS`) are held back via `transaction.on_commit()` and
+    dropped, if the transaction or the savepoint they were added in is
+    rolled back. Outside of atomic blocks, they are committed immediately.
+
+    Committed broadcasts are collected within `batch()` (e.g. a request, see
+    `GeorgaGraphQLView`) and sent at its end with one channel layer call,
+    which sends the messages of all groups concurrently. Outside of a batch,
+    they are sent on commit. Failing channel layer calls are logged and do
+    not break the write path.
+
+    Example::
+
+        broadcasts = BroadcastBuffer()
+        with broadcasts.batch():
+            with transaction.atomic():
+                broadcasts.add(MySubscription, group, payload)
+    """
+    def __init__(self):
+        self.local = threading.local()
+        # references of pending send tasks, the event loop keeps only weak ones
+        self.tasks = set()
+
+    def add(self, subscription, group, payload, using=None):
+        """
+        Adds a broadcast, which is sent after the transaction is committed.
+
+        Args:
+            subscription (Subscription): Subscription class to notify.
+            group (str): Name of the subscription group.
+            payload (dict): Payload for `publish()` of the subscription.
+            using (str): Database alias of the transaction.
+        """
+        transaction.on_commit(partial(self.commit, subscription, group, payload), using=using)
+
+    def commit(self, subscription, group, payload):
+        """Sends the broadcast or collects it for the current batch."""
+        message = self.message(subscription, group, payload)
+        batches = getattr(self.local, 'batches', None)
+        if batches:
+            batches[-1].append(message)
+        else:
+            self.send([message])
+
+    @contextmanager
+    def batch(self):
+        """Collects the committed broadcasts and sends them at the end."""
+        batches = self.local.__dict__.setdefault('batches', [])
+        batches.append([])
+        try:
+            yield
+        finally:
+            messages = batches.pop()
+            # nested batches are sent by the outermost one
+            if batches:
+                batches[-1].extend(messages)
+            elif messages:
+                self.send(messages)
+
+    @staticmethod
+    def message(subscription, group, payload):
+        """
+        Returns the channel layer message of a broadcast.
+
+        See `channels_graphql_ws.Subscription.broadcast_sync()`.
+
+        Returns:
+            tuple(ChannelLayer, str, dict): Channel layer, name of the group and message.
+        """
+        group = subscription._group_name(group)
+        return subscription._channel_layer(), group, {
+            "type": "broadcast",
+            "group": group,
+            "payload": Serializer.serialize(payload),
+        }
+
+    @staticmethod
+    async def group_send(messages):
+        await asyncio.gather(*[
+            layer.group_send(group=group, message=message)
+            for layer, group, message in messages
+        ])
+
+    def send(self, messages):
+        """
+        Sends the messages with one channel layer call.
+
+        Args:
+            messages (list(tuple)): Messages returned by `message()`.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                async_to_sync(self.group_send)(messages)
+            except Exception:
+                logger.exception("Sending %s broadcasts failed", len(messages))
+        else:
+            task = loop.create_task(self.group_send(messages))
+            self.tasks.add(task)
+            task.add_done_callback(partial(self.sent, len(messages)))
+
+    def sent(self, count, task):
+        """Releases a send task and logs its failure."""
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Sending %s broadcasts failed", count, exc_info=task.exception())
+
+
+# buffer of all subscription broadcasts of the process
+broadcasts = BroadcastBuffer()
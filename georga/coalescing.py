@@ -0,0 +1,272 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from functools import lru_cache
+
+from graphql import (
+    OperationType, TypeInfo, TypeInfoVisitor, Visitor,
+    get_named_type, get_operation_ast, parse, visit,
+)
+
+# object types, which are resolved equally for users with the same permission
+# fingerprint (see `Person.permission_fingerprint`). Operations selecting any
+# other object type (e.g. Participants, Persons, channel filters or the Node
+# interface) are coalesced only for the same user.
+SHARED_TYPES = {
+    'EquipmentType',
+    'LocationCategoryType',
+    'LocationType',
+    'MessageType',
+    'OperationType',
+    'OrganizationType',
+    'PageInfo',
+    'PersonPropertyGroupType',
+    'PersonPropertyType',
+    'ProjectType',
+    'ResourceType',
+    'RoleSpecificationType',
+    'RoleType',
+    'ShiftType',
+    'TaskFieldType',
+    'TaskType',
+}
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    In-process coalescing of identical concurrent calls.
+
+    The first call for a key executes the function, concurrent calls with the
+    same key wait for it and share its result. Results are reused for further
+    calls within a short freshness window after the execution has finished.
+    If the execution raises, waiting calls execute the function themselves.
+    Writes should call `invalidate()`, so later calls don't share results
+    read before.
+
+    Args:
+        window (float): Freshness window in seconds, 0 to share results only
+            between concurrent calls.
+
+    Example::
+
+        flights = SingleFlight(window=1)
+        result = flights.do(key, expensive_function)
+    """
+    class Flight:
+        def __init__(self):
+            self.done = threading.Event()
+            self.finished = None
+            self.failed = False
+            self.result = None
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def invalidate(self):
+        """Shares no result of previous executions with further calls."""
+        with self.lock:
+            self.flights.clear()
+
+    def _expired(self, flight, now):
+        return flight.done.is_set() and (
+            flight.failed or now - flight.finished > self.window)
+
+    def do(self, key, func):
+        """
+        Executes `func` or shares the result of an identical execution.
+
+        Args:
+            key (Hashable): Key identifying identical calls.
+            func (Callable): Function without arguments to execute.
+
+        Returns:
+            The result of `func`.
+        """
+        with self.lock:
+            now = time.monotonic()
+            flight = self.flights.get(key)
+            leader = flight is None or self._expired(flight, now)
+            if leader:
+                # discard expired flights
+                for _key in [k for k, f in self.flights.items() if self._expired(f, now)]:
+                    del self.flights[_key]
+                flight = self.flights[key] = self.Flight()
+        # share the result of the leader
+        if not leader:
+            flight.done.wait()
+            if flight.failed:
+                return func()
+            return flight.result
+        # execute as leader
+        try:
+            flight.result = func()
+        except BaseException:
+            flight.failed = True
+            raise
+        finally:
+            flight.finished = time.monotonic()
+            flight.done.set()
+        return flight.result
+
+
+@lru_cache(maxsize=256)
+def _parse(query):
+    return parse(query)
+
+
+@lru_cache(maxsize=256)
+def _is_shared(schema, query, operation_name):
+    """Returns True if only SHARED_TYPES are selected, None if not coalescable."""
+    try:
+        document = _parse(query)
+    except Exception:
+        return None
+    operation_ast = get_operation_ast(document, operation_name)
+    if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+        return None
+
+    type_info = TypeInfo(schema)
+    selected_types = set()
+
+    class SelectedTypesVisitor(Visitor):
+        def enter_field(self, *args):
+            field_type = type_info.get_type()
+            if field_type is None:
+                return
+            name = get_named_type(field_type).name
+            selected_types.add(name.removesuffix("Connection").removesuffix("Edge"))
+
+    visit(document, TypeInfoVisitor(type_info, SelectedTypesVisitor()))
+    object_types = {
+        name for name in selected_types
+        if not getattr(schema.get_type(name), 'of_type', None)
+        and hasattr(schema.get_type(name), 'fields')
+    }
+    return object_types <= SHARED_TYPES
+
+
+def coalescing_key(schema, user, query, variables, operation_name):
+    """
+    Returns the key to coalesce identical read operations or None.
+
+    The key is derived from the document hash, the variables and the
+    permission fingerprint of the user. Operations selecting object types not
+    listed in `SHARED_TYPES` additionally include the user id.
+
+    Args:
+        schema (graphql.GraphQLSchema): Schema of the operation.
+        user (Person()|AnonymousUser()): The authenticated user.
+        query (str): GraphQL document.
+        variables (dict|None): GraphQL variables.
+        operation_name (str|None): Name of the operation to execute.
+
+    Returns:
+        str: Key for `SingleFlight.do()` or None for mutations, subscriptions
+            and invalid documents.
+    """
+    if not query:
+        return None
+    shared = _is_shared(schema, query, operation_name)
+    if shared is None:
+        return None
+    if not user.is_authenticated:
+        fingerprint = "anonymous"
+    else:
+        fingerprint = user.permission_fingerprint
+        if not shared:
+            fingerprint += f":{user.pk}"
+    key = json.dumps([query, variables, operation_name, fingerprint], sort_keys=True, default=str)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class ChangeCoalescer:
+    """
+    Coalescing of change notifications per object within a short window.
+
+    The first change starts the window, further changes of the same object
+    within the window replace its pending notification, so only the latest
+    state is sent once per object, when the window has passed. Objects
+    created within the window keep the CREATED action, deletions win.
+
+    The pending notifications are sent within one `batch` context (e.g.
+    `BroadcastBuffer.batch()`), a failing notification is logged and does
+    not prevent the others from being sent.
+
+    Args:
+        window (float): Window in seconds.
+        batch (Callable): Context manager factory wrapping each flush.
+
+    Example::
+
+        changes = ChangeCoalescer(window=0.5, batch=broadcasts.batch)
+        changes.add(instance.gid, 'UPDATED', lambda action: broadcast(action))
+    """
+    def __init__(self, window, batch=nullcontext):
+        self.window = window
+        self.batch = batch
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.timer = None
+        # metrics
+        self.events = 0
+        self.coalesced = 0
+        self.sent = 0
+
+    def add(self, key, action, send):
+        """
+        Adds a change, which is sent after the window.
+
+        Args:
+            key (Hashable): Key identifying the changed object.
+            action (str): CREATED, UPDATED or DELETED.
+            send (Callable): Function sending the notification, called with
+                the coalesced action.
+        """
+        with self.lock:
+            self.events += 1
+            if key in self.pending:
+                self.coalesced += 1
+                previous, _send = self.pending[key]
+                if previous == 'CREATED' and action == 'UPDATED':
+                    action = previous
+            self.pending[key] = (action, send)
+            if self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """Sends all pending notifications."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            pending, self.pending = self.pending, {}
+            self.sent += len(pending)
+        with self.batch():
+            for key, (action, send) in pending.items():
+                try:
+                    send(action)
+                except Exception:
+                    logger.exception("Sending %s %s failed", action, key)
+
+    @property
+    def metrics(self):
+        """dict(str, int): Number of events, coalesced, sent and pending events."""
+        with self.lock:
+            return {
+                'events': self.events,
+                'coalesced': self.coalesced,
+                'sent': self.sent,
+                'pending': len(self.pending),
+            }
@@ -0,0 +1,146 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import json
+import threading
+import uuid
+from collections import deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class EventLog:
+    """
+    Bounded append-only log of change events per organization.
+
+    Events are appended with increasing ids and the oldest events are
+    discarded, when the size is exceeded. Clients resume from the id of the
+    last seen event and receive only the missed events, as long as those are
+    still retained.
+
+    Backends:
+    - `redis`: Redis streams, shared between processes. Each organization has
+      one stream capped at `size` entries. The id of the last discarded entry
+      is kept in a companion key, set atomically with the trimming.
+    - `local`: Memory of the process, for development and tests. Ids are
+      prefixed with an epoch of the process, so ids issued before a restart
+      require a resync.
+
+    Args:
+        size (int): Maximum number of retained events per organization.
+        backend (str): 'redis' or 'local'.
+        host (str): Redis host of the redis backend.
+        port (int): Redis port of the redis backend.
+    """
+    # KEYS: stream, last discarded id; ARGV: size, event
+    APPEND = """
+        local size = tonumber(ARGV[1])
+        local length = redis.call('XLEN', KEYS[1])
+        if length >= size then
+            local discarded = redis.call('XRANGE', KEYS[1], '-', '+', 'COUNT', length - size + 1)
+            redis.call('SET', KEYS[2], discarded[#discarded][1])
+        end
+        return redis.call('XADD', KEYS[1], 'MAXLEN', size, '*', 'event', ARGV[2])
+    """
+
+    def __init__(self, size, backend='local', host=None, port=None):
+        self.size = size
+        self.backend = backend
+        if backend == 'redis':
+            # dependency of channels_redis, only needed for the redis backend
+            import redis
+            self.redis = redis.Redis(host=host, port=port, decode_responses=True)
+            self.append_script = self.redis.register_script(self.APPEND)
+        else:
+            self.lock = threading.Lock()
+            self.logs = {}
+            self.discarded = {}
+            self.last_id = 0
+            self.epoch = uuid.uuid4().hex[:12]
+
+    @staticmethod
+    def key(organization_id):
+        return f"georga:events:organization:{organization_id}"
+
+    @classmethod
+    def discarded_key(cls, organization_id):
+        return f"{cls.key(organization_id)}:discarded"
+
+    @staticmethod
+    def parse_id(id):
+        milliseconds, sequence = id.split('-')
+        return int(milliseconds), int(sequence)
+
+    def append(self, organization_id, event):
+        """
+        Appends an event to the log of an organization.
+
+        Args:
+            organization_id (int): Id of the organization.
+            event (dict): JSON serializable event.
+
+        Returns:
+            str: Id of the event.
+        """
+        event = json.dumps(event, cls=DjangoJSONEncoder)
+        if self.backend == 'redis':
+            return self.append_script(
+                keys=[self.key(organization_id), self.discarded_key(organization_id)],
+                args=[self.size, event],
+            )
+        with self.lock:
+            self.last_id += 1
+            log = self.logs.setdefault(organization_id, deque(maxlen=self.size))
+            if len(log) == self.size:
+                self.discarded[organization_id] = log[0][0]
+            log.append((self.last_id, event))
+            return f"{self.epoch}-{self.last_id}"
+
+    def read(self, organization_id, after=None):
+        """
+        Returns the events of an organization after an event id.
+
+        Args:
+            organization_id (int): Id of the organization.
+            after (str): Id of the last seen event, None for all events.
+
+        Returns:
+            tuple(list(tuple(str, dict)), bool): Ids and events, and False if
+                events after the id were discarded already or the id is
+                unknown (full resync needed).
+        """
+        if self.backend == 'redis':
+            return self._read_redis(organization_id, after)
+        epoch, _, last_seen = (after or f"{self.epoch}-0").partition('-')
+        if epoch != self.epoch or not last_seen.isdigit():
+            return [], False
+        last_seen = int(last_seen)
+        with self.lock:
+            log = list(self.logs.get(organization_id, []))
+            discarded = self.discarded.get(organization_id, 0)
+        events = [(f"{self.epoch}-{id}", json.loads(event)) for id, event in log if id > last_seen]
+        return events, last_seen >= discarded
+
+    def _read_redis(self, organization_id, after):
+        try:
+            last_seen = self.parse_id(after) if after else (0, 0)
+        except ValueError:
+            return [], False
+        pipeline = self.redis.pipeline()
+        pipeline.get(self.discarded_key(organization_id))
+        pipeline.xrange(self.key(organization_id), min=f"({after}" if after else '-', max='+')
+        discarded, entries = pipeline.execute()
+        events = [(id, json.loads(fields['event'])) for id, fields in entries]
+        # complete, if the last discarded event has been seen already
+        complete = not discarded or last_seen >= self.parse_id(discarded)
+        return events, complete
+
+
+@lru_cache(maxsize=None)
+def get_event_log():
+    """Returns the EventLog configured in `settings.SUBSCRIPTION_EVENT_LOG`."""
+    return EventLog(
+        settings.SUBSCRIPTION_EVENT_LOG_SIZE, settings.SUBSCRIPTION_EVENT_LOG,
+        settings.REDIS_HOST, settings.REDIS_PORT)
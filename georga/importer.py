@@ -0,0 +1,204 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import csv
+import io
+from itertools import chain, islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Person, PersonProperty
+
+# columns of import files, which are assigned to Person fields
+PERSON_COLUMNS = [
+    'email',
+    'first_name',
+    'last_name',
+    'title',
+    'occupation',
+    'street',
+    'number',
+    'postal_code',
+    'city',
+    'private_phone',
+    'mobile_phone',
+    'remark',
+]
+# further columns of import files
+PASSWORD_COLUMN = 'password'
+PROPERTIES_COLUMN = 'properties'  # names of PersonProperties separated by ';'
+
+FORMATS = ['csv', 'xlsx']
+
+
+def read_rows(file, file_format):
+    """
+    Yields the rows of a CSV or XLSX file one by one.
+
+    The first row contains the column names. Column names are normalized to
+    lower case, values are stripped, empty values are omitted.
+
+    Args:
+        file (file): Binary file object.
+        file_format (str): 'csv' or 'xlsx'.
+
+    Yields:
+        tuple(int, dict(str, str)): Line number and values by column name.
+    """
+    if file_format == 'csv':
+        reader = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    elif file_format == 'xlsx':
+        # optional dependency, only needed for xlsx imports
+        from openpyxl import load_workbook
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        reader = workbook.active.iter_rows(values_only=True)
+    else:
+        raise ValueError(f"Unknown format '{file_format}', valid formats: {', '.join(FORMATS)}")
+    header = None
+    for line, values in enumerate(reader, start=1):
+        values = ["" if value is None else str(value).strip() for value in values]
+        if header is None:
+            header = [value.lower() for value in values]
+            continue
+        row = {column: value for column, value in zip(header, values) if column and value}
+        if row:
+            yield line, row
+
+
+class PersonImport:
+    """
+    Chunked bulk import of Persons into an Organization.
+
+    Each chunk is imported in one transaction with one bulk insert for the
+    persons, the organization subscriptions and the person properties.
+    Persons with an already registered email or username are skipped.
+    Invalid rows and rows repeating the email of a previous row are skipped
+    and reported in `errors`.
+
+    Passwords:
+    - Hashed from the password column, if given.
+    - Unusable, if missing or deferred. The persons set their password via the
+      password reset process. Deferring avoids the hashing costs for large
+      imports.
+
+    Activation:
+    - Activation emails are scheduled and delivered separately by the
+      `deliver_activation_emails` management command.
+
+    Args:
+        organization (Organization()): Organization to subscribe persons to.
+        chunk_size (int): Number of rows per chunk.
+        defer_passwords (bool): Ignore the password column if True.
+        schedule_activation (bool): Schedule activation emails if True.
+
+    Example::
+
+        importer = PersonImport(organization, defer_passwords=True)
+        with open('persons.csv', 'rb') as file:
+            importer.run(read_rows(file, 'csv'))
+        print(importer.created, importer.skipped, importer.errors)
+    """
+    def __init__(self, organization, chunk_size=500, defer_passwords=False, schedule_activation=True):
+        self.organization = organization
+        self.chunk_size = chunk_size
+        self.defer_passwords = defer_passwords
+        self.schedule_activation = schedule_activation
+        self.properties = dict(
+            PersonProperty.objects.filter(group__organization=organization).values_list('name', 'id'))
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+        self.lines = {}  # line numbers of imported rows by email
+
+    def run(self, rows):
+        """
+        Imports the rows chunk by chunk.
+
+        Args:
+            rows (Iterable(tuple(int, dict))): Line numbers and values by
+                column name, e.g. from `read_rows()`.
+        """
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.import_chunk(chunk)
+
+    @staticmethod
+    def normalize_email(email):
+        """Returns the email normalized like by `Person.clean()`."""
+        return Person.objects.normalize_email(Person.normalize_username(email))
+
+    def build_person(self, row):
+        """
+        Returns the validated unsaved Person and its PersonProperty ids of a row.
+
+        Raises:
+            ValidationError: If the row is invalid.
+        """
+        fields = {column: row[column] for column in PERSON_COLUMNS if column in row}
+        fields['email'] = self.normalize_email(fields.get('email', ''))
+        person = Person(username=fields['email'], **fields)
+        if self.schedule_activation:
+            person.schedule_activation_email()
+        if self.defer_passwords or PASSWORD_COLUMN not in row:
+            person.set_unusable_password()
+        else:
+            person.set_password(row[PASSWORD_COLUMN])
+        person.full_clean(exclude=['activation_delivery'], validate_unique=False)
+        names = [name.strip() for name in row.get(PROPERTIES_COLUMN, '').split(';') if name.strip()]
+        unknown = [name for name in names if name not in self.properties]
+        if unknown:
+            raise ValidationError({PROPERTIES_COLUMN: f"Unknown properties: {', '.join(unknown)}"})
+        return person, [self.properties[name] for name in names]
+
+    @transaction.atomic
+    def import_chunk(self, rows):
+        """
+        Imports a chunk of rows with one bulk insert per table.
+
+        Args:
+            rows (list(tuple(int, dict))): Line numbers and values by column name.
+        """
+        # emails are used as usernames, both have to be unique
+        emails = {line: self.normalize_email(row.get('email', '')) for line, row in rows}
+        registered = set(chain.from_iterable(Person._base_manager.filter(
+            Q(email__in=emails.values()) | Q(username__in=emails.values())
+        ).values_list('email', 'username')))
+        persons = {}
+        properties = {}
+        for line, row in rows:
+            email = emails[line]
+            if email in registered:
+                self.skipped += 1
+                continue
+            if email in self.lines:
+                self.errors.append((line, [f"Duplicate of line {self.lines[email]}."]))
+                continue
+            try:
+                person, property_ids = self.build_person(row)
+            except ValidationError as e:
+                self.errors.append((line, e.messages))
+                continue
+            self.lines[email] = line
+            persons[email] = person
+            properties[email] = property_ids
+        if not persons:
+            return
+        # persons
+        Person.objects.bulk_create(persons.values())
+        ids = dict(Person._base_manager.filter(email__in=persons).values_list('email', 'id'))
+        # organization subscriptions
+        Subscription = Person.organizations_subscribed.through
+        Subscription.objects.bulk_create([
+            Subscription(person_id=ids[email], organization_id=self.organization.id)
+            for email in persons
+        ])
+        # properties
+        Properties = Person.properties.through
+        Properties.objects.bulk_create([
+            Properties(person_id=ids[email], personproperty_id=property_id)
+            for email, property_ids in properties.items()
+            for property_id in property_ids
+        ])
+        self.created += len(persons)
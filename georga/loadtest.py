@@ -0,0 +1,172 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from channels.layers import channel_layers
+from channels_graphql_ws.client import GraphqlWsClient
+from channels_graphql_ws.testing import GraphqlWsTransport
+from django.conf import settings
+
+from .schemas import TestSubscription
+
+TEST_SUBSCRIPTION = """
+    subscription {
+        testSubscription {
+            message
+        }
+    }
+"""
+TEST_GROUP = "TestSubscriptionEvents"  # group of TestSubscription
+WARMUP = -1  # sequence number of warmup events
+
+
+def configure_channel_layer():
+    """
+    Replaces the default channel layer of the process by the
+    InMemoryChannelLayer.
+
+    Only the in-memory layer is benchmarked: the simulated clients and the
+    broadcasts run in this process, no Redis server or stand-in is involved.
+    """
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    channel_layers.backends.clear()
+
+
+def percentile(values, percent):
+    """Returns the percentile of the values (nearest rank)."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))]
+
+
+class FanOutBenchmark:
+    """
+    Fan-out benchmark of GraphQL websocket subscriptions.
+
+    Runs the ASGI application in-process, opens simulated graphql-ws clients
+    subscribed to the `testSubscription` and broadcasts events to all of
+    them via the in-memory channel layer (see `configure_channel_layer()`).
+
+    Measurements:
+    - Latency: time from the broadcast to the delivery to each client.
+    - Memory per connection: Python allocations while connecting the
+      clients (tracemalloc), divided by the number of clients.
+    - CPU per event: CPU time of the process while broadcasting and
+      delivering the events, divided by the number of events. The
+      simulated clients run in the same process and are included.
+
+    Args:
+        application: ASGI application, e.g. `georga.asgi.application`.
+        clients (int): Number of simulated clients.
+        events (int): Number of broadcasted events.
+        interval (float): Seconds between two events.
+        token (str): JWT to authenticate the clients with, if not None.
+        timeout (float): Seconds to wait for the delivery of all events.
+
+    Example::
+
+        configure_channel_layer()
+        benchmark = FanOutBenchmark(application, clients=500, events=100)
+        results = asyncio.run(benchmark.run())
+    """
+    def __init__(self, application, clients=100, events=100, interval=0.01, token=None, timeout=60):
+        self.application = application
+        self.clients = clients
+        self.events = events
+        self.interval = interval
+        self.token = token
+        self.timeout = timeout
+        self.latencies = []
+        self.sent = {}
+
+    async def connect(self):
+        """Returns a connected client subscribed to the testSubscription."""
+        transport = GraphqlWsTransport(self.application, "graphql")
+        client = GraphqlWsClient(transport)
+        await client.connect_and_init(connect_only=True)
+        await transport.send({"type": "connection_init", "payload": {'token': self.token} if self.token else {}})
+        response = await transport.receive()
+        assert response['type'] == "connection_ack", f"Unexpected response `{response}`!"
+        await client.subscribe(TEST_SUBSCRIPTION, wait_confirmation=False)
+        return client
+
+    async def receive(self, client, joined):
+        """Records the latencies of the events received by a client."""
+        received = 0
+        while received < self.events:
+            response = await client.receive(assert_type="data")
+            delivered = time.perf_counter()
+            sequence = int(response['data']['testSubscription']['message'])
+            if sequence == WARMUP:
+                joined.set()
+                continue
+            self.latencies.append(delivered - self.sent[sequence])
+            received += 1
+
+    async def broadcast(self, sequence):
+        self.sent[sequence] = time.perf_counter()
+        await TestSubscription.broadcast_async(group=TEST_GROUP, payload=str(sequence))
+
+    async def warmup(self, joined):
+        """Broadcasts warmup events until all clients joined the group."""
+        async with asyncio.timeout(self.timeout):
+            while not all(event.is_set() for event in joined):
+                await self.broadcast(WARMUP)
+                await asyncio.sleep(0.1)
+
+    async def run(self):
+        """
+        Runs the benchmark.
+
+        Returns:
+            dict: Measurements, latencies in milliseconds, memory in bytes
+                and CPU time in milliseconds.
+        """
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        clients = [await self.connect() for _ in range(self.clients)]
+        memory = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+
+        joined = [asyncio.Event() for _ in clients]
+        receivers = [
+            asyncio.create_task(self.receive(client, event))
+            for client, event in zip(clients, joined)
+        ]
+        try:
+            await self.warmup(joined)
+            self.latencies.clear()
+            cpu = time.process_time()
+            wall = time.perf_counter()
+            for sequence in range(self.events):
+                await self.broadcast(sequence)
+                await asyncio.sleep(self.interval)
+            async with asyncio.timeout(self.timeout):
+                await asyncio.gather(*receivers)
+            cpu = time.process_time() - cpu
+            wall = time.perf_counter() - wall
+        finally:
+            for receiver in receivers:
+                receiver.cancel()
+            for client in clients:
+                await client.finalize()
+
+        latencies = [latency * 1000 for latency in self.latencies]
+        return {
+            'clients': self.clients,
+            'events': self.events,
+            'deliveries': len(latencies),
+            'seconds': wall,
+            'latency_mean': statistics.mean(latencies) if latencies else None,
+            'latency_p50': percentile(latencies, 50),
+            'latency_p90': percentile(latencies, 90),
+            'latency_p99': percentile(latencies, 99),
+            'latency_max': max(latencies, default=None),
+            'memory_per_connection': memory / self.clients if self.clients else None,
+            'cpu_per_event': cpu * 1000 / self.events if self.events else None,
+        }
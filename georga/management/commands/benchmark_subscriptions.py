@@ -0,0 +1,74 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+from graphql_jwt.shortcuts import get_token
+from georga.asgi import application
+from georga.loadtest import FanOutBenchmark, configure_channel_layer
+from georga.models import Person
+
+
+class Command(BaseCommand):
+    help = 'measures the fan-out of subscription events to simulated websocket clients via the in-memory channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=100,
+            help='number of simulated graphql-ws clients',
+        )
+        parser.add_argument(
+            '--events',
+            type=int,
+            default=100,
+            help='number of broadcasted events',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0.01,
+            help='seconds between two events',
+        )
+        parser.add_argument(
+            '--email',
+            help='email of the person to authenticate the clients with, anonymous by default',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=60,
+            help='seconds to wait for the delivery of all events',
+        )
+
+    def handle(self, *args, **options):
+        token = None
+        if options['email']:
+            try:
+                token = get_token(Person.objects.get(email=options['email']))
+            except Person.DoesNotExist:
+                raise CommandError(f"Person '{options['email']}' does not exist")
+        configure_channel_layer()
+        benchmark = FanOutBenchmark(
+            application,
+            clients=options['clients'],
+            events=options['events'],
+            interval=options['interval'],
+            token=token,
+            timeout=options['timeout'],
+        )
+        try:
+            results = asyncio.run(benchmark.run())
+        except TimeoutError:
+            raise CommandError(f"Events not delivered within {options['timeout']} seconds")
+        self.stdout.write(
+            f"clients: {results['clients']}, events: {results['events']}, "
+            f"deliveries: {results['deliveries']}, seconds: {results['seconds']:.2f}")
+        self.stdout.write(
+            f"latency ms: mean {results['latency_mean']:.2f}, p50 {results['latency_p50']:.2f}, "
+            f"p90 {results['latency_p90']:.2f}, p99 {results['latency_p99']:.2f}, max {results['latency_max']:.2f}")
+        self.stdout.write(
+            f"memory per connection: {results['memory_per_connection'] / 1024:.1f} KiB, "
+            f"cpu per event: {results['cpu_per_event']:.2f} ms")
@@ -0,0 +1,18 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+from django.core.management.base import BaseCommand
+from georga.models import Person
+
+
+class Command(BaseCommand):
+    help = 'delivers scheduled activation emails'
+
+    def handle(self, *args, **options):
+        scheduled = Person.objects.filter(activation_delivery='SCHEDULED')
+        for person in scheduled.iterator():
+            try:
+                person.send_activation_email()
+            except Exception as e:
+                self.stderr.write(f'failed sending activation email to {person}: {e}')
+            person.save(update_fields=['activation_delivery'])
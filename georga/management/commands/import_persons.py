@@ -0,0 +1,65 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+from os.path import splitext
+
+from django.core.management.base import BaseCommand, CommandError
+from georga.importer import FORMATS, PersonImport, read_rows
+from georga.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'imports persons from a csv/xlsx file into an organization'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            help='csv/xlsx file with a header row of column names',
+        )
+        parser.add_argument(
+            '--organization',
+            required=True,
+            help='name of the organization to subscribe the persons to',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='format of the file, derived from the file extension by default',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='number of rows imported per transaction',
+        )
+        parser.add_argument(
+            '--defer-passwords',
+            action='store_true',
+            help='ignore the password column, persons set their password via password reset',
+        )
+        parser.add_argument(
+            '--no-activation',
+            action='store_true',
+            help='do not schedule activation emails',
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or splitext(options['file'])[1].lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise CommandError(f"Unknown format '{file_format}', use --format")
+        try:
+            organization = Organization.objects.get(name=options['organization'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization '{options['organization']}' does not exist")
+        importer = PersonImport(
+            organization,
+            chunk_size=options['chunk_size'],
+            defer_passwords=options['defer_passwords'],
+            schedule_activation=not options['no_activation'],
+        )
+        with open(options['file'], 'rb') as file:
+            importer.run(read_rows(file, file_format))
+        for line, messages in importer.errors:
+            self.stderr.write(f"line {line}: {' '.join(messages)}")
+        self.stdout.write(
+            f"created: {importer.created}, skipped: {importer.skipped}, invalid: {len(importer.errors)}")
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.11 on 2026-10-19 03:27
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def merge_duplicate_persontoobjects(apps, schema_editor):
+    """
+    Merges PersonToObjects of the same person and object into the oldest one.
+
+    The merged entry is noticed, if any duplicate was noticed, and bookmarked,
+    if any duplicate was bookmarked.
+    """
+    PersonToObject = apps.get_model('georga', 'PersonToObject')
+    db_alias = schema_editor.connection.alias
+    fields = ['person', 'relation_object_ct', 'relation_object_id']
+    duplicates = PersonToObject.objects.using(db_alias).values(*fields) \
+        .annotate(count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        entries = list(PersonToObject.objects.using(db_alias).filter(
+            **{field: duplicate[field] for field in fields}).order_by('id'))
+        merged, others = entries[0], entries[1:]
+        merged.unnoticed = all(entry.unnoticed for entry in entries)
+        merged.bookmarked = any(entry.bookmarked for entry in entries)
+        merged.save(update_fields=['unnoticed', 'bookmarked'])
+        PersonToObject.objects.using(db_alias).filter(id__in=[entry.id for entry in others]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('georga', '0003_alter_personproperty_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_persontoobjects, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='persontoobject',
+            unique_together={('person', 'relation_object_ct', 'relation_object_id')},
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.11 on 2026-10-19 03:41
+
+from django.db import migrations
+import django_fsm
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('georga', '0005_soft_deletion_cascade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='activation_delivery',
+            field=django_fsm.FSMField(choices=[('NONE', 'None'), ('SCHEDULED', 'Scheduled'), ('SENT', 'Sent'), ('FAILED', 'Failed')], default='NONE', max_length=9, protected=True),
+        ),
+    ]
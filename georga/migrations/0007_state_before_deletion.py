@@ -0,0 +1,38 @@
+# Generated by Django 4.2.11 on 2026-10-19 05:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('georga', '0006_person_activation_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='operation',
+            name='state_before_deletion',
+            field=models.CharField(blank=True, editable=False, max_length=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='state_before_deletion',
+            field=models.CharField(blank=True, editable=False, max_length=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='state_before_deletion',
+            field=models.CharField(blank=True, editable=False, max_length=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='state_before_deletion',
+            field=models.CharField(blank=True, editable=False, max_length=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='state_before_deletion',
+            field=models.CharField(blank=True, editable=False, max_length=9, null=True),
+        ),
+    ]
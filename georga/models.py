@@ -1,25 +1,29 @@
 # For copyright and license terms, see COPYRIGHT.md (top level of repository)
 # Repository: https://github.com/georga-app/georga-server-django
 
+import hashlib
 import os
 import sys
+from collections import Counter
 from operator import or_, and_
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import cached_property, reduce
 import uuid
 
+from django.apps import apps
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
-from django.db.models import Q, When, Case, Count
+from django.db import models, transaction
+from django.db.models import Q, Count
 from django.db.models.signals import pre_save
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
 from django.utils import timezone
 from django.utils.translation import gettext as _
-from django_fsm import FSMField, transition, RETURN_VALUE
+from django_fsm import FSMField, transition, GET_STATE, RETURN_VALUE
 from phonenumber_field.modelfields import PhoneNumberField
 from graphql_relay import to_global_id
 
@@ -78,6 +82,29 @@ class MixinUUIDs(models.Model):
         """str: global relay id (base64 encoded `<ModelName>,<UUID>`)"""
         return to_global_id(f"{self._meta.object_name}Type", self.uuid)
 
+    def copy(self, **fields):
+        """
+        Returns an unpersisted copy of the instance with a new uuid.
+
+        The primary key and timestamps are reset, ManyToManyFields and reverse
+        relations are not copied.
+
+        Args:
+            **fields: Field values of the copy to override, e.G. foreign keys.
+
+        Returns:
+            The unpersisted copy of the instance.
+        """
+        exclude = {self._meta.pk.name, 'uuid', 'created_at', 'modified_at'}
+        values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.name not in exclude
+        }
+        for name in fields:
+            values.pop(self._meta.get_field(name).attname, None)
+        return type(self)(**values, **fields)
+
 
 class MixinAuthorization(models.Model):
     """
@@ -327,10 +354,151 @@ class MixinAuthorization(models.Model):
                 permit |= bool(self.permitted(self, user, action))
             return permit
         # queryset filtering and persisted instances (read, update, delete, etc)
-        qs = self.filter_permitted(user, actions, instance=self)
+        # including soft deleted instances (undelete)
+        qs = self.filter_permitted(user, actions, type(self)._base_manager, instance=self)
         return qs.filter(pk=self.pk).exists()
 
 
+# sent by bulk operations bypassing post_save and post_delete (e.g. bulk_create,
+# queryset updates) with the arguments action (CREATED, UPDATED or DELETED) and
+# either instances or, for rows not loaded as instances, a queryset, which the
+# receivers have to evaluate immediately
+bulk_changed = Signal()
+
+
+class MixinSoftDeletion(models.Model):
+    """
+    Set-based cascade of soft deletions to descendants.
+
+    The descendants are declared in `deletion_cascade` as mapping of model
+    names to lookups from the descendant model to the instance. Lookups to a
+    GenericForeignKey select the rows related to the instance or to any other
+    descendant. Each descendant model is flagged with one UPDATE. All rows
+    flagged by the same cascade share the `deleted_at` timestamp, so the
+    cascade can be reverted without restoring rows deleted independently.
+
+    Attributes:
+        deleted_at (models.DateTimeField()): Timestamp of the soft deletion.
+
+    Example:
+        Declare the descendants::
+
+            deletion_cascade = {
+                'Shift': ['task'],
+                'Role': ['task', 'shift__task'],
+                'Message': ['scope'],
+            }
+    """
+    class Meta:
+        abstract = True
+
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    deletion_cascade = {}
+
+    def _deletion_querysets(self):
+        """
+        Returns the querysets of all descendants in `deletion_cascade`.
+
+        Returns:
+            dict(type, QuerySet()): Descendant rows by model, including rows
+                already deleted.
+        """
+        querysets = {}
+        generic_lookups = {}
+        for model_name, lookups in self.deletion_cascade.items():
+            model = apps.get_model('georga', model_name)
+            for lookup in lookups:
+                field = model._meta.get_field(lookup.split('__')[0])
+                if isinstance(field, GenericForeignKey):
+                    generic_lookups.setdefault(model, []).append(field)
+                    continue
+                q = Q(**{lookup: self})
+                if model in querysets:
+                    q = querysets[model] | q
+                querysets[model] = q
+        querysets = {
+            model: model._base_manager.filter(q)
+            for model, q in querysets.items()}
+        # rows related to the instance or other descendants via GenericForeignKeys
+        scopes = {type(self): type(self)._base_manager.filter(pk=self.pk), **querysets}
+        for model, fields in generic_lookups.items():
+            q = reduce(or_, [
+                Q(**{
+                    field.ct_field: ContentType.objects.get_for_model(scope_model),
+                    f"{field.fk_field}__in": scope_queryset.values('pk'),
+                })
+                for field in fields
+                for scope_model, scope_queryset in scopes.items()
+            ])
+            querysets[model] = model._base_manager.filter(q)
+        return querysets
+
+    @transaction.atomic
+    def soft_delete(self):
+        """
+        Flags the instance and all descendants as deleted.
+
+        Descendants already deleted keep their deletion timestamp. Sends
+        `bulk_changed` with the querysets of the flagged descendants, no
+        descendants are loaded as instances.
+
+        Returns:
+            tuple(int, dict(str, int)): Total number of flagged rows and number
+                of flagged rows by model label, like `Model.delete()`.
+        """
+        now = timezone.now()
+        self.deleted = True
+        self.deleted_at = now
+        self.save()
+        counts = {self._meta.label: 1}
+        for model, queryset in self._deletion_querysets().items():
+            queryset = queryset.filter(deleted=False)
+            # the rows are fetched by the receivers before they are flagged
+            bulk_changed.send(sender=model, queryset=queryset, action='DELETED')
+            counts[model._meta.label] = queryset.update(deleted=True, deleted_at=now)
+        return sum(counts.values()), counts
+
+    @transaction.atomic
+    def soft_undelete(self):
+        """
+        Reverts the soft deletion of the instance and its cascade.
+
+        Only descendants flagged by the same cascade are restored. Sends
+        `bulk_changed` with the instance and the querysets of the restored
+        descendants.
+
+        Returns:
+            tuple(int, dict(str, int)): Total number of restored rows and number
+                of restored rows by model label.
+        """
+        deleted_at = self.deleted_at
+        self.deleted = False
+        self.deleted_at = None
+        self.save()
+        counts = {self._meta.label: 1}
+        bulk_changed.send(sender=type(self), instances=[self], action='CREATED')
+        for model, queryset in self._deletion_querysets().items():
+            queryset = queryset.filter(deleted=True, deleted_at=deleted_at)
+            bulk_changed.send(sender=model, queryset=queryset, action='CREATED')
+            counts[model._meta.label] = queryset.update(deleted=False, deleted_at=None)
+        return sum(counts.values()), counts
+
+
+def restored_state(instance):
+    """
+    Returns the state of a soft deleted instance before its deletion.
+
+    Used as target of the `undelete` transitions. Instances without a stored
+    state are restored as DRAFT.
+    """
+    return instance.state_before_deletion or 'DRAFT'
+
+
 # manager ---------------------------------------------------------------------
 
 INCLUDE_DELETED = False
@@ -403,7 +571,7 @@ class ResourceManager(FilteredManager):
         return self.get(name=organization_name)
 
 
-class RoleManager(models.Manager):
+class RoleManager(FilteredManager):
     def get_queryset(self):
         participants_accepted = Count('participant', filter=reduce(and_, [
             Q(participant__acceptance='ACCEPTED'),
@@ -731,7 +899,7 @@ class Equipment(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
                 return None
 
 
-class Location(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
+class Location(MixinTimestamps, MixinUUIDs, MixinAuthorization, MixinSoftDeletion, models.Model):
     objects = FilteredManager()
     deleted = models.BooleanField(default=False)
 
@@ -806,6 +974,14 @@ class Location(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
         if not self.is_template and not self.shift:
             raise ValidationError("non template location must have a shift")
 
+    def delete(self, *args, hard=False, **kwargs):
+        if hard:
+            return super().delete(*args, **kwargs)
+        return self.soft_delete()
+
+    def undelete(self):
+        return self.soft_undelete()
+
     # permissions
     @classmethod
     def permitted(cls, location, user, action):
@@ -929,6 +1105,7 @@ class PersonToObject(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Mod
         indexes = [
             models.Index(fields=["relation_object_ct", "relation_object_id"]),
         ]
+        unique_together = ('person', 'relation_object_ct', 'relation_object_id',)
 
     def clean(self):
         super().clean()
@@ -962,7 +1139,7 @@ class PersonToObject(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Mod
                         organization = obj.scope.organization
                     else:
                         return False
-                    return organization.id in user.organizations_ids
+                    return organization.id in user.organization_ids
                 case _:
                     return False
         # queryset filtering and persisted instances (read, update, delete, etc)
@@ -972,8 +1149,48 @@ class PersonToObject(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Mod
             case _:
                 return None
 
+    @classmethod
+    def bulk_upsert(cls, person, relation_objects, **values):
+        """
+        Creates or updates the entries of a person for multiple relation objects.
+
+        Uses a single `INSERT ... ON CONFLICT DO UPDATE` statement. Values not
+        given are set to their defaults for created entries and are left
+        untouched for existing entries.
+
+        Args:
+            person (Person()): Person of the entries.
+            relation_objects (list[Model()]): Relation objects of the entries.
+            **values: Field values to set, e.G. unnoticed or bookmarked.
+
+        Returns:
+            QuerySet(): The created or updated entries.
+        """
+        if not relation_objects:
+            return cls.objects.none()
+        cts = ContentType.objects.get_for_models(*{type(obj) for obj in relation_objects})
+        cls.objects.bulk_create(
+            [
+                cls(
+                    person=person,
+                    relation_object_ct=cts[type(obj)],
+                    relation_object_id=obj.id,
+                    **values
+                )
+                for obj in relation_objects
+            ],
+            update_conflicts=True,
+            unique_fields=['person', 'relation_object_ct', 'relation_object_id'],
+            update_fields=[*values, 'modified_at'],
+        )
+        return cls.objects.filter(person=person).filter(reduce(or_, [
+            Q(relation_object_ct=ct, relation_object_id__in=[
+                obj.id for obj in relation_objects if type(obj) is model])
+            for model, ct in cts.items()
+        ]))
+
 
-class Message(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
+class Message(MixinTimestamps, MixinUUIDs, MixinAuthorization, MixinSoftDeletion, models.Model):
     '''
     A Message is sent via different channels to registered persons.
 
@@ -1418,53 +1635,81 @@ class MessageFilter(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Mode
                 | Operation:    {'app': 'INHERITED', 'email': 'INHERITED'}
                 v Result:       {'app': 'NORMAL', '   email': 'LOW'}
         """
-        # prepare q objects to fetch relevant message filters
-        q = Q(default=person)
-        if isinstance(scope, Shift):
-            q |= reduce(or_, [
-                Q(shift=scope),
-                Q(task=scope.task),
-                Q(operation=scope.task.operation),
-                Q(project=scope.task.operation.project),
-                Q(organization=scope.task.operation.project.organization),
-            ])
-        elif isinstance(scope, Task):
-            q |= reduce(or_, [
-                Q(task=scope),
-                Q(operation=scope.operation),
-                Q(project=scope.operation.project),
-                Q(organization=scope.operation.project.organization),
-            ])
-        elif isinstance(scope, Operation):
-            q |= reduce(or_, [
-                Q(operation=scope),
-                Q(project=scope.project),
-                Q(organization=scope.project.organization),
-            ])
-        elif isinstance(scope, Project):
-            q |= reduce(or_, [
-                Q(project=scope),
-                Q(organization=scope.organization),
-            ])
-        elif isinstance(scope, Organization):
-            q |= Q(organization=scope.organization)
-        q &= Q(person=person)
-
-        # fetch channel values from message filters, ensure hierarchical order
-        scope_order = Case(*[  # ordered content ids for message filter hierarchy
-            When(scope_ct=ContentType.objects.get(model=model).id, then=index)
-            for index, model in enumerate(cls.scope_cts)
-        ])
-        channel_filters = list(
-            cls.objects.filter(q).order_by(scope_order).values(*cls.CHANNELS))
-
-        # merge and return channel filters (choose most specific level)
-        result = channel_filters.pop(0)  # default filter of person
-        for channel_filter in channel_filters:
-            for channel, level in channel_filter.items():
-                if level == "INHERITED":
-                    continue
-                result[channel] = level
+        return cls.bulk_channel_filters(person, [scope])[scope]
+
+    @classmethod
+    def bulk_channel_filters(cls, person, scopes):
+        """
+        Returns merged channel filters for multiple scopes.
+
+        Batched version of `channel_filters()` with a fixed number of queries:
+        Fetches the ancestry ids of the scopes with one query per scope model,
+        all relevant message filters of the person with a single query and
+        merges them in memory. Content type ids are cached for the process
+        lifetime by the ContentType manager.
+
+        Args:
+            person (Person): Person to merge the channel filters for.
+            scopes (iterable[Person|Organization|Project|Operation|Task|Shift]):
+                Scopes of MessageFilter.
+
+        Returns:
+            dict[Model(), dict[str: str]]: Dictionary of channels and filter
+                level by scope.
+        """
+        hierarchy = cls.scope_cts[1:]  # organization, project, ..., shift
+        scope_ct_ids = {
+            model._meta.model_name: content_type.id
+            for model, content_type in ContentType.objects.get_for_models(
+                *[apps.get_model('georga', model) for model in cls.scope_cts]
+            ).items()
+        }
+
+        # fetch ancestry ids of scopes, ordered from root to scope
+        ancestries = {}
+        scopes_by_model = {}
+        for scope in scopes:
+            scopes_by_model.setdefault(scope._meta.model_name, {})[scope.id] = scope
+        for model, instances in scopes_by_model.items():
+            if model == 'person':
+                for scope in instances.values():
+                    ancestries[scope] = []
+                continue
+            index = hierarchy.index(model)
+            lookups = ['__'.join(reversed(hierarchy[i:index])) or 'id' for i in range(index + 1)]
+            rows = apps.get_model('georga', model)._base_manager \
+                .filter(id__in=instances).values_list('id', *lookups)
+            for scope_id, *ancestor_ids in rows:
+                ancestries[instances[scope_id]] = [
+                    (scope_ct_ids[ancestor_model], ancestor_id)
+                    for ancestor_model, ancestor_id in zip(hierarchy, ancestor_ids)
+                ]
+
+        # fetch all relevant message filters of the person
+        default = (scope_ct_ids['person'], person.id)
+        ids_by_ct = {}
+        for ancestry in ancestries.values():
+            for ct_id, scope_id in ancestry:
+                ids_by_ct.setdefault(ct_id, set()).add(scope_id)
+        q = reduce(or_, [
+            Q(scope_ct=ct_id, scope_id__in=ids) for ct_id, ids in ids_by_ct.items()
+        ], Q(scope_ct=default[0], scope_id=default[1]))
+        message_filters = {
+            (values.pop('scope_ct'), values.pop('scope_id')): values
+            for values in cls.objects.filter(q, person=person).values(
+                'scope_ct', 'scope_id', *cls.CHANNELS)
+        }
+
+        # merge channel filters (choose most specific level)
+        result = {}
+        for scope, ancestry in ancestries.items():
+            channel_filters = dict.fromkeys(cls.CHANNELS, 'INHERITED')
+            for key in [default, *ancestry]:
+                for channel, level in message_filters.get(key, {}).items():
+                    if level == "INHERITED":
+                        continue
+                    channel_filters[channel] = level
+            result[scope] = channel_filters
         return result
 
     # permissions
@@ -1489,9 +1734,16 @@ class MessageFilter(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Mode
                 return None
 
 
-class Operation(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
+class Operation(MixinTimestamps, MixinUUIDs, MixinAuthorization, MixinSoftDeletion, models.Model):
     objects = OperationManager()
     deleted = models.BooleanField(default=False)
+    deletion_cascade = {
+        'Task': ['operation'],
+        'Shift': ['task__operation'],
+        'Role': ['task__operation', 'shift__task__operation'],
+        'Location': ['task__operation', 'shift__task__operation'],
+        'Message': ['scope'],
+    }
 
     project = models.ForeignKey(
         to='Project',
@@ -1509,6 +1761,12 @@ class Operation(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
         default='DRAFT',
         protected=True
     )
+    state_before_deletion = models.CharField(
+        max_length=9,
+        null=True,
+        blank=True,
+        editable=False,
+    )
     name = models.CharField(
         max_length=100,
     )
@@ -1568,6 +1826,103 @@ class Operation(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
         """Organisation(): Returns the Organization of the Operation."""
         return self.project.organization
 
+    def clone(self, name=None, offset=None):
+        """
+        Clones the Operation with its Tasks, Shifts, Roles, RoleSpecifications
+        and Locations with bulk operations.
+
+        Foreign keys are remapped to the clones, all clones are drafts. The
+        number of queries is independent of the number of cloned instances.
+        Sends `bulk_changed` with the cloned Tasks, Shifts and Roles.
+        Resources, Participants, Messages, MessageFilters, ACEs and
+        PersonToObjects are not cloned.
+
+        Args:
+            name (str, optional): Name of the clone, defaults to the name of
+                the Operation.
+            offset (timedelta, optional): Offset to add to all times.
+
+        Returns:
+            Operation(): The clone of the Operation.
+        """
+        offset = offset or timedelta()
+
+        def shift_time(time):
+            return time and time + offset
+
+        with transaction.atomic():
+            # operation
+            operation = self.copy(name=name or self.name, state='DRAFT')
+            operation.save()
+            # tasks
+            tasks = list(Task.objects.filter(operation=self))
+            clones = Task.objects.bulk_create([
+                task.copy(
+                    operation=operation,
+                    state='DRAFT',
+                    start_time=shift_time(task.start_time),
+                    end_time=shift_time(task.end_time),
+                )
+                for task in tasks
+            ])
+            task_ids = {task.id: clone.id for task, clone in zip(tasks, clones)}
+            bulk_changed.send(sender=Task, instances=clones, action='CREATED')
+            # shifts
+            shifts = list(Shift.objects.filter(task__in=task_ids))
+            clones = Shift.objects.bulk_create([
+                shift.copy(
+                    task_id=task_ids[shift.task_id],
+                    state='DRAFT',
+                    start_time=shift_time(shift.start_time),
+                    end_time=shift_time(shift.end_time),
+                    enrollment_deadline=shift_time(shift.enrollment_deadline),
+                )
+                for shift in shifts
+            ])
+            shift_ids = {shift.id: clone.id for shift, clone in zip(shifts, clones)}
+            bulk_changed.send(sender=Shift, instances=clones, action='CREATED')
+            # roles
+            roles = list(Role.objects.filter(Q(task__in=task_ids) | Q(shift__in=shift_ids)))
+            clones = Role.objects.bulk_create([
+                role.copy(
+                    task_id=task_ids.get(role.task_id),
+                    shift_id=shift_ids.get(role.shift_id),
+                )
+                for role in roles
+            ])
+            role_ids = {role.id: clone.id for role, clone in zip(roles, clones)}
+            bulk_changed.send(sender=Role, instances=clones, action='CREATED')
+            # role specifications
+            specifications = list(RoleSpecification.objects.filter(role__in=role_ids))
+            clones = RoleSpecification.objects.bulk_create([
+                specification.copy(role_id=role_ids[specification.role_id])
+                for specification in specifications
+            ])
+            specification_ids = {
+                specification.id: clone.id
+                for specification, clone in zip(specifications, clones)
+            }
+            through = RoleSpecification.person_properties.through
+            through.objects.bulk_create([
+                through(
+                    rolespecification_id=specification_ids[specification_id],
+                    personproperty_id=person_property_id,
+                )
+                for specification_id, person_property_id in through.objects.filter(
+                    rolespecification__in=specification_ids
+                ).values_list('rolespecification', 'personproperty')
+            ])
+            # locations
+            Location.objects.bulk_create([
+                location.copy(
+                    task_id=task_ids.get(location.task_id),
+                    shift_id=shift_ids.get(location.shift_id),
+                )
+                for location in Location.objects.filter(
+                    Q(task__in=task_ids) | Q(shift__in=shift_ids))
+            ])
+        return operation
+
     # permissions
     @classmethod
     def permitted(cls, operation, user, action):
@@ -1622,15 +1977,28 @@ class Operation(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
     @transition(state, '*', 'DELETED')
     def delete(self, *args, hard=False, **kwargs):
         if hard:
-            super().delete(*args, **kwargs)
-        else:
-            self.deleted = True
-            self.save()
+            return super().delete(*args, **kwargs)
+        if self.state != 'DELETED':
+            self.state_before_deletion = self.state
+        return self.soft_delete()
 
+    @transition(state, 'DELETED', GET_STATE(restored_state, states=[value for value, _ in STATES]))
+    def undelete(self):
+        return self.soft_undelete()
 
-class Organization(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
+
+class Organization(MixinTimestamps, MixinUUIDs, MixinAuthorization, MixinSoftDeletion, models.Model):
     objects = OrganizationManager()
     deleted = models.BooleanField(default=False)
+    deletion_cascade = {
+        'Project': ['organization'],
+        'Operation': ['project__organization'],
+        'Task': ['operation__project__organization'],
+        'Shift': ['task__operation__project__organization'],
+        'Role': ['task__operation__project__organization', 'shift__task__operation__project__organization'],
+        'Location': ['category__organization'],
+        'Message': ['scope'],
+    }
 
     STATES = [
         ('DRAFT', _('Draft')),
@@ -1644,6 +2012,12 @@ class Organization(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model
         default='DRAFT',
         protected=True
     )
+    state_before_deletion = models.CharField(
+        max_length=9,
+        null=True,
+        blank=True,
+        editable=False,
+    )
     name = models.CharField(
         max_length=50,
     )
@@ -1757,10 +2131,19 @@ class Organization(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model
     @transition(state, '*', 'DELETED')
     def delete(self, *args, hard=False, **kwargs):
         if hard:
-            super().delete(*args, **kwargs)
-        else:
-            self.deleted = True
-            self.save()
+            return super().delete(*args, **kwargs)
+        if self.state != 'DELETED':
+            self.state_before_deletion = self.state
+        return self.soft_delete()
+
+    @transition(state, 'DELETED', GET_STATE(restored_state, states=[value for value, _ in STATES]))
+    def undelete(self):
+        return self.soft_undelete()
+
+
+# sent by Participant.bulk_transition() with the arguments field, target and
+# changes (list of role_id, acceptance, admin_acceptance and count before)
+participants_transitioned = Signal()
 
 
 class Participant(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
@@ -1855,10 +2238,11 @@ class Participant(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model)
             case 'accept' | 'decline':
                 # participants can accept/decline themself
                 return Q(person=user),
-            case 'admin_read' | 'admin_update' | 'admin_accept' | 'admin_decline':
+            case ('admin_read' | 'admin_update' | 'admin_accept' | 'admin_decline'
+                  | 'admin_reinquire'):
                 return reduce(or_, [
-                    # participants can be admin_updated/admin_read/admin_accepted/admin_declined
-                    # by organization/project/operation admins
+                    # participants can be admin_updated/admin_read/admin_accepted/admin_declined/
+                    # admin_reinquired by organization/project/operation admins
                     Q(role__is_template=True,
                       role__task__operation__in=user.admin_operation_ids),
                     Q(role__is_template=False,
@@ -1899,6 +2283,81 @@ class Participant(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model)
         # TODO: transition
         pass
 
+    @classmethod
+    def transition_sources(cls, transition):
+        """
+        Returns the source states of a transition without conditions.
+
+        Args:
+            transition (str): Name of the transition method.
+
+        Returns:
+            tuple[str, str, list[str]]: Name of the state field, the target
+                state and the list of source states.
+
+        Raises:
+            AssertionError: If the transition has conditions.
+        """
+        meta = getattr(cls, transition)._django_fsm
+        field = meta.field
+        sources = [state for state, _ in field.choices if meta.has_transition(state)]
+        targets = {meta.get_transition(state).target for state in sources}
+        assert not any(meta.get_transition(state).conditions for state in sources), \
+            f"Error: transition {transition} has conditions."
+        assert len(targets) == 1, f"Error: transition {transition} has multiple targets."
+        return field.name, targets.pop(), sources
+
+    @classmethod
+    def bulk_transition(cls, queryset, transition, **values):
+        """
+        Applies a transition to all Participants of a queryset with one UPDATE.
+
+        Only Participants in a source state of the transition are updated.
+        The rows are locked, so the sent changes match the updated rows.
+        Sends `participants_transitioned` with the number of updated
+        Participants per role and state and `bulk_changed` with the updated
+        Participants, if they have receivers.
+
+        Args:
+            queryset (QuerySet()): Participants to apply the transition to.
+            transition (str): Name of the transition method.
+            **values: Further field values to update.
+
+        Returns:
+            list[int]: Primary keys of the updated Participants.
+        """
+        field, target, sources = cls.transition_sources(transition)
+        with transaction.atomic():
+            rows = list(queryset.filter(**{f"{field}__in": sources}).select_for_update().values_list(
+                'pk', 'role_id', 'acceptance', 'admin_acceptance'))
+            pks = [pk for pk, *_ in rows]
+            cls.objects.filter(pk__in=pks).update(**{field: target}, modified_at=timezone.now(), **values)
+            if pks and participants_transitioned.has_listeners(cls):
+                changes = Counter(tuple(row[1:]) for row in rows)
+                participants_transitioned.send(sender=cls, field=field, target=target, changes=[
+                    (*state, count) for state, count in changes.items()])
+            if pks and bulk_changed.has_listeners(cls):
+                bulk_changed.send(sender=cls, instances=list(cls.objects.filter(pk__in=pks)), action='UPDATED')
+        return pks
+
+    @staticmethod
+    def fill_state(acceptance, admin_acceptance):
+        """
+        Returns the state, in which a Participant counts for the role fill
+        levels (see `RoleManager`).
+
+        Returns:
+            str: 'accepted', 'declined', 'pending' or None, if not counted.
+        """
+        if acceptance == 'DECLINED' or admin_acceptance == 'DECLINED':
+            return 'declined'
+        if acceptance == 'ACCEPTED' and admin_acceptance in ['NONE', 'ACCEPTED']:
+            return 'accepted'
+        if (acceptance == 'PENDING' and admin_acceptance in ['PENDING', 'ACCEPTED']) \
+                or (acceptance in ['PENDING', 'ACCEPTED'] and admin_acceptance == 'PENDING'):
+            return 'pending'
+        return None
+
     # admin_acceptance transitions
     def has_accepted(self):
         return self.acceptance == 'ACCEPTED'
@@ -2081,6 +2540,20 @@ class Person(MixinTimestamps, MixinUUIDs, MixinAuthorization, AbstractUser):
         related_query_name='default'
     )
 
+    # activation
+    ACTIVATION_DELIVERY_STATES = [
+        ('NONE', _('None')),
+        ('SCHEDULED', _('Scheduled')),
+        ('SENT', _('Sent')),
+        ('FAILED', _('Failed')),
+    ]
+    activation_delivery = FSMField(
+        max_length=9,
+        choices=ACTIVATION_DELIVERY_STATES,
+        default='NONE',
+        protected=True
+    )
+
     def __name__(self):
         return self.email
 
@@ -2108,6 +2581,16 @@ class Person(MixinTimestamps, MixinUUIDs, MixinAuthorization, AbstractUser):
     def channel_filters(self, scope):
         return MessageFilter.channel_filters(self, scope)
 
+    # activation_delivery transitions
+    @transition(activation_delivery, ['NONE', 'SENT', 'FAILED'], 'SCHEDULED')
+    def schedule_activation_email(self):
+        pass
+
+    @transition(activation_delivery, 'SCHEDULED', 'SENT', on_error='FAILED')
+    def send_activation_email(self):
+        from .email import Email  # circular import
+        Email.send_activation_email(self)
+
     ADMIN_LEVELS = [  # neccessary for graphene enum field
         ('NONE', _('None')),
         ('ORGANIZATION', _("Organization")),
@@ -2185,6 +2668,55 @@ class Person(MixinTimestamps, MixinUUIDs, MixinAuthorization, AbstractUser):
             | Q(ace__person=self.id, ace__permission="ADMIN")
         ).values_list('id', flat=True))
 
+    @cached_property
+    def permission_fingerprint(self):
+        """
+        str: Hash of all attributes of the user, which are relevant for
+            permissions not bound to the user itself. Users with the same
+            fingerprint may read the same organization scoped instances.
+        """
+        attributes = (
+            self.is_active,
+            self.is_staff,
+            self.is_superuser,
+            sorted(self.organization_ids),
+            sorted(self.admin_organization_ids),
+            sorted(self.admin_project_ids),
+            sorted(self.admin_operation_ids),
+        )
+        return hashlib.sha256(repr(attributes).encode()).hexdigest()
+
+    # cache keys of the permission versions of one person or all persons
+    PERMISSION_VERSION_KEY = "georga:permission-version:{}"
+
+    @property
+    def permission_version(self):
+        """
+        tuple: Uncached versions of the permission relevant attributes of all
+            persons and of the user. Changed by `bump_permission_version()`,
+            if ACEs, memberships or organizations, projects and operations
+            change (see signals.py). Used to refresh long lived user contexts.
+        """
+        keys = [self.PERMISSION_VERSION_KEY.format('all'), self.PERMISSION_VERSION_KEY.format(self.id)]
+        versions = cache.get_many(keys)
+        return tuple(versions.get(key) for key in keys)
+
+    @classmethod
+    def bump_permission_version(cls, person_id=None):
+        """
+        Changes the permission version of a person or all persons.
+
+        Args:
+            person_id (int): Id of the person, None for all persons.
+        """
+        key = cls.PERMISSION_VERSION_KEY.format(person_id or 'all')
+        if cache.add(key, 1, timeout=None):
+            return
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
     # permissions
     @classmethod
     def permitted(cls, person, user, action):
@@ -2344,9 +2876,17 @@ class PersonPropertyGroup(MixinTimestamps, MixinUUIDs, MixinAuthorization, model
                 return None
 
 
-class Project(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
+class Project(MixinTimestamps, MixinUUIDs, MixinAuthorization, MixinSoftDeletion, models.Model):
     objects = ProjectManager()
     deleted = models.BooleanField(default=False)
+    deletion_cascade = {
+        'Operation': ['project'],
+        'Task': ['operation__project'],
+        'Shift': ['task__operation__project'],
+        'Role': ['task__operation__project', 'shift__task__operation__project'],
+        'Location': ['task__operation__project', 'shift__task__operation__project'],
+        'Message': ['scope'],
+    }
 
     organization = models.ForeignKey(
         to='Organization',
@@ -2364,6 +2904,12 @@ class Project(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
         default='DRAFT',
         protected=True
     )
+    state_before_deletion = models.CharField(
+        max_length=9,
+        null=True,
+        blank=True,
+        editable=False,
+    )
     name = models.CharField(
         max_length=50,
     )
@@ -2467,10 +3013,14 @@ class Project(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
     @transition(state, '*', 'DELETED')
     def delete(self, *args, hard=False, **kwargs):
         if hard:
-            super().delete(*args, **kwargs)
-        else:
-            self.deleted = True
-            self.save()
+            return super().delete(*args, **kwargs)
+        if self.state != 'DELETED':
+            self.state_before_deletion = self.state
+        return self.soft_delete()
+
+    @transition(state, 'DELETED', GET_STATE(restored_state, states=[value for value, _ in STATES]))
+    def undelete(self):
+        return self.soft_undelete()
 
 
 class Resource(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
@@ -2537,8 +3087,9 @@ class Resource(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
                 return None
 
 
-class Role(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
+class Role(MixinTimestamps, MixinUUIDs, MixinAuthorization, MixinSoftDeletion, models.Model):
     objects = RoleManager()
+    deleted = models.BooleanField(default=False)
 
     shift = models.ForeignKey(
         to='Shift',
@@ -2610,6 +3161,54 @@ class Role(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
             return self.task.operation
         return self.shift.task.operation
 
+    @cached_property
+    def person_properties_by_necessity(self):
+        """
+        dict[str, list[PersonProperty()]]: Returns the PersonProperties of the
+        RoleSpecifications grouped by necessity.
+
+        Uses prefetched RoleSpecifications and PersonProperties, if available.
+        """
+        necessities = {}
+        for specification in self.rolespecification_set.all():
+            properties = necessities.setdefault(specification.necessity, [])
+            properties.extend(specification.person_properties.all())
+        return necessities
+
+    @classmethod
+    def bulk_create_with_specifications(cls, roles):
+        """
+        Creates Roles and their RoleSpecifications with bulk operations.
+
+        The number of queries is independent of the number of Roles,
+        RoleSpecifications and PersonProperties. Sends `bulk_changed` with
+        the created Roles.
+
+        Args:
+            roles (list[tuple[Role(), dict[str, list[int]]]]): Tuples of
+                unpersisted Roles and PersonProperty ids by necessity.
+
+        Returns:
+            list[Role()]: The created Roles.
+        """
+        with transaction.atomic():
+            instances = cls.objects.bulk_create([role for role, _ in roles])
+            RoleSpecification.bulk_set_person_properties({
+                (role.id, necessity): property_ids
+                for role, (_, necessities) in zip(instances, roles)
+                for necessity, property_ids in necessities.items()
+            })
+            bulk_changed.send(sender=cls, instances=instances, action='CREATED')
+        return instances
+
+    def delete(self, *args, hard=False, **kwargs):
+        if hard:
+            return super().delete(*args, **kwargs)
+        return self.soft_delete()
+
+    def undelete(self):
+        return self.soft_undelete()
+
     # permissions
     @classmethod
     def permitted(cls, role, user, action):
@@ -2666,6 +3265,51 @@ class RoleSpecification(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.
         verbose_name = _("role specificatioin")
         verbose_name_plural = _("role specifications")
 
+    @classmethod
+    def bulk_set_person_properties(cls, specifications):
+        """
+        Sets the PersonProperties of RoleSpecifications with bulk operations.
+
+        Missing RoleSpecifications are created, the PersonProperties of existing
+        ones are replaced. The number of queries is independent of the number
+        of RoleSpecifications and PersonProperties.
+
+        Args:
+            specifications (dict[tuple[int, str], list[int]]): PersonProperty
+                ids by tuples of Role id and necessity.
+
+        Returns:
+            dict[tuple[int, str], RoleSpecification()]: RoleSpecifications by
+                tuples of Role id and necessity.
+        """
+        if not specifications:
+            return {}
+        # fetch existing specifications
+        role_ids = {role_id for role_id, _ in specifications}
+        existing = {
+            (specification.role_id, specification.necessity): specification
+            for specification in cls.objects.filter(role__in=role_ids)
+        }
+        # create missing specifications
+        missing = [
+            cls(role_id=role_id, necessity=necessity)
+            for role_id, necessity in specifications
+            if (role_id, necessity) not in existing
+        ]
+        for specification in cls.objects.bulk_create(missing):
+            existing[(specification.role_id, specification.necessity)] = specification
+        # replace person properties
+        through = cls.person_properties.through
+        through.objects.filter(
+            rolespecification__in=[existing[key].id for key in specifications]
+        ).delete()
+        through.objects.bulk_create([
+            through(rolespecification_id=existing[key].id, personproperty_id=property_id)
+            for key, property_ids in specifications.items()
+            for property_id in property_ids
+        ])
+        return {key: existing[key] for key in specifications}
+
     # permissions
     @classmethod
     def permitted(cls, role_specification, user, action):
@@ -2701,9 +3345,14 @@ class RoleSpecification(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.
                 return None
 
 
-class Shift(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
+class Shift(MixinTimestamps, MixinUUIDs, MixinAuthorization, MixinSoftDeletion, models.Model):
     objects = ShiftManager()
     deleted = models.BooleanField(default=False)
+    deletion_cascade = {
+        'Role': ['shift'],
+        'Location': ['shift'],
+        'Message': ['scope'],
+    }
 
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
@@ -2721,6 +3370,12 @@ class Shift(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
         default='DRAFT',
         protected=True
     )
+    state_before_deletion = models.CharField(
+        max_length=9,
+        null=True,
+        blank=True,
+        editable=False,
+    )
     task = models.ForeignKey(
         to='Task',
         on_delete=models.CASCADE,
@@ -2824,15 +3479,25 @@ class Shift(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
     @transition(state, '*', 'DELETED')
     def delete(self, *args, hard=False, **kwargs):
         if hard:
-            super().delete(*args, **kwargs)
-        else:
-            self.deleted = True
-            self.save()
+            return super().delete(*args, **kwargs)
+        if self.state != 'DELETED':
+            self.state_before_deletion = self.state
+        return self.soft_delete()
+
+    @transition(state, 'DELETED', GET_STATE(restored_state, states=[value for value, _ in STATES]))
+    def undelete(self):
+        return self.soft_undelete()
 
 
-class Task(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
+class Task(MixinTimestamps, MixinUUIDs, MixinAuthorization, MixinSoftDeletion, models.Model):
     objects = TaskManager()
     deleted = models.BooleanField(default=False)
+    deletion_cascade = {
+        'Shift': ['task'],
+        'Role': ['task', 'shift__task'],
+        'Location': ['task', 'shift__task'],
+        'Message': ['scope'],
+    }
 
     operation = models.ForeignKey(
         to='Operation',
@@ -2854,6 +3519,12 @@ class Task(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
         default='DRAFT',
         protected=True
     )
+    state_before_deletion = models.CharField(
+        max_length=9,
+        null=True,
+        blank=True,
+        editable=False,
+    )
     name = models.CharField(
         max_length=100,
     )
@@ -2918,6 +3589,59 @@ class Task(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
         """Organisation(): Returns the Organization of the Task."""
         return self.operation.project.organization
 
+    def create_shifts(self, shifts, publish=False):
+        """
+        Creates Shifts of the Task with bulk operations.
+
+        The template Roles (incl. RoleSpecifications) and template Locations of
+        the Task are copied for each Shift. The number of queries is independent
+        of the number of Shifts, Roles and Locations. Sends `bulk_changed` with
+        the created Shifts and Roles.
+
+        Args:
+            shifts (list[dict]): Field values of each Shift, e.G. start_time,
+                end_time and enrollment_deadline.
+            publish (bool, optional): Publishes the Shifts, if True.
+
+        Returns:
+            list[Shift()]: The created Shifts.
+        """
+        with transaction.atomic():
+            # create shifts
+            instances = [Shift(task=self, **values) for values in shifts]
+            if publish:
+                for shift in instances:
+                    shift.publish()
+            instances = Shift.objects.bulk_create(instances)
+            # copy template roles
+            templates = list(
+                Role.objects.filter(task=self, is_template=True).prefetch_related(
+                    'rolespecification_set__person_properties')
+            )
+            roles = Role.objects.bulk_create([
+                template.copy(is_template=False, task=None, shift=shift)
+                for shift in instances
+                for template in templates
+            ])
+            RoleSpecification.bulk_set_person_properties({
+                (role.id, specification.necessity): [
+                    person_property.id
+                    for person_property in specification.person_properties.all()
+                ]
+                for role, template in zip(roles, templates * len(instances))
+                for specification in template.rolespecification_set.all()
+            })
+            # copy template locations
+            templates = list(Location.objects.filter(task=self, is_template=True))
+            Location.objects.bulk_create([
+                template.copy(is_template=False, task=None, shift=shift)
+                for shift in instances
+                for template in templates
+            ])
+            bulk_changed.send(sender=Shift, instances=instances, action='CREATED')
+            bulk_changed.send(sender=Role, instances=roles, action='CREATED')
+        return instances
+
     # permissions
     @classmethod
     def permitted(cls, task, user, action):
@@ -2973,10 +3697,14 @@ class Task(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
     @transition(state, '*', 'DELETED')
     def delete(self, *args, hard=False, **kwargs):
         if hard:
-            super().delete(*args, **kwargs)
-        else:
-            self.deleted = True
-            self.save()
+            return super().delete(*args, **kwargs)
+        if self.state != 'DELETED':
+            self.state_before_deletion = self.state
+        return self.soft_delete()
+
+    @transition(state, 'DELETED', GET_STATE(restored_state, states=[value for value, _ in STATES]))
+    def undelete(self):
+        return self.soft_undelete()
 
 
 class TaskField(MixinTimestamps, MixinUUIDs, MixinAuthorization, models.Model):
@@ -0,0 +1,150 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+
+
+class Presence:
+    """
+    TTL based presence of persons per operation.
+
+    Each connection of a person refreshes its entry with heartbeats. Entries
+    without heartbeat for `ttl` seconds expire, so persons of crashed
+    processes go offline without cleanup. A person is online as long as any
+    of its connections is present. No database writes are involved.
+
+    Expired entries are pruned by `touch()` and `leave()`, which report the
+    persons gone offline by the pruning. As present admins refresh their own
+    entries with heartbeats, they notice the expiry of other persons within
+    one heartbeat interval.
+
+    Backends:
+    - `redis`: Redis sorted sets, shared between processes. Each operation
+      has one sorted set of connections scored by expiry time.
+    - `local`: Memory of the process, for development and tests.
+
+    Args:
+        ttl (int): Seconds after which entries without heartbeat expire.
+        backend (str): 'redis' or 'local'.
+        host (str): Redis host of the redis backend.
+        port (int): Redis port of the redis backend.
+    """
+    def __init__(self, ttl, backend='local', host=None, port=None):
+        self.ttl = ttl
+        self.backend = backend
+        if backend == 'redis':
+            # dependency of channels_redis, only needed for the redis backend
+            import redis
+            self.redis = redis.Redis(host=host, port=port, decode_responses=True)
+        else:
+            self.lock = threading.Lock()
+            self.operations = {}
+
+    @staticmethod
+    def key(operation_id):
+        return f"georga:presence:operation:{operation_id}"
+
+    @staticmethod
+    def member(person_id, connection):
+        return f"{person_id}:{connection}"
+
+    @staticmethod
+    def persons(members):
+        return {int(member.split(':', 1)[0]) for member in members}
+
+    @classmethod
+    def expired(cls, expired, members):
+        """Returns the ids of the persons without members left after the expiry."""
+        return cls.persons(expired) - cls.persons(members)
+
+    def _members(self, operation_id, now):
+        members = self.operations.setdefault(operation_id, {})
+        expired = [member for member, expiry in members.items() if expiry <= now]
+        for member in expired:
+            del members[member]
+        return members, self.expired(expired, members)
+
+    def _prune(self, pipeline, key, now):
+        # executed as transaction, so expired entries are reported only once
+        pipeline.zrangebyscore(key, '-inf', now)
+        pipeline.zremrangebyscore(key, '-inf', now)
+        pipeline.zrange(key, 0, -1)
+
+    def touch(self, operation_id, person_id, connection):
+        """
+        Adds or refreshes the entry of a connection.
+
+        Args:
+            operation_id (int): Id of the operation.
+            person_id (int): Id of the person.
+            connection (str): Id of the connection, e.g. the channel name.
+
+        Returns:
+            tuple(bool, set(int)): True if the person was offline before, and
+                the ids of the persons gone offline by expired entries.
+        """
+        if self.backend == 'redis':
+            key = self.key(operation_id)
+            now = time.time()
+            pipeline = self.redis.pipeline()
+            self._prune(pipeline, key, now)
+            pipeline.zadd(key, {self.member(person_id, connection): now + self.ttl})
+            pipeline.expire(key, self.ttl)
+            expired, _removed, members, _added, _expire = pipeline.execute()
+            return person_id not in self.persons(members), self.expired(expired, members)
+        now = time.monotonic()
+        with self.lock:
+            members, expired = self._members(operation_id, now)
+            offline = person_id not in self.persons(members)
+            members[self.member(person_id, connection)] = now + self.ttl
+        return offline, expired
+
+    def leave(self, operation_id, person_id, connection):
+        """
+        Removes the entry of a connection.
+
+        Returns:
+            tuple(bool, set(int)): True if the person went offline by the
+                removal, and the ids of the persons gone offline by expired
+                entries.
+        """
+        if self.backend == 'redis':
+            key = self.key(operation_id)
+            pipeline = self.redis.pipeline()
+            self._prune(pipeline, key, time.time())
+            pipeline.zrem(key, self.member(person_id, connection))
+            pipeline.zrange(key, 0, -1)
+            expired, _expired, members, removed, remaining = pipeline.execute()
+            offline = bool(removed) and person_id not in self.persons(remaining)
+            return offline, self.expired(expired, members)
+        with self.lock:
+            members, expired = self._members(operation_id, time.monotonic())
+            removed = members.pop(self.member(person_id, connection), None) is not None
+            return removed and person_id not in self.persons(members), expired
+
+    def online(self, operation_id):
+        """
+        Returns the ids of the persons online for an operation.
+
+        Returns:
+            set(int): Ids of the persons.
+        """
+        if self.backend == 'redis':
+            members = self.redis.zrangebyscore(self.key(operation_id), f"({time.time()}", '+inf')
+            return self.persons(members)
+        now = time.monotonic()
+        with self.lock:
+            members = self.operations.get(operation_id, {})
+            return self.persons(member for member, expiry in members.items() if expiry > now)
+
+
+@lru_cache(maxsize=None)
+def get_presence():
+    """Returns the Presence configured in `settings.SUBSCRIPTION_PRESENCE`."""
+    return Presence(
+        settings.SUBSCRIPTION_PRESENCE_TTL, settings.SUBSCRIPTION_PRESENCE,
+        settings.REDIS_HOST, settings.REDIS_PORT)
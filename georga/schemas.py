@@ -1,32 +1,45 @@
 # For copyright and license terms, see COPYRIGHT.md (top level of repository)
 # Repository: https://github.com/georga-app/georga-server-django
 
+import hashlib
 import json
 import logging
-from datetime import datetime
+from collections import Counter, defaultdict
+from copy import copy
+from datetime import datetime, timedelta
+from functools import partial
+from types import SimpleNamespace
 
 import graphql_jwt
-from asgiref.sync import async_to_sync
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.db import database_sync_to_async
 from channels.layers import get_channel_layer
 from channels_graphql_ws import Subscription
+from django.apps import apps
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db.models import Q, ManyToManyField, ManyToManyRel, ManyToOneRel
+from django.db import connections, transaction
+from django.db.models import (
+    Q, ManyToManyField, ManyToManyRel, ManyToOneRel, QuerySet, prefetch_related_objects
+)
 from django.db.models.fields.related import ForeignKey
 from django.forms import (
     ModelForm, ModelChoiceField, ModelMultipleChoiceField,
     IntegerField, CharField, ChoiceField, BooleanField
 )
-from django.forms.models import ModelFormMetaclass, model_to_dict
+from django.forms.models import ModelFormMetaclass
+from django.http import HttpRequest
 from django_filters import FilterSet, UUIDFilter
 from graphene import (
-    Schema, Mutation, ObjectType, Field, Union, List,
-    ID, UUID, String, Int, NonNull
+    Schema, Mutation, ObjectType, InputObjectType, Field, Union, List, Enum,
+    ID, UUID, String, Int, Float, Boolean, NonNull, DateTime, JSONString
 )
-from graphene.relay import Node
+from graphene.relay import ClientIDMutation, Connection, Node
+from graphene.relay.connection import connection_adapter, page_info_adapter
 from graphene.types.dynamic import Dynamic
 from graphene_django import DjangoObjectType
 from graphene_django.converter import (
@@ -41,12 +54,22 @@ from graphene_django.filter import (
 )
 from graphene_django.forms import GlobalIDMultipleChoiceField, GlobalIDFormField
 from graphene_django.forms.mutation import DjangoModelFormMutation
+from graphene_django.types import ErrorType
+from graphene_django.utils import maybe_queryset
+from graphql import GraphQLError
 from graphql_jwt.exceptions import JSONWebTokenError, PermissionDenied
 from graphql_jwt.decorators import login_required, staff_member_required
-from graphql_relay import from_global_id
+from graphql_relay import (
+    connection_from_array_slice, cursor_to_offset, from_global_id,
+    get_offset_with_default, offset_to_cursor, to_global_id,
+)
 
 from .auth import jwt_decode, object_permits_user
+from .backpressure import websocket_connections
+from .broadcasting import broadcasts
+from .coalescing import ChangeCoalescer
 from .email import Email
+from .eventlog import get_event_log
 from .models import (
     ACE,
     Device,
@@ -70,6 +93,7 @@ from .models import (
     Task,
     TaskField,
 )
+from .presence import get_presence
 
 channel_layer = get_channel_layer()
 
@@ -199,10 +223,22 @@ class UUIDModelForm(ModelForm, metaclass=GFKModelFormMetaclass):
     - Sets fields required if listed in Meta.required_fields.
     - Sets fields unrequired if not listed in Meta.only_fields.
 
-    Bugfixes:
-    - Fixes bug of saving fields present in form but not in request data.
+    Partial updates:
+    - Validates and saves only the fields present in the request data, if an
+      existing instance is updated. Fields not submitted are neither loaded
+      (e.g. ManyToMany fields) nor validated nor written. This also fixes the
+      bug of saving fields present in form but not in request data, see
+      https://github.com/graphql-python/graphene-django/issues/725
+    - Subclasses overriding `save()` should save the instance via
+      `save_instance()` to restrict the UPDATE to the submitted fields.
     """
     def __init__(self, *args, **kwargs):
+        # restrict model fields to the submitted fields for partial updates
+        data = kwargs.get('data', args[0] if args else None)
+        instance = kwargs.get('instance')
+        if data is not None and instance is not None and instance.pk:
+            self._meta = copy(self._meta)
+            self._meta.fields = [name for name in self._meta.fields or self.base_fields if name in data]
         super().__init__(*args, **kwargs)
 
         # set to_field_name of foreign relation fields to uuid if provided as input
@@ -224,12 +260,16 @@ class UUIDModelForm(ModelForm, metaclass=GFKModelFormMetaclass):
                     field.required = False
             delattr(self.Meta, 'only_fields')
 
-        # fix bug of saving fields present in form but not in request data
-        # see https://github.com/graphql-python/graphene-django/issues/725
-        if self.is_bound and self.instance.pk:
-            modeldict = model_to_dict(self.instance)
-            modeldict.update(self.data)
-            self.data = modeldict
+    @property
+    def is_partial(self):
+        return self.is_bound and bool(self.instance.pk)
+
+    def full_clean(self):
+        # validate only the submitted fields for partial updates
+        if self.is_partial:
+            self.fields = {
+                name: field for name, field in self.fields.items() if name in self.data}
+        return super().full_clean()
 
     def _post_clean(self, *args, **kwargs):
         # assigns model instance to GenericForeignKey fields, if GlobalID was provided
@@ -238,13 +278,73 @@ class UUIDModelForm(ModelForm, metaclass=GFKModelFormMetaclass):
                 continue
             _type, _id = from_global_id(self.data[name])
             foreign_model_name = _type.removesuffix("Type").lower()
-            foreign_model_class = ContentType.objects.get(
-                app_label='georga', model=foreign_model_name
+            foreign_model_class = ContentType.objects.get_by_natural_key(
+                'georga', foreign_model_name
             ).model_class()
             foreign_model_instance = foreign_model_class.objects.get(uuid=_id)
             setattr(self.instance, name, foreign_model_instance)
         return super()._post_clean(*args, **kwargs)
 
+    def get_update_fields(self, *fields):
+        """
+        Returns the names of the fields to write for partial updates.
+
+        Args:
+            *fields (str): Further fields to write, e.g. fields set in `save()`.
+
+        Returns:
+            list[str]: Submitted concrete fields, concrete fields of submitted
+                GenericForeignKey fields, auto_now fields and `fields`.
+        """
+        opts = self.instance._meta
+        update_fields = set(fields)
+        for field in opts.concrete_fields:
+            if field.name in self.cleaned_data or getattr(field, 'auto_now', False):
+                update_fields.add(field.name)
+        for name in getattr(self._meta, 'gfk_fields', []):
+            if name in self.data:
+                gfk = opts.get_field(name)
+                update_fields.update([gfk.ct_field, gfk.fk_field])
+        return [field.name for field in opts.concrete_fields if field.name in update_fields]
+
+    def save_instance(self, instance, *fields):
+        """
+        Saves the instance, restricted to the submitted fields for partial updates.
+
+        Args:
+            instance (django.db.models.Model): Instance of the form.
+            *fields (str): Further fields to write for partial updates.
+        """
+        if self.is_partial:
+            instance.save(update_fields=self.get_update_fields(*fields))
+        else:
+            instance.save()
+
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        if commit:
+            self.save_instance(instance)
+            self._save_m2m()
+        return instance
+
+
+class UUIDConnection(Connection):
+    """
+    Connection with the total count of the connection.
+
+    Counting:
+    - Adds totalCount field, counted according to the countMode argument.
+    """
+    class Meta:
+        abstract = True
+
+    total_count = Int(
+        required=True,
+        description="Total number of entries, capped or estimated by countMode.")
+
+    def resolve_total_count(self, info):
+        return getattr(self, 'total_count', self.length)
+
 
 class UUIDDjangoObjectType(DjangoObjectType):
     """
@@ -256,7 +356,9 @@ class UUIDDjangoObjectType(DjangoObjectType):
 
     Conveniece:
     - Adds relay.Node interface if not specified in Meta.interfaces.
+    - Uses UUIDConnection if not specified in Meta.connection_class.
     - Sets permissions for query specified in Meta.permissions.
+    - Prefetches related lookups for querysets specified in Meta.prefetch_related.
     """
 
     class Meta:
@@ -268,6 +370,15 @@ class UUIDDjangoObjectType(DjangoObjectType):
         if not kwargs.get('interfaces'):
             kwargs['interfaces'] = (Node,)
 
+        # use UUIDConnection if not specified in Meta.connection_class
+        if not kwargs.get('connection_class'):
+            kwargs['connection_class'] = UUIDConnection
+
+        # prefetch related lookups for querysets specified in Meta.prefetch_related
+        prefetch_related = kwargs.get('prefetch_related', [])
+        if prefetch_related:
+            cls.get_queryset = cls._prefetch_related(cls.get_queryset, prefetch_related)
+
         # set permissions for query specified in Meta.permissions
         cls.permission = kwargs.get('permissions', [])
         for permission in cls.permission:
@@ -279,6 +390,16 @@ class UUIDDjangoObjectType(DjangoObjectType):
 
         super().__init_subclass_with_meta__(*args, **kwargs)
 
+    @staticmethod
+    def _prefetch_related(get_queryset, lookups):
+        _func = get_queryset.__func__
+
+        def wrapper(queryset, info):
+            return get_queryset(queryset, info).prefetch_related(*lookups)
+        # check on __func__ introduced in graphene-django 3.1.5
+        wrapper.__func__ = _func
+        return wrapper
+
     @classmethod
     def get_node(cls, info, uuid):
         # change queryset to fetch objects by uuid model field
@@ -302,6 +423,14 @@ class UUIDDjangoFilterConnectionField(DjangoFilterConnectionField):
     - Converts id to list for multiple choice fields.
     - Inserts uuid to filter field predicate string for forgein models.
 
+    Batching:
+    - Registers the instances of the resolved page for request loaders.
+
+    Counting:
+    - Adds countMode argument, defaults to settings.GRAPHQL_CONNECTION_COUNT_MODES.
+    - Counts only the rows needed for pagination for CAPPED and ESTIMATE modes.
+    - Estimates totalCount via the query planner for ESTIMATE mode on PostgreSQL.
+
     Bugfixes:
     - Fixes a bug that converts model id fields to graphene.Float schema fields.
     """
@@ -317,6 +446,12 @@ class UUIDDjangoFilterConnectionField(DjangoFilterConnectionField):
     #         return f"{lookup}__uuid"
     #     return lookup
 
+    def __init__(self, *args, **kwargs):
+        # add countMode argument
+        kwargs.setdefault("count_mode", ConnectionCountMode(
+            description="Counting mode for totalCount and pageInfo."))
+        super().__init__(*args, **kwargs)
+
     @property
     def filtering_args(self):
         # fix a bug that converts model id fields to graphene.Float schema fields
@@ -369,6 +504,88 @@ class UUIDDjangoFilterConnectionField(DjangoFilterConnectionField):
             connection, iterable, info, args, filtering_args, filterset_class
         )
 
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        # default to settings.GRAPHQL_CONNECTION_COUNT_MODES
+        count_mode = args.pop("count_mode", None) or settings.GRAPHQL_CONNECTION_COUNT_MODES.get(
+            connection._meta.node._meta.model.__name__, ConnectionCountMode.EXACT)
+        count_mode = getattr(count_mode, 'name', count_mode)
+
+        # convert offset to after cursor, see DjangoConnectionField.resolve_connection()
+        offset = args.pop("offset", None)
+        after = args.get("after")
+        if offset:
+            if after:
+                offset += cursor_to_offset(after) + 1
+            args["after"] = offset_to_cursor(offset - 1)
+        if max_limit is not None and args.get("first") is None and args.get("last") is None:
+            args["first"] = max_limit
+
+        # count only the rows needed for pagination
+        iterable = maybe_queryset(iterable)
+        after_offset = get_offset_with_default(args.get("after"), -1)
+        before_offset = get_offset_with_default(args.get("before"), None)
+        if args.get("first") is not None:
+            needed = after_offset + 1 + args["first"]
+        else:
+            # backward pagination from the end needs the exact count
+            needed = before_offset
+        if (count_mode == ConnectionCountMode.EXACT.name or needed is None
+                or not isinstance(iterable, QuerySet)):
+            connection = super().resolve_connection(connection, args, iterable)
+            connection.total_count = connection.length
+            return connection
+        limit = max(settings.GRAPHQL_CONNECTION_COUNT_CAP, needed) + 1
+        array_length = iterable[:limit].count()
+        total_count = array_length
+        if count_mode == ConnectionCountMode.ESTIMATE.name and array_length == limit:
+            total_count = max(cls.estimate_count(iterable), array_length)
+
+        # slice the queryset, see DjangoConnectionField.resolve_connection()
+        slice_start = min(after_offset + 1, array_length)
+        connection = connection_from_array_slice(
+            iterable[slice_start:],
+            args,
+            slice_start=slice_start,
+            array_length=array_length,
+            array_slice_length=array_length - slice_start,
+            connection_type=partial(connection_adapter, connection),
+            edge_type=connection.Edge,
+            page_info_type=page_info_adapter,
+        )
+        connection.iterable = iterable
+        connection.length = array_length
+        connection.total_count = total_count
+        return connection
+
+    @staticmethod
+    def estimate_count(queryset):
+        """Returns the row estimate of the query planner or 0 if unsupported."""
+        db_connection = connections[queryset.db]
+        if db_connection.vendor != 'postgresql':
+            return 0
+        sql, params = queryset.query.sql_with_params()
+        with db_connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @classmethod
+    def connection_resolver(
+        cls, resolver, connection, default_manager, queryset_resolver, max_limit,
+        enforce_first_or_last, root, info, **args
+    ):
+        result = super().connection_resolver(
+            resolver, connection, default_manager, queryset_resolver, max_limit,
+            enforce_first_or_last, root, info, **args
+        )
+        # register the instances of the resolved page for request loaders
+        if isinstance(result, connection):
+            RequestLoader.register(info, [edge.node for edge in result.edges])
+        return result
+
 
 class UUIDDjangoModelFormMutation(DjangoModelFormMutation):
     """
@@ -385,7 +602,21 @@ class UUIDDjangoModelFormMutation(DjangoModelFormMutation):
     - Removes object return schema field if other schema fields are defined.
     - Sets id schema field required if not specified in Meta.required_fields.
     - Deletes kwargs for graphql variables defined but not passed
+
+    Soft deletion:
+    - Looks up soft deleted instances too, if `include_deleted` is set
+      (e.g. for undelete mutations).
+
+    Idempotency:
+    - Adds optional idempotencyKey input field.
+    - Returns the stored payload for repeated keys of the same user within
+      settings.GRAPHQL_IDEMPOTENCY_TTL, if the hash of the input matches.
+    - Raises an error for repeated keys with a different input.
+    - Releases the lock of keys, whose transaction was rolled back, at the
+      end of the request (see `release_idempotency_locks()`).
     """
+    idempotency_lock_timeout = 60
+    include_deleted = False
 
     class Meta:
         abstract = True
@@ -411,6 +642,12 @@ class UUIDDjangoModelFormMutation(DjangoModelFormMutation):
         if 'id' not in kwargs.get('only_fields', ['id']):
             kwargs['exclude_fields'] = kwargs.get('exclude_fields', []) + ['id']
 
+        # add optional idempotencyKey input field
+        cls.Input = type("Input", (cls.__dict__.get('Input', object),), {
+            'idempotency_key': String(
+                description="Key to return the stored payload for repeated mutations."),
+        })
+
         super().__init_subclass_with_meta__(*args, **kwargs)
 
         # remove object return schema field if other schema fields are defined
@@ -422,6 +659,64 @@ class UUIDDjangoModelFormMutation(DjangoModelFormMutation):
         if id_field and 'id' in kwargs.get('required_fields', ['id']):
             id_field._type = NonNull(id_field._type)
 
+    @classmethod
+    def mutate_and_get_payload(cls, root, info, idempotency_key=None, **input):
+        user = info.context.user
+        if not idempotency_key or not user.is_authenticated:
+            return super().mutate_and_get_payload(root, info, **input)
+
+        # return the stored payload for repeated keys of the same user and input
+        key = "idempotency:" + hashlib.sha256(json.dumps(
+            [cls.__name__, user.pk, idempotency_key]).encode()).hexdigest()
+        input_hash = hashlib.sha256(json.dumps(input, sort_keys=True, default=str).encode()).hexdigest()
+        if not cache.add(key, {'input': input_hash}, timeout=cls.idempotency_lock_timeout):
+            stored = cache.get(key) or {}
+            if stored.get('input') != input_hash:
+                raise GraphQLError("Idempotency key was already used with a different input.")
+            if 'payload' not in stored:
+                raise GraphQLError("Mutation with this idempotency key is in progress.")
+            return cls(**stored['payload'])
+
+        # store the payload after commit, if the mutation succeeded
+        try:
+            payload = super().mutate_and_get_payload(root, info, **input)
+        except Exception:
+            cache.delete(key)
+            raise
+        if payload.errors:
+            cache.delete(key)
+            return payload
+        fields = {name: getattr(payload, name, None) for name in cls._meta.fields}
+        locks = cls.idempotency_locks(info.context)
+        locks.add(key)
+
+        def store():
+            cache.set(key, {'input': input_hash, 'payload': fields}, timeout=settings.GRAPHQL_IDEMPOTENCY_TTL)
+            locks.discard(key)
+        transaction.on_commit(store)
+        return payload
+
+    @staticmethod
+    def idempotency_locks(request):
+        """Returns the keys locked by the request and not yet committed."""
+        if not hasattr(request, 'idempotency_locks'):
+            request.idempotency_locks = set()
+        return request.idempotency_locks
+
+    @classmethod
+    def release_idempotency_locks(cls, request):
+        """
+        Releases the locks of keys, whose transaction was not committed.
+
+        Called at the end of the request, after the outermost transaction was
+        committed or rolled back (e.g. `ATOMIC_MUTATIONS`, batched requests),
+        as rolled back transactions discard the `on_commit()` callbacks.
+        """
+        locks = getattr(request, 'idempotency_locks', None)
+        if locks:
+            cache.delete_many(list(locks))
+            locks.clear()
+
     @classmethod
     def get_form(cls, root, info, **input):
         # pass Meta.required_fields and Meta.only_fields to form class
@@ -445,7 +740,8 @@ class UUIDDjangoModelFormMutation(DjangoModelFormMutation):
         global_id = input.pop("id", None)
         if global_id:
             _, uuid = from_global_id(global_id)
-            instance = cls._meta.model._default_manager.get(uuid=uuid)
+            manager = cls._meta.model._base_manager if cls.include_deleted else cls._meta.model._default_manager
+            instance = manager.get(uuid=uuid)
             kwargs["instance"] = instance
 
         # replace foreign model reference ids with uuids
@@ -544,6 +840,89 @@ class GFKFilterSet(FilterSet):
         return result
 
 
+# Loaders =====================================================================
+
+class RequestLoader:
+    """
+    Base class for request scoped loaders to batch field resolution.
+
+    Connection fields register the instances of each resolved page. The first
+    `load()` of an instance resolves the values for all registered instances
+    of the same model at once via `batch_function`, which subclasses declare
+    as function of the user and a set of instances of the same model,
+    returning the values by instance.
+
+    Loaders are stored on the HTTP request and shared by all operations
+    executed for it. Other contexts (e.g. websocket connections) are long
+    lived, so a new loader without registered instances is used each time.
+
+    Example::
+
+        class SomeLoader(RequestLoader):
+            batch_function = staticmethod(
+                lambda user, instances: {instance: instance.some_value for instance in instances})
+
+        def resolve_some_value(parent, info):
+            return SomeLoader.get(info).load(parent)
+    """
+    batch_function = None
+
+    def __init__(self, info, instances=None):
+        self.user = info.context.user
+        self.instances = instances or {}
+        self.values = {}
+
+    @staticmethod
+    def _is_request_scoped(info):
+        return isinstance(info.context, HttpRequest)
+
+    @staticmethod
+    def _prepare_context(context):
+        if not hasattr(context, 'loaders'):
+            RequestLoader.reset(context)
+
+    @classmethod
+    def register(cls, info, instances):
+        """Registers instances of a connection page on the request."""
+        if not cls._is_request_scoped(info):
+            return
+        cls._prepare_context(info.context)
+        for instance in instances:
+            info.context.loader_instances.setdefault(type(instance), set()).add(instance)
+
+    @classmethod
+    def get(cls, info):
+        """Returns the loader of the request, a new one for other contexts."""
+        if not cls._is_request_scoped(info):
+            return cls(info)
+        cls._prepare_context(info.context)
+        if cls not in info.context.loaders:
+            info.context.loaders[cls] = cls(info, info.context.loader_instances)
+        return info.context.loaders[cls]
+
+    @staticmethod
+    def reset(context):
+        """Discards all loaders and registered instances of a request."""
+        context.loaders = {}
+        context.loader_instances = {}
+
+    def load(self, instance):
+        """Returns the value for an instance, batch loads unloaded ones."""
+        if instance not in self.values:
+            instances = {
+                registered for registered in self.instances.get(type(instance), [])
+                if registered not in self.values
+            }
+            instances.add(instance)
+            self.values.update(self.batch_function(self.user, instances))
+        return self.values[instance]
+
+
+class ChannelFiltersLoader(RequestLoader):
+    """Loads the merged channel filters of hierarchy scopes for the user."""
+    batch_function = staticmethod(MessageFilter.bulk_channel_filters)
+
+
 # Lookups =====================================================================
 
 # see https://docs.djangoproject.com/en/4.1/ref/models/querysets/#field-lookups-1
@@ -589,11 +968,91 @@ LOOKUPS_DATETIME = ['exact', 'gt', 'lte']
 
 # Non-Model ===================================================================
 
+class ConnectionCountMode(Enum):
+    EXACT = 'EXACT'
+    CAPPED = 'CAPPED'
+    ESTIMATE = 'ESTIMATE'
+
+    @property
+    def description(self):
+        if self == ConnectionCountMode.EXACT:
+            return "Counts all entries."
+        if self == ConnectionCountMode.CAPPED:
+            return "Counts up to GRAPHQL_CONNECTION_COUNT_CAP entries beyond the page."
+        if self == ConnectionCountMode.ESTIMATE:
+            return "Estimates the count via the query planner, if the cap is exceeded."
+
+
+class ChangeAction(Enum):
+    CREATED = 'CREATED'
+    UPDATED = 'UPDATED'
+    DELETED = 'DELETED'
+
+
+class PresenceAction(Enum):
+    JOINED = 'JOINED'
+    LEFT = 'LEFT'
+
+
 class ChannelFiltersType(ObjectType):
     for channel in MessageFilter.CHANNELS:
         vars()[channel] = String()
 
 
+class ChangeEventType(ObjectType):
+    event_id = String(required=True)
+    model = String(required=True)
+    action = ChangeAction(required=True)
+    id = ID(required=True)
+    data = JSONString(required=True, description="Fields of the changed instance.")
+
+
+class ChangeEventsType(ObjectType):
+    events = NonNull(List(NonNull(ChangeEventType)))
+    last_event_id = String(description="Id to resume from.")
+    resync = Boolean(required=True, description="True if missed events were discarded already.")
+
+
+class WebsocketConnectionMetricsType(ObjectType):
+    connection = String(required=True, description="Channel name of the connection.")
+    person = ID()
+    queued_messages = Int(required=True, description="Number of messages waiting to be sent.")
+    unacknowledged_bytes = Int(description="Bytes not acknowledged by the client yet, null without acknowledgements.")
+    sent_messages = Int(required=True)
+    dropped_messages = Int(required=True, description="Number of notifications dropped by the slow consumer policy.")
+    coalesced_messages = Int(required=True, description="Number of notifications replaced by a newer one.")
+    send_latency_avg = Float(required=True, description="Average milliseconds from queuing to the handover to the ASGI server.")
+    send_latency_max = Float(required=True, description="Maximum milliseconds from queuing to the handover to the ASGI server.")
+
+
+class SubscriptionMetricsType(ObjectType):
+    change_events = Int(required=True, description="Number of model changes.")
+    coalesced_changes = Int(required=True, description="Number of changes merged into a pending change.")
+    sent_changes = Int(required=True, description="Number of notifications sent.")
+    pending_changes = Int(required=True, description="Number of notifications waiting for the window.")
+    websocket_connections = Int(required=True, description="Number of open websocket connections of the process.")
+    queued_messages = Int(required=True, description="Number of messages waiting to be sent.")
+    max_queued_messages = Int(required=True, description="Maximum number of waiting messages of a connection.")
+    sent_messages = Int(required=True)
+    dropped_messages = Int(required=True, description="Number of notifications dropped by the slow consumer policy.")
+    coalesced_messages = Int(required=True, description="Number of notifications replaced by a newer one.")
+    disconnected_consumers = Int(required=True, description="Number of connections closed as slow consumer.")
+    send_latency_avg = Float(required=True, description="Average milliseconds from queuing to the handover to the ASGI server.")
+    send_latency_max = Float(required=True, description="Maximum milliseconds from queuing to the handover to the ASGI server.")
+    connections = NonNull(List(NonNull(WebsocketConnectionMetricsType)))
+
+
+class PresenceType(ObjectType):
+    person = ID(required=True)
+    first_name = String()
+    last_name = String()
+
+
+class ObjectErrorType(ObjectType):
+    id = ID(required=True)
+    messages = NonNull(List(NonNull(String)))
+
+
 # Models ======================================================================
 
 # ACE -------------------------------------------------------------------------
@@ -887,6 +1346,21 @@ class DeleteLocationMutation(UUIDDjangoModelFormMutation):
         return cls(location=location, errors=[])
 
 
+class UndeleteLocationMutation(UUIDDjangoModelFormMutation):
+    include_deleted = True
+
+    class Meta:
+        form_class = LocationModelForm
+        only_fields = ['id']
+        permissions = [staff_member_required, object_permits_user('delete')]
+
+    @classmethod
+    def perform_mutate(cls, form, info):
+        location = form.instance
+        location.undelete()
+        return cls(location=location, errors=[])
+
+
 # LocationCategory ------------------------------------------------------------
 
 # fields
@@ -1231,7 +1705,7 @@ class OperationType(UUIDDjangoObjectType):
         permissions = [login_required, object_permits_user('read')]
 
     def resolve_channel_filters(parent, info):
-        return parent.channel_filters(info.context.user)
+        return ChannelFiltersLoader.get(info).load(parent)
 
 
 # forms
@@ -1245,6 +1719,10 @@ class CreateOperationModelForm(OperationModelForm):
     publish = BooleanField(required=False)
 
 
+class CloneOperationModelForm(OperationModelForm):
+    offset = IntegerField(required=False, help_text="Time offset in seconds.")
+
+
 # mutations
 class CreateOperationMutation(UUIDDjangoModelFormMutation):
     class Meta:
@@ -1263,6 +1741,25 @@ class CreateOperationMutation(UUIDDjangoModelFormMutation):
         return cls(operation=operation, errors=[])
 
 
+class CloneOperationMutation(UUIDDjangoModelFormMutation):
+    class Meta:
+        form_class = CloneOperationModelForm
+        only_fields = ['id', 'name', 'offset']
+        required_fields = ['id']
+        permissions = [staff_member_required, object_permits_user('update')]
+
+    @classmethod
+    def perform_mutate(cls, form, info):
+        operation = form.instance
+        if not Operation(project=operation.project).permits(info.context.user, 'create'):
+            raise PermissionDenied
+        clone = operation.clone(
+            name=form.cleaned_data.get('name'),
+            offset=timedelta(seconds=form.cleaned_data.get('offset') or 0),
+        )
+        return cls(operation=clone, errors=[])
+
+
 class UpdateOperationMutation(UUIDDjangoModelFormMutation):
     class Meta:
         form_class = OperationModelForm
@@ -1284,6 +1781,22 @@ class DeleteOperationMutation(UUIDDjangoModelFormMutation):
         return cls(operation=operation, errors=[])
 
 
+class UndeleteOperationMutation(UUIDDjangoModelFormMutation):
+    include_deleted = True
+
+    class Meta:
+        form_class = OperationModelForm
+        only_fields = ['id']
+        permissions = [staff_member_required, object_permits_user('delete')]
+
+    @classmethod
+    def perform_mutate(cls, form, info):
+        operation = form.instance
+        operation.undelete()
+        operation.save()
+        return cls(operation=operation, errors=[])
+
+
 class PublishOperationMutation(UUIDDjangoModelFormMutation):
     class Meta:
         form_class = OperationModelForm
@@ -1351,7 +1864,7 @@ class OrganizationType(UUIDDjangoObjectType):
         permissions = [object_permits_user('read')]
 
     def resolve_channel_filters(parent, info):
-        return parent.channel_filters(info.context.user)
+        return ChannelFiltersLoader.get(info).load(parent)
 
 
 # forms
@@ -1390,6 +1903,22 @@ class DeleteOrganizationMutation(UUIDDjangoModelFormMutation):
         return cls(organization=organization, errors=[])
 
 
+class UndeleteOrganizationMutation(UUIDDjangoModelFormMutation):
+    include_deleted = True
+
+    class Meta:
+        form_class = OrganizationModelForm
+        only_fields = ['id']
+        permissions = [staff_member_required, object_permits_user('delete')]
+
+    @classmethod
+    def perform_mutate(cls, form, info):
+        organization = form.instance
+        organization.undelete()
+        organization.save()
+        return cls(organization=organization, errors=[])
+
+
 class PublishOrganizationMutation(UUIDDjangoModelFormMutation):
     class Meta:
         form_class = OrganizationModelForm
@@ -1580,6 +2109,67 @@ class AdminDeclineParticipantMutation(UUIDDjangoModelFormMutation):
         return cls(participant=participant, errors=[])
 
 
+class BulkParticipantTransitionMutation(ClientIDMutation):
+    """
+    Applies Meta.transition to a list of Participants.
+
+    Permission for the action named like the transition is checked for all
+    Participants with one query, the transition is applied with one UPDATE.
+    Participants, which are not in a source state of the transition, when
+    their rows are locked, are returned as errors.
+    """
+    participants = List(ParticipantType)
+    errors = List(ObjectErrorType)
+
+    class Meta:
+        abstract = True
+
+    class Input:
+        ids = List(NonNull(ID), required=True)
+
+    @classmethod
+    def __init_subclass_with_meta__(cls, *args, transition=None, **kwargs):
+        cls.transition = transition
+        super().__init_subclass_with_meta__(*args, **kwargs)
+
+    @classmethod
+    @login_required
+    def mutate_and_get_payload(cls, root, info, ids, **input):
+        user = info.context.user
+        uuids = {from_global_id(global_id)[1]: global_id for global_id in ids}
+        # check permission for all participants
+        permitted = Participant.filter_permitted(user, cls.transition).filter(uuid__in=uuids)
+        if permitted.count() != len(uuids):
+            raise PermissionDenied
+        # apply transition
+        queryset = Participant.objects.filter(uuid__in=uuids)
+        updated = Participant.bulk_transition(queryset, cls.transition, admin_acceptance_user=user)
+        # return participants not updated as errors
+        field, _, _ = Participant.transition_sources(cls.transition)
+        errors = [
+            ObjectErrorType(id=uuids[str(uuid)], messages=[
+                f"Can't switch from state '{state}' using method '{cls.transition}'"
+            ])
+            for uuid, state in queryset.exclude(pk__in=updated).values_list('uuid', field)
+        ]
+        return cls(participants=list(Participant.objects.filter(pk__in=updated)), errors=errors)
+
+
+class AdminAcceptParticipantsMutation(BulkParticipantTransitionMutation):
+    class Meta:
+        transition = 'admin_accept'
+
+
+class AdminDeclineParticipantsMutation(BulkParticipantTransitionMutation):
+    class Meta:
+        transition = 'admin_decline'
+
+
+class AdminReinquireParticipantsMutation(BulkParticipantTransitionMutation):
+    class Meta:
+        transition = 'admin_reinquire'
+
+
 # Person ----------------------------------------------------------------------
 
 # fields
@@ -1677,7 +2267,7 @@ class PersonModelForm(UUIDModelForm):
         if 'password' in self.changed_data:
             person.set_password(self.cleaned_data["password"])
         if commit:
-            person.save()
+            self.save_instance(person, 'username')
             self.save_m2m()
         return person
 
@@ -2119,6 +2709,55 @@ class DeletePersonToObjectMutation(UUIDDjangoModelFormMutation):
         return cls(person_to_object=person_to_object, errors=[])
 
 
+class UpsertPersonToObjectsMutation(ClientIDMutation):
+    """
+    Creates or updates the entries of the user for a list of relation objects.
+
+    Relation objects need to be readable by the user. Flags not given are
+    set to their defaults for created entries and are left untouched for
+    existing entries.
+    """
+    person_to_objects = List(PersonToObjectType)
+    errors = List(ErrorType)
+
+    class Input:
+        relation_objects = List(NonNull(ID), required=True)
+        unnoticed = Boolean()
+        bookmarked = Boolean()
+
+    @classmethod
+    @login_required
+    def mutate_and_get_payload(cls, root, info, relation_objects, **input):
+        user = info.context.user
+        # group relation object uuids by model
+        uuids = {}
+        for global_id in relation_objects:
+            _type, _id = from_global_id(global_id)
+            uuids.setdefault(_type.removesuffix("Type").lower(), set()).add(_id)
+        invalid = set(uuids) - set(PersonToObject.relation_object_cts)
+        if invalid:
+            return cls(person_to_objects=[], errors=[ErrorType(
+                field="relationObjects",
+                messages=[f"'{name}' is not a valid content type for relation objects."
+                          for name in sorted(invalid)],
+            )])
+        # fetch readable relation objects with one query per model
+        instances = []
+        for name, model_uuids in uuids.items():
+            model = apps.get_model('georga', name)
+            objects = list(model.filter_permitted(user, 'read').filter(uuid__in=model_uuids))
+            if len(objects) != len(model_uuids):
+                raise PermissionDenied
+            instances.extend(objects)
+        # upsert entries
+        values = {
+            name: value for name, value in input.items()
+            if name in ['unnoticed', 'bookmarked'] and value is not None
+        }
+        person_to_objects = PersonToObject.bulk_upsert(user, instances, **values)
+        return cls(person_to_objects=person_to_objects, errors=[])
+
+
 # Project ---------------------------------------------------------------------
 
 # fields
@@ -2159,7 +2798,7 @@ class ProjectType(UUIDDjangoObjectType):
         permissions = [login_required, object_permits_user('read')]
 
     def resolve_channel_filters(parent, info):
-        return parent.channel_filters(info.context.user)
+        return ChannelFiltersLoader.get(info).load(parent)
 
 
 # forms
@@ -2212,6 +2851,22 @@ class DeleteProjectMutation(UUIDDjangoModelFormMutation):
         return cls(project=project, errors=[])
 
 
+class UndeleteProjectMutation(UUIDDjangoModelFormMutation):
+    include_deleted = True
+
+    class Meta:
+        form_class = ProjectModelForm
+        only_fields = ['id']
+        permissions = [staff_member_required, object_permits_user('delete')]
+
+    @classmethod
+    def perform_mutate(cls, form, info):
+        project = form.instance
+        project.undelete()
+        project.save()
+        return cls(project=project, errors=[])
+
+
 class PublishProjectMutation(UUIDDjangoModelFormMutation):
     class Meta:
         form_class = ProjectModelForm
@@ -2351,30 +3006,19 @@ class RoleType(UUIDDjangoObjectType):
         fields = role_ro_fields + role_rw_fields
         filter_fields = role_filter_fields
         permissions = [login_required, object_permits_user('read')]
+        prefetch_related = ['rolespecification_set__person_properties']
 
     def resolve_mandatory(self, info):
-        specification = self.rolespecification_set.filter(necessity="MANDATORY")
-        if not specification:
-            return []
-        return specification[0].person_properties.all()
+        return self.person_properties_by_necessity.get("MANDATORY", [])
 
     def resolve_recommended(self, info):
-        specification = self.rolespecification_set.filter(necessity="RECOMMENDED")
-        if not specification:
-            return []
-        return specification[0].person_properties.all()
+        return self.person_properties_by_necessity.get("RECOMMENDED", [])
 
     def resolve_unrecommended(self, info):
-        specification = self.rolespecification_set.filter(necessity="UNRECOMMENDED")
-        if not specification:
-            return []
-        return specification[0].person_properties.all()
+        return self.person_properties_by_necessity.get("UNRECOMMENDED", [])
 
     def resolve_impossible(self, info):
-        specification = self.rolespecification_set.filter(necessity="IMPOSSIBLE")
-        if not specification:
-            return []
-        return specification[0].person_properties.all()
+        return self.person_properties_by_necessity.get("IMPOSSIBLE", [])
 
 
 # forms
@@ -2399,22 +3043,17 @@ class RoleModelForm(UUIDModelForm):
     def save(self, commit=True):
         role = super().save(commit=False)
         # create
-        print(role.id)
         if not role.id:
             role.save()
         # specifications
-        for necessity in ["mandatory", "recommended", "unrecommended", "impossible"]:
-            if necessity not in self.data:
-                continue
-            properties = PersonProperty.objects.filter(uuid__in=self.data[necessity])
-            specification = role.rolespecification_set.filter(necessity=necessity.upper()).first()
-            if not specification:
-                specification = RoleSpecification(role=role, necessity=necessity.upper())
-                specification.save()
-            specification.person_properties.set(properties)
+        RoleSpecification.bulk_set_person_properties({
+            (role.id, necessity.upper()): [prop.id for prop in self.cleaned_data[necessity]]
+            for necessity in ["mandatory", "recommended", "unrecommended", "impossible"]
+            if necessity in self.data
+        })
         # save
         if commit:
-            role.save()
+            self.save_instance(role)
             self.save_m2m()
         return role
 
@@ -2435,6 +3074,65 @@ class CreateRoleModelForm(RoleModelForm):
         super().__init__(*args, **kwargs)
 
 
+class CreateRolesModelForm(UUIDModelForm):
+    necessities = ["mandatory", "recommended", "unrecommended", "impossible"]
+
+    class Meta:
+        model = Role
+        fields = ['shift', 'task']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # enforce either shift or task relation
+        shift = cleaned_data.get('shift')
+        task = cleaned_data.get('task')
+        if bool(shift) == bool(task):
+            raise ValidationError("Roles need to be assigned to either a task or a shift.")
+        # auto set is_template according to shift or task relation
+        self.instance.is_template = not shift
+        organization = (shift.task if shift else task).operation.project.organization_id
+
+        # fetch referenced person properties with one query
+        items = self.data.get('roles', [])
+        person_properties = {
+            str(uuid): id
+            for uuid, id in PersonProperty.objects.filter(
+                uuid__in={
+                    from_global_id(global_id)[1]
+                    for item in items for necessity in self.necessities
+                    for global_id in item.get(necessity) or []
+                },
+                group__organization=organization,
+            ).values_list('uuid', 'id')
+        }
+
+        # validate roles, errors are reported per role as `roles.<index>.<field>`
+        self.roles = []
+        for index, item in enumerate(items):
+            role = Role(
+                shift=shift, task=task, is_template=not shift,
+                **{name: value for name, value in item.items()
+                   if value is not None and name not in self.necessities})
+            try:
+                role.full_clean(exclude=['shift', 'task'], validate_unique=False)
+            except ValidationError as e:
+                for field, messages in e.message_dict.items():
+                    self._errors[f"roles.{index}.{field}"] = self.error_class(messages)
+            necessities = {}
+            for necessity in self.necessities:
+                if item.get(necessity) is None:
+                    continue
+                try:
+                    necessities[necessity.upper()] = [
+                        person_properties[from_global_id(global_id)[1]]
+                        for global_id in item[necessity]
+                    ]
+                except KeyError:
+                    self._errors[f"roles.{index}.{necessity}"] = self.error_class(["Select a valid choice."])
+            self.roles.append((role, necessities))
+        return cleaned_data
+
+
 # mutations
 class CreateRoleMutation(UUIDDjangoModelFormMutation):
     class Meta:
@@ -2443,6 +3141,36 @@ class CreateRoleMutation(UUIDDjangoModelFormMutation):
         permissions = [staff_member_required, object_permits_user('create')]
 
 
+class RoleInput(InputObjectType):
+    name = String(required=True)
+    description = String()
+    quantity = Int(required=True)
+    is_active = Boolean()
+    needs_admin_acceptance = Boolean()
+    mandatory = List(NonNull(ID))
+    recommended = List(NonNull(ID))
+    unrecommended = List(NonNull(ID))
+    impossible = List(NonNull(ID))
+
+
+class CreateRolesMutation(UUIDDjangoModelFormMutation):
+    roles = List(RoleType)
+
+    class Input:
+        roles = List(NonNull(RoleInput), required=True)
+
+    class Meta:
+        form_class = CreateRolesModelForm
+        exclude_fields = ['id']
+        permissions = [staff_member_required, object_permits_user('create')]
+
+    @classmethod
+    def perform_mutate(cls, form, info):
+        roles = Role.bulk_create_with_specifications(form.roles)
+        prefetch_related_objects(roles, 'rolespecification_set__person_properties')
+        return cls(roles=roles, errors=[])
+
+
 class UpdateRoleMutation(UUIDDjangoModelFormMutation):
     class Meta:
         form_class = RoleModelForm
@@ -2464,6 +3192,21 @@ class DeleteRoleMutation(UUIDDjangoModelFormMutation):
         return cls(role=role, errors=[])
 
 
+class UndeleteRoleMutation(UUIDDjangoModelFormMutation):
+    include_deleted = True
+
+    class Meta:
+        form_class = RoleModelForm
+        only_fields = ['id']
+        permissions = [staff_member_required, object_permits_user('delete')]
+
+    @classmethod
+    def perform_mutate(cls, form, info):
+        role = form.instance
+        role.undelete()
+        return cls(role=role, errors=[])
+
+
 class AcceptRoleMutation(UUIDDjangoModelFormMutation):
     participant = Field(ParticipantType)
 
@@ -2638,7 +3381,7 @@ class ShiftType(UUIDDjangoObjectType):
         permissions = [login_required, object_permits_user('read')]
 
     def resolve_channel_filters(parent, info):
-        return parent.channel_filters(info.context.user)
+        return ChannelFiltersLoader.get(info).load(parent)
 
 
 # forms
@@ -2652,6 +3395,21 @@ class CreateShiftModelForm(ShiftModelForm):
     publish = BooleanField(required=False)
 
 
+class CreateShiftsModelForm(UUIDModelForm):
+    publish = BooleanField(required=False)
+
+    class Meta:
+        model = Shift
+        fields = ['task']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for shift in self.data.get('shifts', []):
+            if shift.end_time <= shift.start_time:
+                raise ValidationError("end time must be after start time")
+        return cleaned_data
+
+
 # mutations
 class CreateShiftMutation(UUIDDjangoModelFormMutation):
     class Meta:
@@ -2670,6 +3428,35 @@ class CreateShiftMutation(UUIDDjangoModelFormMutation):
         return cls(shift=shift, errors=[])
 
 
+class ShiftTimesInput(InputObjectType):
+    start_time = DateTime(required=True)
+    end_time = DateTime(required=True)
+    enrollment_deadline = DateTime()
+
+
+class CreateShiftsMutation(UUIDDjangoModelFormMutation):
+    shifts = List(ShiftType)
+
+    class Input:
+        shifts = List(NonNull(ShiftTimesInput), required=True)
+
+    class Meta:
+        form_class = CreateShiftsModelForm
+        exclude_fields = ['id']
+        permissions = [staff_member_required, object_permits_user('create')]
+
+    @classmethod
+    def perform_mutate(cls, form, info):
+        shifts = form.instance.task.create_shifts(
+            [
+                {name: value for name, value in shift.items() if value is not None}
+                for shift in form.data['shifts']
+            ],
+            publish=bool(form.data.get('publish')),
+        )
+        return cls(shifts=shifts, errors=[])
+
+
 class UpdateShiftMutation(UUIDDjangoModelFormMutation):
     class Meta:
         form_class = ShiftModelForm
@@ -2687,6 +3474,23 @@ class DeleteShiftMutation(UUIDDjangoModelFormMutation):
     def perform_mutate(cls, form, info):
         shift = form.instance
         shift.delete()
+        shift.save()
+        return cls(shift=shift, errors=[])
+
+
+class UndeleteShiftMutation(UUIDDjangoModelFormMutation):
+    include_deleted = True
+
+    class Meta:
+        form_class = ShiftModelForm
+        only_fields = ['id']
+        permissions = [staff_member_required, object_permits_user('delete')]
+
+    @classmethod
+    def perform_mutate(cls, form, info):
+        shift = form.instance
+        shift.undelete()
+        shift.save()
         return cls(shift=shift, errors=[])
 
 
@@ -2764,7 +3568,7 @@ class TaskType(UUIDDjangoObjectType):
         permissions = [login_required, object_permits_user('read')]
 
     def resolve_channel_filters(parent, info):
-        return parent.channel_filters(info.context.user)
+        return ChannelFiltersLoader.get(info).load(parent)
 
 
 # forms
@@ -2817,6 +3621,22 @@ class DeleteTaskMutation(UUIDDjangoModelFormMutation):
         return cls(task=task, errors=[])
 
 
+class UndeleteTaskMutation(UUIDDjangoModelFormMutation):
+    include_deleted = True
+
+    class Meta:
+        form_class = TaskModelForm
+        only_fields = ['id']
+        permissions = [staff_member_required, object_permits_user('delete')]
+
+    @classmethod
+    def perform_mutate(cls, form, info):
+        task = form.instance
+        task.undelete()
+        task.save()
+        return cls(task=task, errors=[])
+
+
 class PublishTaskMutation(UUIDDjangoModelFormMutation):
     class Meta:
         form_class = TaskModelForm
@@ -2987,11 +3807,769 @@ class TestSubscriptionEventMutation(Mutation):
 
     @classmethod
     def mutate(cls, root, info, message):
-        print(f"New message broadcasted: {message}")
-        TestSubscription.broadcast(group="TestSubscriptionEvents", payload=message)
+        broadcasts.add(TestSubscription, "TestSubscriptionEvents", message)
         return TestSubscriptionEventMutationPayload(response="OK")
 
 
+def track_groups(info, subscription, get_groups):
+    """
+    Registers the groups of a subscription depending on the permissions of
+    the user, so the consumer updates them, if the permissions change (see
+    `MyGraphqlWsConsumer.refresh_groups()`).
+
+    Args:
+        info (ResolveInfo): Info of the subscription operation.
+        subscription (Subscription): Subscription class.
+        get_groups (Callable): Function returning the group names for a
+            user, raising PermissionDenied if the user may not subscribe.
+    """
+    groups = info.context.channels_scope.setdefault('subscription_groups', {})
+    groups[info.context.graphql_operation_id] = (subscription, get_groups)
+
+
+# coalesces notifications of model changes per object
+coalesced_changes = ChangeCoalescer(window=settings.SUBSCRIPTION_COALESCING_WINDOW, batch=broadcasts.batch)
+
+
+class ModelChangedSubscription(Subscription):
+    """
+    Subscription to created, updated and deleted instances of a model.
+
+    Notifications are broadcasted on post_save/post_delete signals (see
+    signals.py) to audience groups. On subscription, each client joins the
+    groups derived from the cached organization and admin id sets of the
+    user, so permissions are checked once per client and not per event:
+
+    - `organization.<id>`: members of the organization.
+    - `operation.<id>`: members, who filter for one operation.
+    - `<organization|project|operation>.<id>.admin`: admins of the scope.
+      Admins join only the topmost level of their admin rights.
+    - `person.<id>`: the person itself (see `ParticipantChangedSubscription`).
+
+    Each change is broadcasted once to the groups of its scope, whose
+    members may read the instance. Publishing needs no database queries.
+
+    Payload:
+    - The values of Meta.fields are serialized once on broadcast, foreign
+      keys as global ids.
+
+    Event log:
+    - Changes are appended to the event log of the organization (see
+      `EventLog`), notifications contain the `eventId`. After reconnecting,
+      clients fetch the missed events via `listChangeEvents`.
+
+    Coalescing:
+    - Changes of the same instance within
+      `settings.SUBSCRIPTION_COALESCING_WINDOW` seconds are merged into one
+      notification with the latest state (see `ChangeCoalescer`).
+    - Can be disabled via `settings.SUBSCRIPTION_COALESCING`.
+
+    Meta:
+        object_type (DjangoObjectType): Type to derive the field types from.
+        fields (list[str]): Names of the fields included in notifications.
+        admin_only (bool): Restricts notifications to admins of the scope.
+        scope (list[tuple(str, type, str)]|Callable): Paths to the operation
+            of an instance, tried in order until one is set: attname of the
+            foreign key, model it refers to and lookup of the operation from
+            that model. Or a function returning the scopes of a list of
+            instances (see `get_scopes()`).
+    """
+    class Meta:
+        abstract = True
+
+    action = ChangeAction(required=True)
+    id = ID(required=True)
+    event_id = String()
+
+    class Arguments:
+        organization = ID()
+        operation = ID()
+
+    @classmethod
+    def __init_subclass_with_meta__(cls, object_type=None, fields=(), admin_only=False, scope=(), **options):
+        model = object_type._meta.model
+        for name in fields:
+            if model._meta.get_field(name).is_relation:
+                setattr(cls, name, ID())
+            else:
+                setattr(cls, name, Field(object_type._meta.fields[name].type))
+        cls.model = model
+        cls.change_fields = fields
+        cls.admin_only = admin_only
+        cls.scope_function = staticmethod(scope) if callable(scope) else None
+        cls.scope_paths = () if callable(scope) else tuple(scope)
+        # fields of rows broadcasted without instances (see `broadcast_rows()`)
+        cls.row_fields = ['uuid', *(field for field, _model, _operation in cls.scope_paths)]
+        for name in fields:
+            field = model._meta.get_field(name)
+            if isinstance(field, GenericForeignKey):
+                cls.row_fields += [model._meta.get_field(field.ct_field).attname, field.fk_field]
+            elif field.is_relation:
+                cls.row_fields.append(field.attname)
+        cls.row_fields = list(dict.fromkeys(cls.row_fields))
+        super().__init_subclass_with_meta__(**options)
+
+    @classmethod
+    async def subscribe(cls, root, info, organization=None, operation=None):
+        user = info.context.channels_scope.get('user')
+        track_groups(info, cls, partial(cls.get_groups, organization=organization, operation=operation))
+        return await database_sync_to_async(cls.get_groups)(user, organization, operation)
+
+    @classmethod
+    def publish(cls, payload, info, organization=None, operation=None):
+        return cls(**payload['fields'])
+
+    @classmethod
+    def get_groups(cls, user, organization=None, operation=None):
+        """
+        Returns the audience groups of the user for a subscription.
+
+        Args:
+            user (Person()): Subscribing user.
+            organization (str): Global id to filter for one organization.
+            operation (str): Global id to filter for one operation.
+
+        Returns:
+            list[str]: Names of the audience groups.
+
+        Raises:
+            PermissionDenied: If the user may not subscribe to the scope.
+            GraphQLError: If both organization and operation are given.
+        """
+        if not user or not user.is_authenticated:
+            raise PermissionDenied
+        if organization and operation:
+            raise GraphQLError("Either organization or operation can be provided.")
+        # operation
+        if operation:
+            _type, uuid = from_global_id(operation)
+            instance = Operation.objects.select_related('project').filter(uuid=uuid).first()
+            if cls.admin_only:
+                if not instance or instance.id not in user.admin_operation_ids:
+                    raise PermissionDenied
+                return [f"operation.{instance.id}.admin"]
+            if not instance or instance.project.organization_id not in user.organization_ids:
+                raise PermissionDenied
+            return [f"operation.{instance.id}"]
+        # organization
+        if organization:
+            _type, uuid = from_global_id(organization)
+            instance = Organization.objects.filter(uuid=uuid).first()
+            if cls.admin_only:
+                groups = instance and cls.get_admin_groups(user, instance.id)
+                if not groups:
+                    raise PermissionDenied
+                return groups
+            if not instance or instance.id not in user.organization_ids:
+                raise PermissionDenied
+            return [f"organization.{instance.id}"]
+        # all organizations
+        if cls.admin_only:
+            return cls.get_admin_groups(user)
+        return [f"organization.{id}" for id in user.organization_ids]
+
+    @staticmethod
+    def get_admin_groups(user, organization_id=None):
+        """
+        Returns the admin groups of the topmost levels of the admin rights.
+
+        Args:
+            user (Person()): Subscribing user.
+            organization_id (int): Id to restrict the groups to one organization.
+
+        Returns:
+            list[str]: Names of the admin groups.
+        """
+        organization_ids = user.admin_organization_ids
+        projects = Project.objects.filter(id__in=user.admin_project_ids).exclude(
+            organization_id__in=organization_ids)
+        operations = Operation.objects.filter(id__in=user.admin_operation_ids).exclude(
+            project_id__in=user.admin_project_ids)
+        if organization_id:
+            organization_ids = [id for id in organization_ids if id == organization_id]
+            projects = projects.filter(organization_id=organization_id)
+            operations = operations.filter(project__organization_id=organization_id)
+        return [
+            *(f"organization.{id}.admin" for id in organization_ids),
+            *(f"project.{id}.admin" for id in projects.values_list('id', flat=True)),
+            *(f"operation.{id}.admin" for id in operations.values_list('id', flat=True)),
+        ]
+
+    @classmethod
+    def get_scope(cls, instance):
+        """
+        Returns the organization, project and operation id of an instance.
+
+        Returns:
+            tuple(int|None, int|None, int|None): Ids of the scope.
+        """
+        return cls.get_scopes([instance])[0]
+
+    @classmethod
+    def get_scopes(cls, instances):
+        """
+        Returns the scopes of multiple instances via one query per parent model.
+
+        The scopes are derived from the paths of Meta.scope or returned by its
+        function.
+
+        Returns:
+            list(tuple(int|None, int|None, int|None)): Ids of the scopes.
+        """
+        if cls.scope_function:
+            return cls.scope_function(instances)
+        scopes = {
+            field: cls.operation_scopes(model, [getattr(instance, field) for instance in instances], operation)
+            for field, model, operation in cls.scope_paths
+        }
+        return [
+            next((
+                scopes[field].get(getattr(instance, field)) for field, _model, _operation in cls.scope_paths
+                if getattr(instance, field)), None) or (None, None, None)
+            for instance in instances
+        ]
+
+    @staticmethod
+    def operation_scopes(model, pks, operation=None):
+        """
+        Returns the organization, project and operation ids by pk via one query.
+
+        Args:
+            model (type): Model of the pks.
+            pks (list(int)): Primary keys, empty ones are skipped.
+            operation (str): Lookup of the operation from the model, None for
+                Operations.
+
+        Returns:
+            dict(int, tuple(int, int, int)): Ids of the scopes by pk.
+        """
+        pks = {pk for pk in pks if pk}
+        if not pks:
+            return {}
+        prefix = f"{operation}__" if operation else ""
+        return {
+            pk: tuple(scope)
+            for pk, *scope in model._base_manager.filter(pk__in=pks).values_list(
+                'pk', f"{prefix}project__organization_id", f"{prefix}project_id", operation or 'pk')
+        }
+
+    @classmethod
+    def get_audience_groups(cls, instance, scope):
+        """
+        Returns the groups, whose members may read the instance.
+
+        Args:
+            instance (Model()): Created, updated or deleted instance.
+            scope (tuple): Organization, project and operation id of the instance.
+
+        Returns:
+            list[str]: Names of the audience groups.
+        """
+        organization_id, project_id, operation_id = scope
+        if cls.admin_only:
+            levels = [('organization', organization_id), ('project', project_id), ('operation', operation_id)]
+            return [f"{level}.{id}.admin" for level, id in levels if id]
+        levels = [('organization', organization_id), ('operation', operation_id)]
+        return [f"{level}.{id}" for level, id in levels if id]
+
+    @classmethod
+    def broadcast_changes(cls, instances, action):
+        """
+        Broadcasts changes of multiple instances, e.g. of bulk operations.
+
+        Related objects and scopes are fetched for all instances at once.
+
+        Args:
+            instances (list(Model())): Created, updated or deleted instances.
+            action (str): CREATED, UPDATED or DELETED.
+        """
+        prefetch_related_objects(instances, *[
+            name for name in cls.change_fields if cls.model._meta.get_field(name).is_relation])
+        cls.broadcast([
+            (cls.serialize(instance), cls.get_audience_groups(instance, scope), scope)
+            for instance, scope in zip(instances, cls.get_scopes(instances))
+        ], action)
+
+    @classmethod
+    def broadcast_rows(cls, queryset, action):
+        """
+        Broadcasts changes of the rows of a queryset without loading instances,
+        e.g. of soft deletion cascades.
+
+        The values of Meta.fields, the uuids of related objects and the
+        foreign keys needed for the scopes and audience groups are fetched via
+        one query. Generic relations are not included.
+
+        Args:
+            queryset (QuerySet()): Rows of the model, evaluated immediately.
+            action (str): CREATED, UPDATED or DELETED.
+        """
+        values = {}
+        for name in cls.change_fields:
+            field = cls.model._meta.get_field(name)
+            if isinstance(field, GenericForeignKey):
+                continue
+            if field.is_relation:
+                values[name] = (f"{name}__uuid", f"{field.related_model._meta.object_name}Type")
+            else:
+                values[name] = (name, None)
+        rows = queryset.values(*cls.row_fields, *(lookup for lookup, _type in values.values()))
+        rows = [SimpleNamespace(**row) for row in rows]
+        changes = []
+        for row, scope in zip(rows, cls.get_scopes(rows)):
+            fields = {'id': to_global_id(f"{cls.model._meta.object_name}Type", row.uuid)}
+            for name, (lookup, type_name) in values.items():
+                value = getattr(row, lookup)
+                fields[name] = to_global_id(type_name, value) if type_name and value else value
+            changes.append((fields, cls.get_audience_groups(row, scope), scope))
+        cls.broadcast(changes, action)
+
+    @classmethod
+    def broadcast_change(cls, instance, action, scope=None):
+        """
+        Broadcasts a change of the instance to its audience groups.
+
+        Args:
+            instance (Model()): Created, updated or deleted instance.
+            action (str): CREATED, UPDATED or DELETED.
+            scope (tuple): Scope of the instance, fetched if None.
+        """
+        scope = scope or cls.get_scope(instance)
+        cls.broadcast([(cls.serialize(instance), cls.get_audience_groups(instance, scope), scope)], action)
+
+    @classmethod
+    def serialize(cls, instance):
+        """Returns the id and Meta.fields of an instance, foreign keys as global ids."""
+        fields = {'id': instance.gid}
+        for name in cls.change_fields:
+            value = getattr(instance, name)
+            if cls.model._meta.get_field(name).is_relation:
+                value = value and value.gid
+            fields[name] = value
+        return fields
+
+    @classmethod
+    def broadcast(cls, changes, action):
+        """
+        Broadcasts serialized changes to their audience groups.
+
+        The broadcasts are deferred to the commit of the transaction via one
+        callback and to the end of the coalescing window. Changes rolled back
+        are not broadcasted.
+
+        Args:
+            changes (list(tuple(dict, list[str], tuple))): Serialized fields,
+                audience groups and scope of each change.
+            action (str): CREATED, UPDATED or DELETED.
+        """
+        if not changes:
+            return
+
+        def commit():
+            with broadcasts.batch():
+                for fields, groups, scope in changes:
+                    send = partial(cls.send_change, fields, groups, scope)
+                    if settings.SUBSCRIPTION_COALESCING:
+                        coalesced_changes.add(fields['id'], action, send)
+                    else:
+                        send(action)
+        transaction.on_commit(commit)
+
+    @classmethod
+    def send_change(cls, fields, groups, scope, action):
+        """Logs the change in the event log and adds its broadcasts."""
+        data = dict(fields, action=action)
+        organization_id = scope[0]
+        if organization_id:
+            try:
+                data['event_id'] = get_event_log().append(organization_id, {
+                    'model': cls.model.__name__, 'groups': groups, 'data': data})
+            except Exception:
+                logger.exception("Appending %s %s to the event log failed", action, fields['id'])
+        with broadcasts.batch():
+            for group in groups:
+                broadcasts.add(cls, group, {'fields': data, 'group': group, 'scope': scope})
+
+
+def list_change_events(user, organization, after=None):
+    """
+    Returns the logged change events of an organization permitted for a user.
+
+    Args:
+        user (Person()): The authenticated user.
+        organization (str): Global id of the organization.
+        after (str): Id of the last seen event, None for all retained events.
+
+    Returns:
+        ChangeEventsType(): The missed events.
+
+    Raises:
+        PermissionDenied: If the user may not subscribe to the organization.
+    """
+    _type, uuid = from_global_id(organization)
+    instance = Organization.objects.filter(uuid=uuid).first()
+    if not instance:
+        raise PermissionDenied
+    # audience groups of the user for all model change subscriptions
+    subscriptions = {}
+    groups = set()
+    for subscription in ModelChangedSubscription.__subclasses__():
+        subscriptions[subscription.model.__name__] = subscription
+        try:
+            groups.update(subscription.get_groups(user, organization))
+        except PermissionDenied:
+            pass
+    if not groups:
+        raise PermissionDenied
+    groups.add(f"person.{user.id}")
+    entries, complete = get_event_log().read(instance.id, after)
+    events = [
+        ChangeEventType(
+            event_id=event_id,
+            model=event['model'],
+            action=event['data']['action'],
+            id=event['data']['id'],
+            data=event['data'],
+        )
+        for event_id, event in entries
+        if event['model'] in subscriptions and groups.intersection(event['groups'])
+    ]
+    return ChangeEventsType(
+        events=events,
+        last_event_id=entries[-1][0] if entries else after,
+        resync=not complete,
+    )
+
+
+def get_message_scopes(messages):
+    """
+    Returns the scopes of Messages via one query per model of their scopes.
+
+    Args:
+        messages (list(Message())): Messages or rows with `scope_ct_id` and
+            `scope_id`.
+
+    Returns:
+        list(tuple(int|None, int|None, int|None)): Ids of the scopes.
+    """
+    models = [ContentType.objects.get_for_id(message.scope_ct_id).model for message in messages]
+    ids = defaultdict(set)
+    for model, message in zip(models, messages):
+        ids[model].add(message.scope_id)
+    scopes = {('organization', id): (id, None, None) for id in ids['organization']}
+    scopes.update({
+        ('project', id): (organization_id, id, None)
+        for id, organization_id in Project._base_manager.filter(
+            pk__in=ids['project']).values_list('pk', 'organization_id')
+    })
+    for name, model, operation in [('operation', Operation, None), ('task', Task, 'operation'),
+                                   ('shift', Shift, 'task__operation')]:
+        scopes.update({
+            (name, id): scope
+            for id, scope in ModelChangedSubscription.operation_scopes(model, ids[name], operation).items()
+        })
+    return [
+        scopes.get((model, message.scope_id), (None, None, None))
+        for model, message in zip(models, messages)
+    ]
+
+
+class MessageChangedSubscription(ModelChangedSubscription):
+    class Meta:
+        object_type = MessageType
+        fields = ['scope', 'title', 'contents', 'category', 'priority', 'state']
+        scope = get_message_scopes
+
+
+class ParticipantChangedSubscription(ModelChangedSubscription):
+    """
+    Participants are published to the admins of the scope and the person.
+    """
+    class Meta:
+        object_type = ParticipantType
+        fields = ['person', 'shift', 'role', 'acceptance', 'admin_acceptance']
+        admin_only = True
+        scope = [('shift_id', Shift, 'task__operation')]
+
+    @classmethod
+    def get_groups(cls, user, organization=None, operation=None):
+        groups = []
+        if not organization and not operation:
+            groups.append(f"person.{user.id}")
+        try:
+            groups += super().get_groups(user, organization, operation)
+        except PermissionDenied:
+            if not groups:
+                raise
+        return groups
+
+    @classmethod
+    def publish(cls, payload, info, organization=None, operation=None):
+        # admins received the notification via their admin group already
+        user = info.context.channels_scope.get('user')
+        _organization_id, _project_id, operation_id = payload['scope']
+        if payload['group'].startswith('person.') and operation_id in user.admin_operation_ids:
+            return None
+        return super().publish(payload, info, organization, operation)
+
+    @classmethod
+    def get_audience_groups(cls, participant, scope):
+        return [f"person.{participant.person_id}", *super().get_audience_groups(participant, scope)]
+
+
+class RoleChangedSubscription(ModelChangedSubscription):
+    class Meta:
+        object_type = RoleType
+        fields = ['shift', 'task', 'name', 'description', 'quantity', 'is_active', 'is_template',
+                  'needs_admin_acceptance']
+        scope = [('task_id', Task, 'operation'), ('shift_id', Shift, 'task__operation')]
+
+
+class ShiftChangedSubscription(ModelChangedSubscription):
+    class Meta:
+        object_type = ShiftType
+        fields = ['task', 'start_time', 'end_time', 'enrollment_deadline', 'state']
+        scope = [('task_id', Task, 'operation')]
+
+
+class RoleFillChangedSubscription(Subscription):
+    """
+    Subscription to changes of the fill levels of roles.
+
+    Pushes the deltas of the participant counts (see `RoleManager`) of a role,
+    computed from the transitions of the participants (see signals.py), so
+    clients keep their fill levels without repeated aggregate queries.
+    Clients subscribe to the roles of either one shift, task or operation.
+    """
+    role = ID(required=True)
+    participants_accepted = Int(required=True)
+    participants_declined = Int(required=True)
+    participants_pending = Int(required=True)
+
+    class Arguments:
+        shift = ID()
+        task = ID()
+        operation = ID()
+
+    @classmethod
+    async def subscribe(cls, root, info, shift=None, task=None, operation=None):
+        user = info.context.channels_scope.get('user')
+        track_groups(info, cls, partial(cls.get_groups, shift=shift, task=task, operation=operation))
+        return await database_sync_to_async(cls.get_groups)(user, shift, task, operation)
+
+    @classmethod
+    def publish(cls, payload, info, shift=None, task=None, operation=None):
+        return cls(**payload)
+
+    @classmethod
+    def get_groups(cls, user, shift=None, task=None, operation=None):
+        """
+        Returns the group of the shift, task or operation.
+
+        Raises:
+            PermissionDenied: If the user may not read the roles.
+            GraphQLError: If not exactly one scope is given.
+        """
+        if not user or not user.is_authenticated:
+            raise PermissionDenied
+        scopes = [
+            ('shift', shift, Shift, 'task__operation__project__organization_id'),
+            ('task', task, Task, 'operation__project__organization_id'),
+            ('operation', operation, Operation, 'project__organization_id'),
+        ]
+        scopes = [scope for scope in scopes if scope[1]]
+        if len(scopes) != 1:
+            raise GraphQLError("Either shift, task or operation has to be provided.")
+        name, global_id, model, organization = scopes[0]
+        _type, uuid = from_global_id(global_id)
+        instance = model.objects.filter(uuid=uuid).values_list('id', organization).first()
+        if not instance or instance[1] not in user.organization_ids:
+            raise PermissionDenied
+        return [f"roles.{name}.{instance[0]}"]
+
+    @classmethod
+    def broadcast_deltas(cls, deltas):
+        """
+        Broadcasts the fill level deltas of roles via one query, after the
+        transaction is committed.
+
+        Args:
+            deltas (dict(int, Counter)): Deltas of 'accepted', 'declined' and
+                'pending' participants by role id.
+        """
+        deltas = {role_id: delta for role_id, delta in deltas.items() if any(delta.values())}
+        if not deltas:
+            return
+        roles = Role._base_manager.filter(pk__in=deltas).values_list(
+            'id', 'uuid', 'shift_id', 'shift__task_id', 'shift__task__operation_id',
+            'task_id', 'task__operation_id')
+        for role_id, uuid, shift_id, shift_task_id, shift_operation_id, task_id, task_operation_id in roles:
+            delta = deltas[role_id]
+            payload = {
+                'role': Role(uuid=uuid).gid,
+                'participants_accepted': delta['accepted'],
+                'participants_declined': delta['declined'],
+                'participants_pending': delta['pending'],
+            }
+            scopes = [
+                ('shift', shift_id),
+                ('task', task_id or shift_task_id),
+                ('operation', task_operation_id or shift_operation_id),
+            ]
+            for name, id in scopes:
+                if id:
+                    broadcasts.add(cls, f"roles.{name}.{id}", payload)
+
+
+class PresenceChangedSubscription(Subscription):
+    """
+    Subscription to the presence of persons for an operation.
+
+    Subscribing announces the presence of the user for the operation, as long
+    as the subscription is active. The presence is refreshed by heartbeats of
+    the websocket consumer (see `MyGraphqlWsConsumer`) in a TTL based
+    structure (see presence.py) without database writes. Admins of the
+    operation receive the persons going online and offline, including the
+    persons whose entries expired (noticed with the next heartbeat of any
+    present connection), other members only announce their presence.
+    """
+    action = PresenceAction(required=True)
+    person = ID(required=True)
+    first_name = String()
+    last_name = String()
+
+    class Arguments:
+        operation = ID(required=True)
+
+    @classmethod
+    async def subscribe(cls, root, info, operation):
+        scope = info.context.channels_scope
+        user = scope.get('user')
+        operation_id, groups = await database_sync_to_async(cls.get_groups)(user, operation)
+        track_groups(info, cls, lambda user: cls.get_groups(user, operation)[1])
+        scope.setdefault('presence', Counter())[operation_id] += 1
+        await sync_to_async(cls.join, thread_sensitive=False)(user, operation_id, info.context.channel_name)
+        return groups
+
+    @classmethod
+    async def unsubscribed(cls, root, info, operation):
+        scope = info.context.channels_scope
+        operation_id = await database_sync_to_async(cls.get_operation_id)(operation)
+        presence = scope.get('presence', Counter())
+        presence[operation_id] -= 1
+        if presence[operation_id] > 0:
+            return
+        del presence[operation_id]
+        user = scope.get('user')
+        if user and user.is_authenticated:
+            await sync_to_async(cls.leave, thread_sensitive=False)(user, operation_id, info.context.channel_name)
+
+    @classmethod
+    def publish(cls, payload, info, operation):
+        return cls(**payload)
+
+    @staticmethod
+    def get_operation_id(operation):
+        _type, uuid = from_global_id(operation)
+        return Operation.objects.filter(uuid=uuid).values_list('id', flat=True).first()
+
+    @classmethod
+    def get_groups(cls, user, operation):
+        """
+        Returns the id of the operation and the group of its admins.
+
+        Raises:
+            PermissionDenied: If the user is no member of the organization.
+        """
+        if not user or not user.is_authenticated:
+            raise PermissionDenied
+        _type, uuid = from_global_id(operation)
+        instance = Operation.objects.filter(uuid=uuid).values_list('id', 'project__organization_id').first()
+        if not instance or instance[1] not in user.organization_ids:
+            raise PermissionDenied
+        operation_id = instance[0]
+        if operation_id not in user.admin_operation_ids:
+            return operation_id, []
+        return operation_id, [f"presence.{operation_id}"]
+
+    @classmethod
+    def broadcast_presence(cls, user, operation_id, action):
+        broadcasts.add(cls, f"presence.{operation_id}", {
+            'action': action,
+            'person': user.gid,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+        })
+
+    @classmethod
+    def broadcast_expired(cls, operation_id, person_ids):
+        """Announces the persons gone offline by expired entries."""
+        if not person_ids:
+            return
+        for person in Person.objects.filter(pk__in=person_ids).only('uuid', 'first_name', 'last_name'):
+            cls.broadcast_presence(person, operation_id, 'LEFT')
+
+    @classmethod
+    def join(cls, user, operation_id, connection):
+        """Announces the presence of the user for the operation."""
+        joined, expired = get_presence().touch(operation_id, user.id, connection)
+        cls.broadcast_expired(operation_id, expired)
+        if joined:
+            cls.broadcast_presence(user, operation_id, 'JOINED')
+
+    @classmethod
+    def leave(cls, user, operation_id, connection):
+        """Withdraws the presence of the user for the operation."""
+        left, expired = get_presence().leave(operation_id, user.id, connection)
+        cls.broadcast_expired(operation_id, expired)
+        if left:
+            cls.broadcast_presence(user, operation_id, 'LEFT')
+
+    @classmethod
+    def heartbeat(cls, scope, connection):
+        """Refreshes the presence of a connection for all its operations."""
+        user = scope.get('user')
+        # entries of deactivated users expire
+        if not user or not user.is_authenticated:
+            return
+        for operation_id in list(scope.get('presence', {})):
+            cls.join(user, operation_id, connection)
+
+    @classmethod
+    def leave_all(cls, scope, connection):
+        """Withdraws the presence of a connection for all its operations."""
+        user = scope.get('user')
+        operation_ids = list(scope.pop('presence', {}))
+        if not user or not user.is_authenticated:
+            return
+        for operation_id in operation_ids:
+            cls.leave(user, operation_id, connection)
+
+
+def list_present_persons(user, operation):
+    """
+    Returns the persons online for an operation.
+
+    Args:
+        user (Person()): The authenticated user.
+        operation (str): Global id of the operation.
+
+    Returns:
+        list(PresenceType()): The persons online.
+
+    Raises:
+        PermissionDenied: If the user is no admin of the operation.
+    """
+    operation_id = PresenceChangedSubscription.get_operation_id(operation)
+    if operation_id is None or operation_id not in user.admin_operation_ids:
+        raise PermissionDenied
+    persons = Person.objects.filter(pk__in=get_presence().online(operation_id)).order_by('pk')
+    return [
+        PresenceType(person=Person(uuid=uuid).gid, first_name=first_name, last_name=last_name)
+        for uuid, first_name, last_name in persons.values_list('uuid', 'first_name', 'last_name')
+    ]
+
+
 # Schema ======================================================================
 
 # Connection = UUIDDjangoFilterConnectionField
@@ -3058,11 +4636,64 @@ class QueryType(ObjectType):
     list_tasks = connection(TaskType)
     # TaskField
     list_task_fields = connection(TaskFieldType)
+    # Subscriptions
+    list_change_events = Field(ChangeEventsType, organization=ID(required=True), after=String())
+    list_present_persons = NonNull(List(NonNull(PresenceType)), operation=ID(required=True))
+    get_subscription_metrics = Field(SubscriptionMetricsType)
 
     @object_permits_user('read')
     def resolve_get_person_profile(parent, info):
         return info.context.user
 
+    @login_required
+    def resolve_list_change_events(parent, info, organization, after=None):
+        return list_change_events(info.context.user, organization, after)
+
+    @login_required
+    def resolve_list_present_persons(parent, info, operation):
+        return list_present_persons(info.context.user, operation)
+
+    @staff_member_required
+    def resolve_get_subscription_metrics(parent, info):
+        metrics = coalesced_changes.metrics
+        websockets = websocket_connections.metrics
+        connections = websocket_connections.list()
+        persons = {
+            pk: Person(uuid=uuid).gid
+            for pk, uuid in Person.objects.filter(
+                pk__in=[connection['person_id'] for connection in connections]
+            ).values_list('pk', 'uuid')
+        }
+        return SubscriptionMetricsType(
+            change_events=metrics['events'],
+            coalesced_changes=metrics['coalesced'],
+            sent_changes=metrics['sent'],
+            pending_changes=metrics['pending'],
+            websocket_connections=websockets['connections'],
+            queued_messages=websockets['depth'],
+            max_queued_messages=websockets['depth_max'],
+            sent_messages=websockets['sent'],
+            dropped_messages=websockets['dropped'],
+            coalesced_messages=websockets['coalesced'],
+            disconnected_consumers=websockets['disconnected'],
+            send_latency_avg=websockets['latency_avg'] * 1000,
+            send_latency_max=websockets['latency_max'] * 1000,
+            connections=[
+                WebsocketConnectionMetricsType(
+                    connection=connection['connection'],
+                    person=persons.get(connection['person_id']),
+                    queued_messages=connection['depth'],
+                    unacknowledged_bytes=connection['unacked'],
+                    sent_messages=connection['sent'],
+                    dropped_messages=connection['dropped'],
+                    coalesced_messages=connection['coalesced'],
+                    send_latency_avg=connection['latency_avg'] * 1000,
+                    send_latency_max=connection['latency_max'] * 1000,
+                )
+                for connection in connections
+            ],
+        )
+
 
 class MutationType(ObjectType):
     # Authorization
@@ -3085,6 +4716,7 @@ class MutationType(ObjectType):
     create_location = CreateLocationMutation.Field()
     update_location = UpdateLocationMutation.Field()
     delete_location = DeleteLocationMutation.Field()
+    undelete_location = UndeleteLocationMutation.Field()
     # LocationCategory
     create_location_category = CreateLocationCategoryMutation.Field()
     update_location_category = UpdateLocationCategoryMutation.Field()
@@ -3102,14 +4734,17 @@ class MutationType(ObjectType):
     delete_message_filter = DeleteMessageFilterMutation.Field()
     # Operation
     create_operation = CreateOperationMutation.Field()
+    clone_operation = CloneOperationMutation.Field()
     update_operation = UpdateOperationMutation.Field()
     delete_operation = DeleteOperationMutation.Field()
+    undelete_operation = UndeleteOperationMutation.Field()
     publish_operation = PublishOperationMutation.Field()
     archive_operation = ArchiveOperationMutation.Field()
     # Organization
     create_organization = CreateOrganizationMutation.Field()
     update_organization = UpdateOrganizationMutation.Field()
     delete_organization = DeleteOrganizationMutation.Field()
+    undelete_organization = UndeleteOrganizationMutation.Field()
     publish_organization = PublishOrganizationMutation.Field()
     archive_organization = ArchiveOrganizationMutation.Field()
     # Participant
@@ -3120,6 +4755,9 @@ class MutationType(ObjectType):
     decline_participant = DeclineParticipantMutation.Field()
     admin_accept_participant = AdminAcceptParticipantMutation.Field()
     admin_decline_participant = AdminDeclineParticipantMutation.Field()
+    admin_accept_participants = AdminAcceptParticipantsMutation.Field()
+    admin_decline_participants = AdminDeclineParticipantsMutation.Field()
+    admin_reinquire_participants = AdminReinquireParticipantsMutation.Field()
     # Person
     create_person = CreatePersonMutation.Field()
     update_person = UpdatePersonMutation.Field()
@@ -3144,10 +4782,12 @@ class MutationType(ObjectType):
     create_person_to_object = CreatePersonToObjectMutation.Field()
     update_person_to_object = UpdatePersonToObjectMutation.Field()
     delete_person_to_object = DeletePersonToObjectMutation.Field()
+    upsert_person_to_objects = UpsertPersonToObjectsMutation.Field()
     # Project
     create_project = CreateProjectMutation.Field()
     update_project = UpdateProjectMutation.Field()
     delete_project = DeleteProjectMutation.Field()
+    undelete_project = UndeleteProjectMutation.Field()
     publish_project = PublishProjectMutation.Field()
     archive_project = ArchiveProjectMutation.Field()
     # Resource
@@ -3156,8 +4796,10 @@ class MutationType(ObjectType):
     # delete_resource = DeleteResourceMutation.Field()
     # Role
     create_role = CreateRoleMutation.Field()
+    create_roles = CreateRolesMutation.Field()
     update_role = UpdateRoleMutation.Field()
     delete_role = DeleteRoleMutation.Field()
+    undelete_role = UndeleteRoleMutation.Field()
     accept_role = AcceptRoleMutation.Field()
     decline_role = DeclineRoleMutation.Field()
     # RoleSpecification
@@ -3166,14 +4808,17 @@ class MutationType(ObjectType):
     delete_role_specification = DeleteRoleSpecificationMutation.Field()
     # Shift
     create_shift = CreateShiftMutation.Field()
+    create_shifts = CreateShiftsMutation.Field()
     update_shift = UpdateShiftMutation.Field()
     delete_shift = DeleteShiftMutation.Field()
+    undelete_shift = UndeleteShiftMutation.Field()
     publish_shift = PublishShiftMutation.Field()
     archive_shift = ArchiveShiftMutation.Field()
     # Task
     create_task = CreateTaskMutation.Field()
     update_task = UpdateTaskMutation.Field()
     delete_task = DeleteTaskMutation.Field()
+    undelete_task = UndeleteTaskMutation.Field()
     publish_task = PublishTaskMutation.Field()
     archive_task = ArchiveTaskMutation.Field()
     # TaskField
@@ -3187,6 +4832,12 @@ class MutationType(ObjectType):
 
 class SubscriptionType(ObjectType):
     test_subscription = TestSubscription.Field()
+    message_changed = MessageChangedSubscription.Field()
+    participant_changed = ParticipantChangedSubscription.Field()
+    presence_changed = PresenceChangedSubscription.Field()
+    role_changed = RoleChangedSubscription.Field()
+    role_fill_changed = RoleFillChangedSubscription.Field()
+    shift_changed = ShiftChangedSubscription.Field()
 
 
 schema = Schema(
@@ -193,6 +193,18 @@ if DEBUG:
     GRAPHENE["MIDDLEWARE"] += [
         'georga.schemas.DebugRequestMiddleware',
     ]
+GRAPHQL_BATCH_MAX_SIZE = int(os.getenv('DJANGO_GRAPHQL_BATCH_MAX_SIZE', '20'))
+GRAPHQL_COALESCING = not TESTING and os.getenv('DJANGO_GRAPHQL_COALESCING', 'True') == 'True'
+GRAPHQL_COALESCING_WINDOW = float(os.getenv('DJANGO_GRAPHQL_COALESCING_WINDOW', '1.0'))
+GRAPHQL_CONNECTION_COUNT_CAP = int(os.getenv('DJANGO_GRAPHQL_CONNECTION_COUNT_CAP', '1000'))
+GRAPHQL_CONNECTION_COUNT_MODES = {  # EXACT, CAPPED or ESTIMATE, defaults to EXACT
+    'Message': os.getenv('DJANGO_GRAPHQL_MESSAGE_COUNT_MODE', 'CAPPED'),
+    'Participant': os.getenv('DJANGO_GRAPHQL_PARTICIPANT_COUNT_MODE', 'CAPPED'),
+}
+GRAPHQL_IDEMPOTENCY_TTL = int(os.getenv('DJANGO_GRAPHQL_IDEMPOTENCY_TTL', '86400'))
+
+# Exports
+EXPORT_CHUNK_SIZE = int(os.getenv('DJANGO_EXPORT_CHUNK_SIZE', '2000'))
 
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -232,13 +244,40 @@ ACTIVATION_DAYS = int(os.getenv('DJANGO_ACCOUNT_ACTIVATION_DAYS', '7'))
 
 PASSWORD_URL = os.getenv('DJANGO_PASSWORD_URL', '')
 
+REDIS_HOST = os.getenv('REDIS_HOST', '127.0.0.1')
+REDIS_PORT = int(os.getenv('REDIS_PORT', '6379'))
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
             "hosts": [
-                (os.getenv('REDIS_HOST', '127.0.0.1'), int(os.getenv('REDIS_PORT', '6379')))
+                (REDIS_HOST, REDIS_PORT)
             ],
         },
     },
 }
+SUBSCRIPTION_COALESCING = not TESTING and os.getenv('DJANGO_SUBSCRIPTION_COALESCING', 'True') == 'True'
+SUBSCRIPTION_COALESCING_WINDOW = float(os.getenv('DJANGO_SUBSCRIPTION_COALESCING_WINDOW', '0.5'))
+SUBSCRIPTION_EVENT_LOG = 'local' if TESTING else os.getenv('DJANGO_SUBSCRIPTION_EVENT_LOG', 'redis')  # redis or local
+SUBSCRIPTION_EVENT_LOG_SIZE = int(os.getenv('DJANGO_SUBSCRIPTION_EVENT_LOG_SIZE', '1000'))
+SUBSCRIPTION_PRESENCE = 'local' if TESTING else os.getenv('DJANGO_SUBSCRIPTION_PRESENCE', 'redis')  # redis or local
+SUBSCRIPTION_PRESENCE_TTL = int(os.getenv('DJANGO_SUBSCRIPTION_PRESENCE_TTL', '60'))
+SUBSCRIPTION_SEND_QUEUE_LIMIT = int(os.getenv('DJANGO_SUBSCRIPTION_SEND_QUEUE_LIMIT', '64'))
+SUBSCRIPTION_SLOW_CONSUMER_POLICY = os.getenv(  # drop_oldest, coalesce or disconnect
+    'DJANGO_SUBSCRIPTION_SLOW_CONSUMER_POLICY', 'drop_oldest')
+SUBSCRIPTION_SEND_WINDOW = int(os.getenv('DJANGO_SUBSCRIPTION_SEND_WINDOW', '262144'))  # bytes
+SUBSCRIPTION_ACK_TIMEOUT = float(os.getenv('DJANGO_SUBSCRIPTION_ACK_TIMEOUT', '30'))
+if TESTING:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', ''),
+    },
+}
@@ -0,0 +1,166 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import logging
+from collections import Counter, defaultdict
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django_fsm.signals import post_transition
+
+from .models import (
+    ACE, Message, Operation, Organization, Participant, Person, Project, Role, Shift,
+    bulk_changed, participants_transitioned,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_subscriptions():
+    """Returns the ModelChangedSubscription classes by model."""
+    # imported lazily, as the schema imports the models
+    from .schemas import (
+        MessageChangedSubscription,
+        ParticipantChangedSubscription,
+        RoleChangedSubscription,
+        ShiftChangedSubscription,
+    )
+    return {
+        Message: MessageChangedSubscription,
+        Participant: ParticipantChangedSubscription,
+        Role: RoleChangedSubscription,
+        Shift: ShiftChangedSubscription,
+    }
+
+
+def broadcast_change(sender, instance, action):
+    subscription = get_subscriptions().get(sender)
+    if not subscription:
+        return
+    # notifications must not break the write path
+    try:
+        subscription.broadcast_change(instance, action)
+    except Exception:
+        logger.exception("Broadcasting %s %s failed", action, instance)
+
+
+@receiver(post_save)
+def broadcast_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if getattr(instance, 'deleted', False):
+        action = 'DELETED'  # soft deletion
+    else:
+        action = 'CREATED' if created else 'UPDATED'
+    broadcast_change(sender, instance, action)
+
+
+@receiver(post_delete)
+def broadcast_delete(sender, instance, **kwargs):
+    broadcast_change(sender, instance, 'DELETED')
+
+
+@receiver(bulk_changed, sender=Message)
+@receiver(bulk_changed, sender=Participant)
+@receiver(bulk_changed, sender=Role)
+@receiver(bulk_changed, sender=Shift)
+def broadcast_bulk_change(sender, action, instances=None, queryset=None, **kwargs):
+    subscription = get_subscriptions()[sender]
+    # notifications must not break the write path
+    try:
+        if queryset is not None:
+            subscription.broadcast_rows(queryset, action)
+        else:
+            subscription.broadcast_changes(instances, action)
+    except Exception:
+        logger.exception("Broadcasting %s %s failed", action, sender.__name__)
+
+
+# role fill levels ------------------------------------------------------------
+
+def broadcast_fill_deltas(deltas):
+    from .schemas import RoleFillChangedSubscription
+    # notifications must not break the write path
+    try:
+        RoleFillChangedSubscription.broadcast_deltas(deltas)
+    except Exception:
+        logger.exception("Broadcasting role fill deltas failed")
+
+
+@receiver(post_transition, sender=Participant)
+def record_fill_source(sender, instance, field, source, target, **kwargs):
+    # remember the states before the first transition since the last save
+    instance.__dict__.setdefault('_fill_sources', {}).setdefault(field.name, source)
+
+
+@receiver(post_save, sender=Participant)
+def broadcast_fill_save(sender, instance, created, raw=False, **kwargs):
+    sources = instance.__dict__.pop('_fill_sources', {})
+    if raw or not (created or sources):
+        return
+    delta = Counter()
+    delta[Participant.fill_state(instance.acceptance, instance.admin_acceptance)] += 1
+    if not created:
+        delta[Participant.fill_state(
+            sources.get('acceptance', instance.acceptance),
+            sources.get('admin_acceptance', instance.admin_acceptance),
+        )] -= 1
+    delta.pop(None, None)
+    broadcast_fill_deltas({instance.role_id: delta})
+
+
+@receiver(post_delete, sender=Participant)
+def broadcast_fill_delete(sender, instance, **kwargs):
+    state = Participant.fill_state(instance.acceptance, instance.admin_acceptance)
+    if state:
+        broadcast_fill_deltas({instance.role_id: Counter({state: -1})})
+
+
+@receiver(participants_transitioned, sender=Participant)
+def broadcast_fill_transition(sender, field, target, changes, **kwargs):
+    deltas = defaultdict(Counter)
+    for role_id, acceptance, admin_acceptance, count in changes:
+        states = {'acceptance': acceptance, 'admin_acceptance': admin_acceptance}
+        deltas[role_id][Participant.fill_state(**states)] -= count
+        deltas[role_id][Participant.fill_state(**dict(states, **{field: target}))] += count
+    for delta in deltas.values():
+        delta.pop(None, None)
+    broadcast_fill_deltas(deltas)
+
+
+# permission versions ---------------------------------------------------------
+
+@receiver([post_save, post_delete], sender=ACE)
+def bump_ace_permission_version(sender, instance, **kwargs):
+    Person.bump_permission_version(instance.person_id)
+
+
+@receiver(post_save, sender=Person)
+def bump_person_permission_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Person.bump_permission_version(instance.id)
+
+
+@receiver(m2m_changed, sender=Person.organizations_subscribed.through)
+@receiver(m2m_changed, sender=Person.organizations_employed.through)
+def bump_membership_permission_version(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        Person.bump_permission_version(instance.id)
+        return
+    # organization.persons_*: pk_set is None on clear
+    if pk_set is None:
+        Person.bump_permission_version()
+        return
+    for person_id in pk_set:
+        Person.bump_permission_version(person_id)
+
+
+@receiver([post_save, post_delete], sender=Organization)
+@receiver([post_save, post_delete], sender=Project)
+@receiver([post_save, post_delete], sender=Operation)
+def bump_hierarchy_permission_version(sender, instance, raw=False, created=True, **kwargs):
+    # admin id sets include the children of organizations and projects
+    if not raw and created:
+        Person.bump_permission_version()
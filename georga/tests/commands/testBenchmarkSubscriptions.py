@@ -0,0 +1,25 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+from io import StringIO
+
+from channels.layers import channel_layers
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+
+class BenchmarkSubscriptionsTestCase(TestCase):
+    def tearDown(self):
+        channel_layers.backends.clear()
+
+    @override_settings(CHANNEL_LAYERS={})
+    def test_benchmark(self):
+        """all events are delivered to all clients"""
+        stdout = StringIO()
+        call_command(
+            'benchmark_subscriptions', '--clients', '3', '--events', '5', '--interval', '0',
+            '--timeout', '10', stdout=stdout)
+        output = stdout.getvalue()
+        self.assertIn("clients: 3, events: 5, deliveries: 15", output)
+        self.assertIn("latency ms:", output)
+        self.assertIn("memory per connection:", output)
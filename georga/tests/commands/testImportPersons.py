@@ -0,0 +1,121 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+from io import StringIO
+from os import listdir
+from os.path import isfile, join
+from tempfile import NamedTemporaryFile
+from unittest.mock import patch
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ... import settings
+from ...models import (
+    Organization,
+    Person,
+    PersonProperty,
+)
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+
+
+class ImportPersonsTestCase(TestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+
+    def import_persons(self, lines, *args):
+        with NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write("\n".join(lines))
+            file.flush()
+            stdout, stderr = StringIO(), StringIO()
+            call_command('import_persons', file.name, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import(self):
+        """valid rows are imported, registered and invalid rows are skipped"""
+        organization = Organization.objects.filter(personpropertygroup__personproperty__isnull=False).first()
+        prop = PersonProperty.objects.filter(group__organization=organization).first()
+        stdout, stderr = self.import_persons([
+            "Email,First_Name,Last_Name,Properties",
+            f"import.001@georga.test,Import,One,{prop.name}",
+            "import.002@georga.test,Import,Two,",
+            "helper.001@georga.test,Already,Registered,",
+            "invalid,Invalid,Email,",
+            "import.003@georga.test,Unknown,Property,unknown",
+        ], '--organization', organization.name, '--defer-passwords')
+        # assert report
+        self.assertIn("created: 2, skipped: 1, invalid: 2", stdout)
+        self.assertIn("line 5:", stderr)
+        self.assertIn("line 6:", stderr)
+        # assert imported persons
+        person = Person.objects.get(email="import.001@georga.test")
+        self.assertEqual(person.username, person.email)
+        self.assertEqual(person.first_name, "Import")
+        self.assertFalse(person.has_usable_password())
+        self.assertEqual(person.activation_delivery, 'SCHEDULED')
+        self.assertListEqual(list(person.organizations_subscribed.all()), [organization])
+        self.assertListEqual(list(person.properties.all()), [prop])
+        self.assertFalse(Person.objects.filter(email="import.003@georga.test").exists())
+        # assert registered person is unchanged
+        self.assertNotEqual(Person.objects.get(email="helper.001@georga.test").first_name, "Already")
+
+    def test_duplicates(self):
+        """rows repeating an email are reported, registered usernames are skipped"""
+        organization = Organization.objects.first()
+        Person.objects.create(username="taken@georga.test", email="other@georga.test")
+        stdout, stderr = self.import_persons([
+            "email,first_name",
+            "import.001@georga.test,Import",
+            "import.001@GEORGA.test,Duplicate",
+            "taken@georga.test,Taken",
+            "import.002@georga.test,Import",
+        ], '--organization', organization.name, '--defer-passwords', '--chunk-size', '2')
+        # assert report
+        self.assertIn("created: 2, skipped: 1, invalid: 1", stdout)
+        self.assertIn("line 3: Duplicate of line 2.", stderr)
+        self.assertEqual(Person.objects.get(email="import.001@georga.test").first_name, "Import")
+
+    def test_constant_queries(self):
+        """the number of queries per chunk is independent of the number of rows"""
+        organization = Organization.objects.first()
+        lines = ["email,first_name"] + [f"import.{i:03}@georga.test,Import" for i in range(100)]
+        with CaptureQueriesContext(connection) as context:
+            self.import_persons(lines, '--organization', organization.name, '--defer-passwords')
+        self.assertLess(len(context.captured_queries), 15)
+        self.assertEqual(Person.objects.filter(email__startswith="import.").count(), 100)
+
+    def test_deliver_activation_emails(self):
+        """scheduled activation emails are delivered by the management command"""
+        organization = Organization.objects.first()
+        self.import_persons([
+            "email",
+            "import.001@georga.test",
+        ], '--organization', organization.name, '--defer-passwords')
+        # sign activation tokens with a temporary key
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        with patch.dict(settings.GRAPHQL_JWT, JWT_PRIVATE_KEY=key):
+            call_command('deliver_activation_emails', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertListEqual(mail.outbox[0].to, ["import.001@georga.test"])
+        self.assertEqual(Person.objects.get(email="import.001@georga.test").activation_delivery, 'SENT')
+
+    def test_failed_activation_emails(self):
+        """failed activation emails are marked as failed"""
+        organization = Organization.objects.first()
+        self.import_persons([
+            "email",
+            "import.001@georga.test",
+        ], '--organization', organization.name, '--defer-passwords')
+        # sign activation tokens with an invalid key
+        stderr = StringIO()
+        with patch.dict(settings.GRAPHQL_JWT, JWT_PRIVATE_KEY="invalid"):
+            call_command('deliver_activation_emails', stdout=StringIO(), stderr=stderr)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertIn("import.001@georga.test", stderr.getvalue())
+        self.assertEqual(Person.objects.get(email="import.001@georga.test").activation_delivery, 'FAILED')
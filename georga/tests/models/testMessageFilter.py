@@ -0,0 +1,68 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+from os import listdir
+from os.path import isfile, join
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+
+from ...models import (
+    MessageFilter,
+    Operation,
+    Organization,
+    Project,
+    Shift,
+    Task,
+)
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+PARENTS = {Shift: 'task', Task: 'operation', Operation: 'project', Project: 'organization'}
+
+
+def expected_channel_filters(person, scope):
+    """Returns the channel filters merged down the ancestry of the scope, one query per level."""
+    ancestry = [scope]
+    while type(ancestry[0]) in PARENTS:
+        ancestry.insert(0, getattr(ancestry[0], PARENTS[type(ancestry[0])]))
+    result = {channel: 'INHERITED' for channel in MessageFilter.CHANNELS}
+    for instance in [person] + ancestry:
+        message_filter = MessageFilter.objects.filter(
+            person=person, scope_ct=ContentType.objects.get_for_model(instance), scope_id=instance.id).first()
+        for channel in MessageFilter.CHANNELS:
+            level = getattr(message_filter, channel, 'INHERITED')
+            if level != 'INHERITED':
+                result[channel] = level
+    return result
+
+
+class ChannelFiltersTestCase(TestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+
+    def test_bulk_channel_filters(self):
+        """bulk channel filters match the filters merged per level with a fixed number of queries"""
+        persons = {message_filter.person for message_filter in MessageFilter.objects.all()}
+        # warm up content type cache
+        MessageFilter.bulk_channel_filters(next(iter(persons)), [])
+        for person in persons:
+            for model in [Organization, Project, Operation, Task, Shift]:
+                scopes = list(model.objects.all())
+                with self.subTest(person=person, model=model):
+                    # execute bulk query
+                    with self.assertNumQueries(2):
+                        result = MessageFilter.bulk_channel_filters(person, scopes)
+                    # assert same result as the filters merged per level
+                    for scope in scopes:
+                        self.assertEqual(result[scope], expected_channel_filters(person, scope))
+
+    def test_missing_default_filter(self):
+        """missing default filter of the person behaves like all channels on INHERITED"""
+        message_filter = MessageFilter.objects.filter(scope_ct__model='person').first()
+        person = message_filter.person
+        shift = Shift.objects.first()
+        # delete default filter
+        message_filter.delete()
+        # execute query
+        result = MessageFilter.channel_filters(person, shift)
+        # assert all channels are present
+        self.assertSetEqual(set(result), set(MessageFilter.CHANNELS))
@@ -0,0 +1,113 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+from os import listdir
+from os.path import isfile, join
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ...models import (
+    Location,
+    Message,
+    Operation,
+    Organization,
+    Project,
+    Role,
+    Shift,
+    Task,
+)
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+
+
+class SoftDeletionTestCase(TestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+
+    @staticmethod
+    def descendants(project):
+        operations = Operation._base_manager.filter(project=project)
+        tasks = Task._base_manager.filter(operation__project=project)
+        shifts = Shift._base_manager.filter(task__operation__project=project)
+        roles = Role._base_manager.filter(task__in=tasks) | Role._base_manager.filter(shift__in=shifts)
+        locations = Location._base_manager.filter(task__in=tasks) | Location._base_manager.filter(shift__in=shifts)
+        messages = Message._base_manager.none()
+        for model, queryset in [(Project, Project._base_manager.filter(pk=project.pk)),
+                                (Operation, operations), (Task, tasks), (Shift, shifts)]:
+            messages |= Message._base_manager.filter(
+                scope_ct=ContentType.objects.get_for_model(model),
+                scope_id__in=queryset.values('pk'))
+        return {
+            'georga.Operation': operations,
+            'georga.Task': tasks,
+            'georga.Shift': shifts,
+            'georga.Role': roles,
+            'georga.Location': locations,
+            'georga.Message': messages,
+        }
+
+    def test_cascade(self):
+        """soft deletion flags all descendants with one update per table"""
+        project = Project.objects.filter(operation__task__shift__role__isnull=False).first()
+        descendants = self.descendants(project)
+        expected = {label: queryset.filter(deleted=False).distinct().count() for label, queryset in descendants.items()}
+        unaffected = set(Task._base_manager.exclude(operation__project=project).filter(deleted=False))
+        # execute soft deletion
+        with CaptureQueriesContext(connection) as context:
+            total, counts = project.delete()
+        project.save()
+        # assert row counts
+        self.assertEqual(counts, {'georga.Project': 1, **expected})
+        self.assertEqual(total, sum(counts.values()))
+        # assert one update per table
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), len(counts))
+        # assert all descendants are flagged
+        project = Project._base_manager.get(pk=project.pk)
+        self.assertTrue(project.deleted)
+        self.assertEqual(project.state, 'DELETED')
+        for label, queryset in descendants.items():
+            with self.subTest(label=label):
+                self.assertFalse(queryset.filter(deleted=False).exists())
+                # assert other projects are unaffected
+        self.assertSetEqual(
+            set(Task._base_manager.exclude(operation__project=project).filter(deleted=False)), unaffected)
+
+    def test_undelete(self):
+        """undeletion restores only the rows flagged by the cascade"""
+        organization = Organization.objects.filter(project__operation__task__shift__isnull=False).first()
+        shift = Shift.objects.filter(task__operation__project__organization=organization).first()
+        models = [Organization, Project, Operation, Task, Shift, Role, Location, Message]
+        # delete a shift independently
+        shift.delete()
+        shift.save()
+        expected = {model: set(model._base_manager.filter(deleted=True)) for model in models}
+        # delete and undelete the organization
+        state = organization.state
+        organization.delete()
+        organization.save()
+        total, counts = organization.undelete()
+        organization.save()
+        # assert restored rows
+        organization = Organization._base_manager.get(pk=organization.pk)
+        self.assertFalse(organization.deleted)
+        self.assertIsNone(organization.deleted_at)
+        self.assertEqual(organization.state, state)
+        self.assertEqual(total, sum(counts.values()))
+        # assert independently deleted rows are still deleted
+        for model in models:
+            with self.subTest(model=model):
+                self.assertSetEqual(set(model._base_manager.filter(deleted=True)), expected[model])
+        self.assertIn(shift, expected[Shift])
+
+    def test_undelete_state(self):
+        """undeletion restores the state before the deletion"""
+        shift = Shift.objects.filter(state='PUBLISHED').first()
+        shift.delete()
+        shift.save()
+        self.assertEqual(Shift._base_manager.get(pk=shift.pk).state, 'DELETED')
+        shift.undelete()
+        shift.save()
+        self.assertEqual(Shift._base_manager.get(pk=shift.pk).state, 'PUBLISHED')
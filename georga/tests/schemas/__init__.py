@@ -190,7 +190,7 @@ class SchemaTestCaseMetaclass(type):
             graphene_type_name = field.type.name.removesuffix('Connection')
             graphene_type = schema.graphql_schema.get_type(graphene_type_name).graphene_type
             permission = getattr(graphene_type._meta.class_type, 'permission', [])
-            model = graphene_type._meta.model
+            model = getattr(graphene_type._meta, 'model', new.model)
             # assign variables
             new.field = field
             new.model = model
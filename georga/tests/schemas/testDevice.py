@@ -5,7 +5,10 @@ import random
 
 from django.db import transaction
 from django.forms.models import model_to_dict
+from django.test import Client
 from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.shortcuts import get_token
 
 from . import ListQueryTestCase, MutationTestCase
 from ...models import (
@@ -213,6 +216,116 @@ class CreateDeviceTestCase(MutationTestCase):
                 # logout user
                 self.client.logout()
 
+    # idempotency -------------------------------------------------------------
+
+    def test_idempotency_key(self):
+        """repeated idempotency keys return the stored payload"""
+        operation = """
+        mutation (
+            $name: String!
+            $idempotencyKey: String
+        ) {
+            createDevice (
+                input: {
+                    name: $name
+                    osType: "ANDROID"
+                    osVersion: "1.0"
+                    appType: "REACT"
+                    appVersion: "1.0"
+                    appStore: "GOOGLEPLAY"
+                    pushTokenType: "FCM"
+                    pushToken: "push-token"
+                    idempotencyKey: $idempotencyKey
+                }
+            ) {
+                device {
+                    id
+                }
+                errors {
+                    field
+                    messages
+                }
+            }
+        }
+        """
+        user = Person.objects.get(username="helper.001@georga.test")
+        self.client.authenticate(user)
+        count = Device.objects.count()
+        results = []
+        for key in ["key-1", "key-1", "key-2"]:
+            with self.subTest(key=key):
+                # execute operation
+                with self.captureOnCommitCallbacks(execute=True):
+                    result = self.client.execute(
+                        operation, variables={'name': "Device", 'idempotencyKey': key})
+                # assert no errors
+                self.assertIsNone(result.errors)
+                results.append(result.data['createDevice']['device']['id'])
+        # assert repeated key returned the stored payload
+        self.assertEqual(results[0], results[1])
+        self.assertNotEqual(results[0], results[2])
+        # assert only one device per key was created
+        self.assertEqual(Device.objects.count(), count + 2)
+        # assert error for a repeated key with a different input
+        result = self.client.execute(operation, variables={'name': "Other", 'idempotencyKey': "key-1"})
+        self.assertIn("different input", result.errors[0].message)
+        self.assertEqual(Device.objects.count(), count + 2)
+        self.client.logout()
+
+    def test_idempotency_key_rolled_back(self):
+        """idempotency keys of rolled back mutations are released at the end of the request"""
+        operation = """
+        mutation ($name: String!, $idempotencyKey: String) {
+            device: createDevice (
+                input: {
+                    name: $name
+                    osType: "ANDROID"
+                    osVersion: "1.0"
+                    appType: "REACT"
+                    appVersion: "1.0"
+                    appStore: "GOOGLEPLAY"
+                    pushTokenType: "FCM"
+                    pushToken: "push-token"
+                    idempotencyKey: $idempotencyKey
+                }
+            ) {
+                device {
+                    id
+                }
+            }
+            failure: createDevice (
+                input: {
+                    name: $name
+                    osType: "INVALID"
+                    osVersion: "1.0"
+                    appType: "REACT"
+                    appVersion: "1.0"
+                    appStore: "GOOGLEPLAY"
+                    pushTokenType: "FCM"
+                    pushToken: "push-token"
+                }
+            ) {
+                errors {
+                    field
+                }
+            }
+        }
+        """
+        user = Person.objects.get(username="helper.001@georga.test")
+        client = Client(HTTP_AUTHORIZATION=f"{jwt_settings.JWT_AUTH_HEADER_PREFIX} {get_token(user)}")
+        count = Device.objects.count()
+        for _ in range(2):
+            # execute operation, rolled back due to the errors of the second mutation
+            response = client.post("/graphql", {
+                'query': operation, 'variables': {'name': "Device", 'idempotencyKey': "key"},
+            }, content_type="application/json")
+            # assert no in progress error for the repeated key
+            result = response.json()
+            self.assertNotIn('errors', result)
+            self.assertEqual(result['data']['failure']['errors'][0]['field'], "osType")
+        # assert no device was created
+        self.assertEqual(Device.objects.count(), count)
+
 
 class UpdateDeviceTestCase(MutationTestCase):
     operation = """
@@ -2,7 +2,14 @@
 # Repository: https://github.com/georga-app/georga-server-django
 
 # TODO: list, create, update, delete
-from . import ListQueryTestCase
+from unittest.mock import patch
+
+from django.test import override_settings
+
+from . import ListQueryTestCase, auth, SUPERADMIN_USER
+from ...schemas import UUIDDjangoFilterConnectionField
+
+ESTIMATE = 100  # planner estimate, independent of the database backend
 
 
 class ListMessagesTestCase(ListQueryTestCase):
@@ -63,3 +70,48 @@ class ListMessagesTestCase(ListQueryTestCase):
         }
     }
     """
+
+    # performance -------------------------------------------------------------
+
+    @override_settings(GRAPHQL_CONNECTION_COUNT_CAP=2)
+    @auth(SUPERADMIN_USER, permitted=True)
+    def test_count_modes(self):
+        """count modes count all entries or entries up to the cap"""
+        operation = """
+        query ($first: Int, $countMode: ConnectionCountMode) {
+          listMessages (first: $first, countMode: $countMode) {
+            totalCount
+            pageInfo {
+              hasNextPage
+            }
+            edges {
+              node {
+                id
+              }
+            }
+          }
+        }
+        """
+        count = len(self.entries)
+        patcher = patch.object(UUIDDjangoFilterConnectionField, 'estimate_count', return_value=ESTIMATE)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for count_mode, first, total_count in [
+            ("EXACT", 1, count),
+            ("CAPPED", 1, min(count, 3)),
+            ("CAPPED", 4, min(count, 5)),
+            ("ESTIMATE", 1, ESTIMATE if count >= 3 else count),  # estimated beyond the cap
+            (None, 1, min(count, 3)),  # default for messages
+        ]:
+            with self.subTest(count_mode=count_mode, first=first):
+                # execute operation
+                result = self.client.execute(
+                    operation, {"first": first, "countMode": count_mode})
+                # assert no errors
+                self.assertIsNone(result.errors)
+                # assert counted entries
+                data = result.data["listMessages"]
+                self.assertEqual(data["totalCount"], total_count)
+                # assert page
+                self.assertEqual(len(data["edges"]), min(count, first))
+                self.assertEqual(data["pageInfo"]["hasNextPage"], count > first)
@@ -2,3 +2,102 @@
 # Repository: https://github.com/georga-app/georga-server-django
 
 # TODO: list, create, update, delete
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from graphql_relay import from_global_id
+
+from . import MutationTestCase, auth, SUPERADMIN_USER
+from ...models import (
+    Location,
+    Operation,
+    Role,
+    RoleSpecification,
+    Shift,
+    Task,
+)
+
+
+class CloneOperationTestCase(MutationTestCase):
+    operation = """
+    mutation (
+        $id: ID!
+        $name: String
+        $offset: Int
+    ) {
+        cloneOperation (
+            input: {
+                id: $id
+                name: $name
+                offset: $offset
+            }
+        ) {
+            operation {
+                id
+                name
+                state
+            }
+            errors {
+                field
+                messages
+            }
+        }
+    }
+    """
+
+    @staticmethod
+    def subtree(operation):
+        tasks = Task.objects.filter(operation=operation)
+        shifts = Shift.objects.filter(task__in=tasks)
+        roles = Role.objects.filter(task__in=tasks) | Role.objects.filter(shift__in=shifts)
+        return {
+            'tasks': sorted(tasks.values_list('name', 'start_time')),
+            'shifts': sorted(shifts.values_list('task__name', 'start_time', 'end_time')),
+            'roles': sorted(roles.values_list('name', 'is_template', 'quantity')),
+            'specifications': sorted(
+                RoleSpecification.objects.filter(role__in=roles).values_list(
+                    'role__name', 'necessity', 'person_properties')),
+            'locations': sorted(
+                Location.objects.filter(task__in=tasks).values_list('postal_address_name')
+                | Location.objects.filter(shift__in=shifts).values_list('postal_address_name')),
+        }
+
+    @auth(SUPERADMIN_USER)
+    def test_clone_operation(self):
+        """operations are cloned with their subtree and a time offset"""
+        source = Operation.objects.filter(task__shift__role__isnull=False).distinct().first()
+        expected = self.subtree(source)
+        offset = timedelta(days=365)
+        # execute operation
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.execute(
+                self.operation,
+                variables={
+                    'id': source.gid,
+                    'name': "Clone",
+                    'offset': int(offset.total_seconds()),
+                },
+            )
+        # assert no errors
+        self.assertIsNone(result.errors)
+        data = result.data['cloneOperation']
+        self.assertEqual(data['errors'], [])
+        self.assertEqual(data['operation']['name'], "Clone")
+        self.assertEqual(data['operation']['state'], "DRAFT")
+        clone = Operation.objects.get(uuid=from_global_id(data['operation']['id'])[1])
+        # assert subtree was cloned with offset
+        subtree = self.subtree(clone)
+        expected['tasks'] = sorted((name, time + offset) for name, time in expected['tasks'])
+        expected['shifts'] = sorted(
+            (name, start + offset, end + offset) for name, start, end in expected['shifts'])
+        self.assertEqual(subtree, expected)
+        self.assertTrue(expected['shifts'])
+        # assert source subtree is unchanged
+        self.assertEqual(
+            sorted(Task.objects.filter(operation=source).values_list('name', 'start_time')),
+            sorted((name, time - offset) for name, time in expected['tasks']),
+        )
+        # assert inserts are independent of the number of cloned instances
+        inserts = [q for q in context.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertLessEqual(len(inserts), 7)
@@ -2,3 +2,110 @@
 # Repository: https://github.com/georga-app/georga-server-django
 
 # TODO: list, create, update, delete
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from . import MutationTestCase, auth, SUPERADMIN_USER
+from ...models import (
+    Participant,
+    Person,
+)
+
+
+class AdminAcceptParticipantsTestCase(MutationTestCase):
+    model = Participant
+    operation = """
+    mutation (
+        $ids: [ID!]!
+    ) {
+        adminAcceptParticipants (
+            input: {
+                ids: $ids
+            }
+        ) {
+            participants {
+                id
+                adminAcceptance
+            }
+            errors {
+                id
+                messages
+            }
+        }
+    }
+    """
+
+    @auth(SUPERADMIN_USER)
+    def test_admin_accept_participants(self):
+        """participants are accepted with a constant number of queries"""
+        participants = list(Participant.objects.exclude(admin_acceptance='ACCEPTED'))
+        accepted = list(Participant.objects.filter(admin_acceptance='ACCEPTED'))
+        # execute operation
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.execute(
+                self.operation,
+                variables={'ids': [p.gid for p in participants + accepted]},
+            )
+        # assert no errors
+        self.assertIsNone(result.errors)
+        data = result.data['adminAcceptParticipants']
+        # assert participants were accepted
+        self.assertSetEqual(
+            {item['id'] for item in data['participants']},
+            {p.gid for p in participants},
+        )
+        for participant in Participant.objects.filter(pk__in=[p.pk for p in participants]):
+            self.assertEqual(participant.admin_acceptance, 'ACCEPTED')
+            self.assertEqual(participant.admin_acceptance_user, self.user)
+        # assert already accepted participants are returned as errors
+        self.assertSetEqual({error['id'] for error in data['errors']}, {p.gid for p in accepted})
+        # assert one update query
+        updates = [q for q in context.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+    def test_object_permits_user(self):
+        """participants of operations not administrated by the user are not accepted"""
+        participants = Participant.objects.exclude(admin_acceptance='ACCEPTED')
+        states = dict(participants.values_list('pk', 'admin_acceptance'))
+        for username in ["helper.001@georga.test", "organization.admin.1@frenchbluecircle.test"]:
+            user = Person.objects.get(username=username)
+            allowed = Participant.filter_permitted(
+                user, 'admin_accept', participants).count() == len(states)
+            with self.subTest(user=user, allowed=allowed):
+                self.client.authenticate(user)
+                # execute operation
+                result = self.client.execute(
+                    self.operation,
+                    variables={'ids': [p.gid for p in participants]},
+                )
+                # assert permission error for not administrated participants
+                self.assertEqual(result.errors is None, allowed)
+                # assert participants were only accepted if allowed
+                for participant in Participant.objects.filter(pk__in=states):
+                    expected = 'ACCEPTED' if allowed else states[participant.pk]
+                    self.assertEqual(participant.admin_acceptance, expected)
+                self.client.logout()
+
+    @auth(SUPERADMIN_USER)
+    def test_changed_concurrently(self):
+        """participants changed after the permission check are returned as errors"""
+        participants = list(Participant.objects.exclude(admin_acceptance='ACCEPTED')[:2])
+        bulk_transition = Participant.bulk_transition
+
+        def accept_first(*args, **kwargs):
+            Participant.objects.filter(pk=participants[0].pk).update(admin_acceptance='ACCEPTED')
+            return bulk_transition(*args, **kwargs)
+
+        # execute operation
+        with mock.patch.object(Participant, 'bulk_transition', accept_first):
+            result = self.client.execute(
+                self.operation,
+                variables={'ids': [p.gid for p in participants]},
+            )
+        # assert the changed participant is returned as error
+        self.assertIsNone(result.errors)
+        data = result.data['adminAcceptParticipants']
+        self.assertListEqual([item['id'] for item in data['participants']], [participants[1].gid])
+        self.assertListEqual([error['id'] for error in data['errors']], [participants[0].gid])
@@ -2,3 +2,85 @@
 # Repository: https://github.com/georga-app/georga-server-django
 
 # TODO: list, create, update, delete
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from . import MutationTestCase, auth
+from ...models import (
+    Person,
+)
+
+
+class UpdatePersonProfileTestCase(MutationTestCase):
+    operation = """
+    mutation (
+        $firstName: String
+        $email: String
+    ) {
+        updatePersonProfile (
+            input: {
+                firstName: $firstName
+                email: $email
+            }
+        ) {
+            person {
+                id
+                firstName
+                lastName
+                email
+            }
+            errors {
+                field
+                messages
+            }
+        }
+    }
+    """
+
+    @auth("helper.001@georga.test")
+    def test_partial_update(self):
+        """only submitted fields are loaded, validated and written"""
+        person = Person.objects.get(username="helper.001@georga.test")
+        properties = set(person.properties.all())
+        # execute operation
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.execute(
+                self.operation,
+                variables={'firstName': "Partial"},
+            )
+        # assert no errors
+        self.assertIsNone(result.errors)
+        self.assertListEqual(result.data['updatePersonProfile']['errors'], [])
+        # assert only the submitted field was changed
+        updated = Person.objects.get(pk=person.pk)
+        self.assertEqual(updated.first_name, "Partial")
+        self.assertEqual(updated.last_name, person.last_name)
+        self.assertEqual(updated.email, person.email)
+        self.assertSetEqual(set(updated.properties.all()), properties)
+        # assert no ManyToMany fields were loaded or written
+        queries = [query['sql'] for query in context.captured_queries]
+        for table in ['properties', 'task_fields_agreed', 'roles_agreed', 'resources_provided']:
+            self.assertFalse([sql for sql in queries if f'georga_person_{table}' in sql], table)
+        # assert only the submitted field and auto_now fields were written
+        updates = [sql for sql in queries if sql.startswith('UPDATE "georga_person"')]
+        self.assertEqual(len(updates), 1)
+        set_clause = updates[0].split(" WHERE ")[0]
+        self.assertIn('"first_name"', set_clause)
+        self.assertIn('"modified_at"', set_clause)
+        self.assertNotIn('"last_name"', set_clause)
+        self.assertNotIn('"password"', set_clause)
+
+    @auth("helper.001@georga.test")
+    def test_partial_update_email(self):
+        """username is written along with a submitted email"""
+        email = "helper.001.changed@georga.test"
+        # execute operation
+        result = self.client.execute(
+            self.operation,
+            variables={'email': email},
+        )
+        # assert no errors
+        self.assertIsNone(result.errors)
+        self.assertListEqual(result.data['updatePersonProfile']['errors'], [])
+        # assert username was updated
+        self.assertTrue(Person.objects.filter(email=email, username=email).exists())
@@ -2,3 +2,93 @@
 # Repository: https://github.com/georga-app/georga-server-django
 
 # TODO: list, create, update, delete
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from . import MutationTestCase, auth, SUPERADMIN_USER
+from ...models import (
+    Message,
+    PersonToObject,
+    Shift,
+)
+
+
+class UpsertPersonToObjectsTestCase(MutationTestCase):
+    model = PersonToObject
+    operation = """
+    mutation (
+        $relationObjects: [ID!]!
+        $unnoticed: Boolean
+        $bookmarked: Boolean
+    ) {
+        upsertPersonToObjects (
+            input: {
+                relationObjects: $relationObjects
+                unnoticed: $unnoticed
+                bookmarked: $bookmarked
+            }
+        ) {
+            personToObjects {
+                id
+                unnoticed
+                bookmarked
+            }
+            errors {
+                field
+                messages
+            }
+        }
+    }
+    """
+
+    @auth(SUPERADMIN_USER)
+    def test_upsert_person_to_objects(self):
+        """entries are created or updated with one insert statement"""
+        relation_objects = list(Message.objects.all()[:3]) + list(Shift.objects.all()[:3])
+        # create one existing entry
+        existing = PersonToObject.objects.create(
+            person=self.user, relation_object=relation_objects[0], bookmarked=True)
+        count = PersonToObject.objects.count()
+        # execute operation
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.execute(
+                self.operation,
+                variables={
+                    'relationObjects': [obj.gid for obj in relation_objects],
+                    'unnoticed': False,
+                },
+            )
+        # assert no errors
+        self.assertIsNone(result.errors)
+        data = result.data['upsertPersonToObjects']
+        self.assertEqual(data['errors'], [])
+        # assert entries were created or updated
+        self.assertEqual(len(data['personToObjects']), len(relation_objects))
+        self.assertEqual(PersonToObject.objects.count(), count + len(relation_objects) - 1)
+        for obj in relation_objects:
+            entry = PersonToObject.objects.get(
+                person=self.user,
+                relation_object_id=obj.id,
+                relation_object_ct__model=obj._meta.model_name,
+            )
+            self.assertFalse(entry.unnoticed)
+            # assert existing flags are left untouched
+            self.assertEqual(entry.bookmarked, entry.pk == existing.pk)
+        # assert one insert statement
+        inserts = [q for q in context.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+
+    @auth(SUPERADMIN_USER)
+    def test_invalid_relation_object(self):
+        """relation objects of invalid types return errors"""
+        count = PersonToObject.objects.count()
+        # execute operation
+        result = self.client.execute(
+            self.operation,
+            variables={'relationObjects': [self.user.gid], 'bookmarked': True},
+        )
+        # assert validation error
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(result.data['upsertPersonToObjects']['errors']), 1)
+        # assert no entries were created
+        self.assertEqual(PersonToObject.objects.count(), count)
@@ -2,7 +2,18 @@
 # Repository: https://github.com/georga-app/georga-server-django
 
 # TODO: list, create, update, delete
-from . import ListQueryTestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from graphql_relay import from_global_id
+
+from . import ListQueryTestCase, MutationTestCase, auth, SUPERADMIN_USER
+from ...models import (
+    Person,
+    PersonProperty,
+    Role,
+    Shift,
+    Task,
+)
 
 
 class ListRolesTestCase(ListQueryTestCase):
@@ -48,3 +59,217 @@ class ListRolesTestCase(ListQueryTestCase):
       }
     }
     """
+
+    # performance -------------------------------------------------------------
+
+    @auth(SUPERADMIN_USER, permitted=True)
+    def test_necessities_prefetched(self):
+        """necessities are resolved with a constant number of queries"""
+        operation = """
+        query ($first: Int) {
+          listRoles (first: $first) {
+            edges {
+              node {
+                id
+                mandatory { id }
+                recommended { id }
+                unrecommended { id }
+                impossible { id }
+              }
+            }
+          }
+        }
+        """
+        queries = []
+        for first in [1, len(self.entries)]:
+            # execute operation
+            with CaptureQueriesContext(connection) as context:
+                result = self.client.execute(operation, {"first": first})
+            queries.append(len(context.captured_queries))
+            # assert no errors
+            self.assertIsNone(result.errors)
+            # assert necessities match the database entries
+            for edge, entry in zip(result.data["listRoles"]["edges"], self.entries):
+                node = edge["node"]
+                for necessity in ["mandatory", "recommended", "unrecommended", "impossible"]:
+                    expected_ids = {
+                        prop.gid
+                        for specification in entry.rolespecification_set.all()
+                        if specification.necessity == necessity.upper()
+                        for prop in specification.person_properties.all()
+                    }
+                    result_ids = {prop["id"] for prop in node[necessity]}
+                    self.assertSetEqual(result_ids, expected_ids)
+        # assert number of queries is independent of the number of roles
+        self.assertEqual(queries[0], queries[1])
+
+
+class CreateRolesTestCase(MutationTestCase):
+    model = Role
+    operation = """
+    mutation (
+        $shift: ID
+        $task: ID
+        $roles: [RoleInput!]!
+    ) {
+        createRoles (
+            input: {
+                shift: $shift
+                task: $task
+                roles: $roles
+            }
+        ) {
+            roles {
+                id
+                name
+                quantity
+                isTemplate
+                mandatory { id }
+                impossible { id }
+            }
+            errors {
+                field
+                messages
+            }
+        }
+    }
+    """
+
+    def get_variables(self, shift, count):
+        properties = PersonProperty.objects.filter(
+            group__organization=shift.task.operation.project.organization)
+        return {
+            'shift': shift.gid,
+            'roles': [
+                {
+                    'name': f"Role {index}",
+                    'quantity': index + 1,
+                    'mandatory': [prop.gid for prop in properties[:2]],
+                    'impossible': [prop.gid for prop in properties[2:3]],
+                }
+                for index in range(count)
+            ],
+        }
+
+    @auth(SUPERADMIN_USER)
+    def test_create_roles(self):
+        """roles and specifications are created with a constant number of queries"""
+        shift = Shift.objects.first()
+        queries = []
+        for count in [1, 3]:
+            with self.subTest(count=count):
+                variables = self.get_variables(shift, count)
+                # execute operation
+                with CaptureQueriesContext(connection) as context:
+                    result = self.client.execute(self.operation, variables=variables)
+                queries.append(len(context.captured_queries))
+                # assert no errors
+                self.assertIsNone(result.errors)
+                data = result.data['createRoles']
+                self.assertEqual(data['errors'], [])
+                # assert roles were created
+                self.assertEqual(len(data['roles']), count)
+                for item, expected in zip(data['roles'], variables['roles']):
+                    role = Role.objects.get(uuid=from_global_id(item['id'])[1])
+                    self.assertEqual(role.shift, shift)
+                    self.assertEqual(role.quantity, expected['quantity'])
+                    self.assertFalse(role.is_template)
+                    # assert specifications were created
+                    necessities = role.person_properties_by_necessity
+                    for necessity in ['mandatory', 'impossible']:
+                        self.assertSetEqual(
+                            {prop.gid for prop in necessities.get(necessity.upper(), [])},
+                            set(expected[necessity]),
+                        )
+        # assert number of queries is independent of the number of roles
+        self.assertEqual(queries[0], queries[1])
+
+    @auth(SUPERADMIN_USER)
+    def test_create_template_roles(self):
+        """roles of tasks are created as templates"""
+        task = Task.objects.first()
+        variables = self.get_variables(task.shift_set.first(), 2)
+        del variables['shift']
+        variables['task'] = task.gid
+        # execute operation
+        result = self.client.execute(self.operation, variables=variables)
+        # assert roles were created as templates
+        self.assertIsNone(result.errors)
+        data = result.data['createRoles']
+        self.assertEqual(data['errors'], [])
+        self.assertEqual([role['isTemplate'] for role in data['roles']], [True, True])
+
+    @auth(SUPERADMIN_USER)
+    def test_invalid_roles(self):
+        """invalid roles return errors and no roles are created"""
+        count = Role.objects.count()
+        shift = Shift.objects.first()
+        foreign_property = PersonProperty.objects.exclude(
+            group__organization=shift.task.operation.project.organization).first()
+        for field, change in [
+            ('_All__', {'task': shift.task.gid}),
+            ('roles.1.mandatory', {'roles': {'mandatory': [foreign_property.gid]}}),
+            ('roles.1.name', {'roles': {'name': ''}}),
+        ]:
+            with self.subTest(field=field):
+                variables = self.get_variables(shift, 2)
+                variables['roles'][1].update(change.pop('roles', {}))
+                variables.update(change)
+                # execute operation
+                result = self.client.execute(self.operation, variables=variables)
+                # assert validation error
+                self.assertIsNone(result.errors)
+                errors = result.data['createRoles']['errors']
+                self.assertEqual([error['field'] for error in errors], [field])
+                # assert no roles were created
+                self.assertEqual(Role.objects.count(), count)
+
+    def test_object_permits_user(self):
+        """roles can only be created for operations administrated by the user"""
+        user = Person.objects.filter(is_staff=True, is_superuser=False).first()
+        self.client.authenticate(user)
+        for shift in [
+            Shift.objects.filter(task__operation__in=user.admin_operation_ids).first(),
+            Shift.objects.exclude(task__operation__in=user.admin_operation_ids).first(),
+        ]:
+            permitted = shift.task.operation_id in user.admin_operation_ids
+            with self.subTest(permitted=permitted):
+                count = Role.objects.count()
+                # execute operation
+                result = self.client.execute(self.operation, variables=self.get_variables(shift, 2))
+                # assert permission error, if the operation is not administrated
+                self.assertEqual(result.errors is None, permitted)
+                self.assertEqual(Role.objects.count() > count, permitted)
+
+
+class UndeleteRoleTestCase(MutationTestCase):
+    operation = """
+    mutation ($id: ID!) {
+        undeleteRole (input: {id: $id}) {
+            role {
+                id
+            }
+        }
+    }
+    """
+    delete_operation = """
+    mutation ($id: ID!) {
+        deleteRole (input: {id: $id}) {
+            role {
+                id
+            }
+        }
+    }
+    """
+
+    @auth(SUPERADMIN_USER)
+    def test_undelete_role(self):
+        """roles are soft deleted and can be restored"""
+        role = Role.objects.first()
+        for operation, deleted in [(self.delete_operation, True), (self.operation, False)]:
+            with self.subTest(deleted=deleted):
+                # execute operation
+                result = self.client.execute(operation, variables={'id': role.gid})
+                self.assertIsNone(result.errors)
+                # assert deletion flag
+                self.assertEqual(Role._base_manager.get(pk=role.pk).deleted, deleted)
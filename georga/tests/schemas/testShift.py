@@ -2,3 +2,169 @@
 # Repository: https://github.com/georga-app/georga-server-django
 
 # TODO: list, create, update, delete
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql_relay import from_global_id
+
+from . import MutationTestCase, auth, SUPERADMIN_USER
+from ...models import (
+    Location,
+    Role,
+    Shift,
+    Task,
+)
+
+
+class CreateShiftsTestCase(MutationTestCase):
+    operation = """
+    mutation (
+        $task: ID!
+        $shifts: [ShiftTimesInput!]!
+        $publish: Boolean
+    ) {
+        createShifts (
+            input: {
+                task: $task
+                shifts: $shifts
+                publish: $publish
+            }
+        ) {
+            shifts {
+                id
+                state
+                startTime
+                endTime
+            }
+            errors {
+                field
+                messages
+            }
+        }
+    }
+    """
+
+    def get_variables(self, task, count):
+        start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        return {
+            'task': task.gid,
+            'shifts': [
+                {
+                    'startTime': (start + timedelta(days=day)).isoformat(),
+                    'endTime': (start + timedelta(days=day, hours=8)).isoformat(),
+                }
+                for day in range(count)
+            ],
+            'publish': True,
+        }
+
+    @auth(SUPERADMIN_USER)
+    def test_create_shifts(self):
+        """shifts are created with copies of the template roles and locations"""
+        task = Task.objects.filter(role__is_template=True).distinct().first()
+        template_roles = Role.objects.filter(task=task, is_template=True)
+        template_locations = Location.objects.filter(task=task, is_template=True)
+        queries = []
+        for count in [1, 3]:
+            with self.subTest(count=count):
+                # execute operation
+                with CaptureQueriesContext(connection) as context:
+                    result = self.client.execute(
+                        self.operation, variables=self.get_variables(task, count))
+                queries.append(len(context.captured_queries))
+                # assert no errors
+                self.assertIsNone(result.errors)
+                data = result.data['createShifts']
+                self.assertEqual(data['errors'], [])
+                # assert shifts were created
+                self.assertEqual(len(data['shifts']), count)
+                for item in data['shifts']:
+                    self.assertEqual(item['state'], 'PUBLISHED')
+                    shift = Shift.objects.get(uuid=from_global_id(item['id'])[1])
+                    # assert template roles were copied
+                    roles = Role.objects.filter(shift=shift)
+                    self.assertEqual(
+                        sorted(roles.values_list('name', 'quantity', 'is_template')),
+                        sorted((role.name, role.quantity, False) for role in template_roles),
+                    )
+                    for role in roles:
+                        template = template_roles.get(name=role.name)
+                        self.assertEqual(
+                            role.person_properties_by_necessity,
+                            template.person_properties_by_necessity,
+                        )
+                    # assert template locations were copied
+                    self.assertEqual(
+                        sorted(Location.objects.filter(shift=shift).values_list(
+                            'category', 'postal_address_name', 'is_template')),
+                        sorted((location.category_id, location.postal_address_name, False)
+                               for location in template_locations),
+                    )
+        # assert number of queries is independent of the number of shifts
+        self.assertEqual(queries[0], queries[1])
+
+    @auth(SUPERADMIN_USER)
+    def test_end_time_before_start_time(self):
+        """shifts ending before they start are not created"""
+        task = Task.objects.first()
+        count = Shift.objects.count()
+        variables = self.get_variables(task, 2)
+        shift = variables['shifts'][1]
+        shift['startTime'], shift['endTime'] = shift['endTime'], shift['startTime']
+        # execute operation
+        result = self.client.execute(self.operation, variables=variables)
+        # assert validation error
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(result.data['createShifts']['errors']), 1)
+        # assert no shifts were created
+        self.assertEqual(Shift.objects.count(), count)
+
+
+class UndeleteShiftTestCase(MutationTestCase):
+    operation = """
+    mutation ($id: ID!) {
+        undeleteShift (input: {id: $id}) {
+            shift {
+                id
+                state
+            }
+            errors {
+                field
+                messages
+            }
+        }
+    }
+    """
+    delete_operation = """
+    mutation ($id: ID!) {
+        deleteShift (input: {id: $id}) {
+            shift {
+                id
+            }
+        }
+    }
+    """
+
+    @auth(SUPERADMIN_USER)
+    def test_undelete_shift(self):
+        """deleted shifts are restored with their roles and locations"""
+        shift = Shift.objects.filter(role__isnull=False, location__isnull=False).first()
+        roles = set(Role._base_manager.filter(shift=shift, deleted=False))
+        locations = set(Location._base_manager.filter(shift=shift, deleted=False))
+        # execute delete operation
+        result = self.client.execute(self.delete_operation, variables={'id': shift.gid})
+        self.assertIsNone(result.errors)
+        # assert shift and descendants are soft deleted
+        self.assertEqual(Shift._base_manager.get(pk=shift.pk).state, 'DELETED')
+        self.assertFalse(Role._base_manager.filter(shift=shift, deleted=False).exists())
+        # execute undelete operation
+        result = self.client.execute(self.operation, variables={'id': shift.gid})
+        # assert shift and descendants are restored
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['undeleteShift']['shift']['state'], shift.state)
+        shift = Shift._base_manager.get(pk=shift.pk)
+        self.assertFalse(shift.deleted)
+        self.assertSetEqual(set(Role._base_manager.filter(shift=shift, deleted=False)), roles)
+        self.assertSetEqual(set(Location._base_manager.filter(shift=shift, deleted=False)), locations)
@@ -0,0 +1,111 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import asyncio
+from os import listdir
+from os.path import isfile, join
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels_graphql_ws.client import GraphqlWsClient, GraphqlWsResponseError
+from channels_graphql_ws.testing import GraphqlWsTransport
+from django.test import TestCase
+from graphql_jwt.shortcuts import get_token
+
+from ...asgi import application
+from ...models import ACE, Organization, Person
+from ...schemas import ShiftChangedSubscription
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+HELPER_USER = "helper.001@georga.test"  # email of helper
+
+SHIFT_CHANGED = """
+    subscription ($organization: ID) {
+        shiftChanged(organization: $organization) {
+            id
+        }
+    }
+"""
+
+
+class ConsumerAuthenticationTestCase(TestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+
+    async def connect(self, payload):
+        transport = GraphqlWsTransport(application, "graphql")
+        await transport.connect()
+        await transport.send({"type": "connection_init", "payload": payload})
+        return transport, await transport.receive()
+
+    async def test_invalid_token(self):
+        """connections with invalid tokens are rejected"""
+        transport, response = await self.connect({"Authorization": "JWT invalid"})
+        self.assertEqual(response['type'], "connection_error")
+        await transport.wait_disconnect()
+
+    async def test_permission_version(self):
+        """the cached user is refreshed, if its permissions changed"""
+        user = await database_sync_to_async(Person.objects.get)(email=HELPER_USER)
+        token = await database_sync_to_async(get_token)(user)
+        organization_ids = await database_sync_to_async(lambda: user.organization_ids)()
+        organization = await database_sync_to_async(
+            Organization.objects.exclude(id__in=organization_ids).first)()
+        transport, response = await self.connect({"Authorization": f"JWT {token}"})
+        self.assertEqual(response['type'], "connection_ack")
+        client = GraphqlWsClient(transport)
+        client._is_connected = True
+        variables = {'organization': organization.gid}
+        # not a member yet
+        msg_id = await client.subscribe(SHIFT_CHANGED, variables=variables, wait_confirmation=False)
+        with self.assertRaises(GraphqlWsResponseError):
+            await client.receive(assert_id=msg_id)
+        # subscribe as member
+        await database_sync_to_async(user.organizations_subscribed.add)(organization)
+        await client.subscribe(SHIFT_CHANGED, variables=variables, wait_confirmation=False)
+        group = ShiftChangedSubscription._group_name(f"organization.{organization.id}")
+        async with asyncio.timeout(5):
+            while not get_channel_layer().groups.get(group):
+                await asyncio.sleep(0.01)
+        await client.finalize()
+
+    async def test_lost_permissions(self):
+        """subscriptions leave the groups the user lost with a new permission version"""
+        user = await database_sync_to_async(Person.objects.get)(email=HELPER_USER)
+        token = await database_sync_to_async(get_token)(user)
+        organization = await database_sync_to_async(
+            lambda: Organization.objects.filter(id__in=user.organization_ids).first())()
+        transport, response = await self.connect({"Authorization": f"JWT {token}"})
+        client = GraphqlWsClient(transport)
+        client._is_connected = True
+        await client.subscribe(SHIFT_CHANGED, variables={}, wait_confirmation=False)
+        msg_id = await client.subscribe(
+            SHIFT_CHANGED, variables={'organization': organization.gid}, wait_confirmation=False)
+        group = ShiftChangedSubscription._group_name(f"organization.{organization.id}")
+        # wait for both subscriptions, the first one joins all organizations
+        organization_ids = await database_sync_to_async(lambda: user.organization_ids)()
+        groups = [ShiftChangedSubscription._group_name(f"organization.{id}") for id in organization_ids]
+        async with asyncio.timeout(5):
+            while not all(get_channel_layer().groups.get(name) for name in groups):
+                await asyncio.sleep(0.01)
+        await database_sync_to_async(organization.persons_subscribed.remove)(user)
+        await database_sync_to_async(organization.persons_employed.remove)(user)
+        # the next operation refreshes the context
+        await client.start("query { __typename }")
+        # the subscription to the organization is stopped
+        await client.receive(assert_id=msg_id, assert_type="complete")
+        self.assertFalse(get_channel_layer().groups.get(group))
+        await client.finalize()
+
+    def test_bump_permission_version(self):
+        """permission versions change with ACEs, memberships and the hierarchy"""
+        user = Person.objects.get(email=HELPER_USER)
+        organization = Organization.objects.exclude(id__in=user.organization_ids).first()
+        for change in [
+            lambda: user.organizations_employed.add(organization),
+            lambda: organization.persons_subscribed.remove(user),
+            lambda: ACE.objects.create(instance=organization, person=user, permission='ADMIN'),
+            lambda: organization.project_set.create(name="New"),
+        ]:
+            version = user.permission_version
+            change()
+            self.assertNotEqual(user.permission_version, version)
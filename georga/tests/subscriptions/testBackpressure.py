@@ -0,0 +1,177 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import asyncio
+import json
+import time
+from os import listdir
+from os.path import isfile, join
+
+from channels.db import database_sync_to_async
+from channels_graphql_ws.client import GraphqlWsClient
+from channels_graphql_ws.testing import GraphqlWsTransport
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ...asgi import SLOW_CONSUMER_CLOSE_CODE
+from ...backpressure import ConnectionRegistry, SendQueue, websocket_connections
+from ...models import Person
+from .testModelChanged import application
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+
+
+def notification(subscription, instance, value=None, action='UPDATED'):
+    """Returns a data message of a subscription."""
+    return {'type': 'data', 'id': subscription, 'payload': {'data': {'changed': {
+        'id': instance, 'value': value, 'action': action}}}}
+
+
+class SendQueueTestCase(SimpleTestCase):
+    def drain(self, queue):
+        messages = []
+        while queue.entries:
+            message, queued = asyncio.run(queue.get())
+            queue.record(queued)
+            messages.append(message)
+        return messages
+
+    def test_drop_oldest(self):
+        """the oldest notification is dropped if the queue is full"""
+        queue = SendQueue(limit=2, policy='drop_oldest')
+        self.assertTrue(queue.put({'type': 'connection_ack'}))
+        for n in range(3):
+            self.assertTrue(queue.put(notification("1", str(n)), droppable=True))
+        messages = self.drain(queue)
+        self.assertListEqual(
+            [message['type'] for message in messages], ['connection_ack', 'data'])
+        self.assertEqual(messages[1]['payload']['data']['changed']['id'], "2")
+        self.assertDictEqual(
+            {name: value for name, value in queue.metrics.items() if not name.startswith('latency')},
+            {'depth': 0, 'unacked': None, 'sent': 2, 'dropped': 2, 'coalesced': 0})
+
+    def test_coalesce(self):
+        """queued notifications of the same subscription and object are replaced"""
+        queue = SendQueue(limit=2, policy='coalesce')
+        queue.put(notification("1", "a", 1), droppable=True)
+        queue.put(notification("2", "a", 2), droppable=True)
+        queue.put(notification("1", "a", 3), droppable=True)
+        queue.put(notification("1", "b", 4), droppable=True)
+        values = [message['payload']['data']['changed']['value'] for message in self.drain(queue)]
+        self.assertListEqual(values, [2, 4])
+        self.assertEqual(queue.metrics['coalesced'], 1)
+        self.assertEqual(queue.metrics['dropped'], 1)
+
+    def test_coalesce_full_only(self):
+        """notifications are coalesced only if the queue is full"""
+        queue = SendQueue(limit=3, policy='coalesce')
+        queue.put(notification("1", "a", 1), droppable=True)
+        queue.put(notification("1", "a", 2), droppable=True)
+        values = [message['payload']['data']['changed']['value'] for message in self.drain(queue)]
+        self.assertListEqual(values, [1, 2])
+        self.assertEqual(queue.metrics['coalesced'], 0)
+
+    def test_coalesce_created(self):
+        """coalesced notifications of created objects keep the CREATED action"""
+        queue = SendQueue(limit=1, policy='coalesce')
+        queue.put(notification("1", "a", 1, 'CREATED'), droppable=True)
+        queue.put(notification("1", "a", 2, 'UPDATED'), droppable=True)
+        changed = self.drain(queue)[0]['payload']['data']['changed']
+        self.assertEqual((changed['value'], changed['action']), (2, 'CREATED'))
+        queue.put(notification("1", "a", 1, 'CREATED'), droppable=True)
+        queue.put(notification("1", "a", 2, 'DELETED'), droppable=True)
+        self.assertEqual(self.drain(queue)[0]['payload']['data']['changed']['action'], 'DELETED')
+
+    def test_disconnect(self):
+        """the connection has to be closed if the queue is full"""
+        queue = SendQueue(limit=1, policy='disconnect')
+        self.assertTrue(queue.put(notification("1", "a"), droppable=True))
+        self.assertTrue(queue.put({'type': 'complete', 'id': "1"}))
+        self.assertFalse(queue.put(notification("1", "b"), droppable=True))
+
+    def test_window(self):
+        """the window of unacknowledged bytes is exhausted until the client acknowledges"""
+        queue = SendQueue(limit=1, policy='drop_oldest', window=100)
+        queue.record(time.monotonic(), 20)
+        self.assertIsNone(queue.ping())
+        queue.record(time.monotonic(), 20)
+        self.assertDictEqual(queue.ping(), {'type': 'ping', 'payload': {'bytes': 40}})
+        queue.record(time.monotonic(), 60)
+        self.assertTrue(queue.blocked)
+        self.assertFalse(asyncio.run(queue.wait_credit(0.01)))
+        self.assertDictEqual(queue.ping(), {'type': 'ping', 'payload': {'bytes': 100}})
+        queue.ack(40)
+        self.assertEqual(queue.unacked, 60)
+        self.assertTrue(asyncio.run(queue.wait_credit(0.01)))
+        queue.ack("invalid")
+        queue.ack(1000)
+        self.assertEqual(queue.unacked, 0)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            SendQueue(limit=1, policy='unknown')
+
+
+class ConnectionRegistryTestCase(SimpleTestCase):
+    def test_metrics(self):
+        """metrics of open and closed connections are aggregated"""
+        registry = ConnectionRegistry()
+        first, second = SendQueue(1, 'drop_oldest'), SendQueue(1, 'drop_oldest')
+        registry.open("first", 1, first)
+        registry.open("second", 2, second)
+        first.put(notification("1", "a"), droppable=True)
+        first.put(notification("1", "b"), droppable=True)
+        second.sent, second.latency_total, second.latency_max = 2, 0.4, 0.3
+        self.assertListEqual([connection['person_id'] for connection in registry.list()], [1, 2])
+        registry.close("second", disconnected=True)
+        metrics = registry.metrics
+        self.assertDictEqual(metrics, {
+            'connections': 1, 'depth': 1, 'depth_max': 1, 'sent': 2, 'dropped': 1,
+            'coalesced': 0, 'disconnected': 1, 'latency_avg': 0.2, 'latency_max': 0.3})
+
+
+class WebsocketConnectionsTestCase(TestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+
+    async def test_open_and_close(self):
+        """websocket connections are registered while open"""
+        user = await database_sync_to_async(Person.objects.get)(email="helper.001@georga.test")
+        client = GraphqlWsClient(GraphqlWsTransport(application(user), "graphql"))
+        await client.connect_and_init()
+        connections = [
+            connection for connection in websocket_connections.list() if connection['person_id'] == user.id]
+        self.assertEqual(len(connections), 1)
+        self.assertEqual(connections[0]['sent'], 1)  # connection_ack
+        await client.finalize()
+        self.assertNotIn(
+            connections[0]['connection'], [connection['connection'] for connection in websocket_connections.list()])
+
+    async def connect_with_acks(self):
+        user = await database_sync_to_async(Person.objects.get)(email="helper.001@georga.test")
+        transport = GraphqlWsTransport(application(user), "graphql")
+        await transport.connect()
+        await transport.send({'type': 'connection_init', 'payload': {'ack': True}})
+        return transport
+
+    @override_settings(SUBSCRIPTION_SEND_WINDOW=1, SUBSCRIPTION_ACK_TIMEOUT=5)
+    async def test_acknowledgements(self):
+        """messages beyond the window are sent after the acknowledgement of the client"""
+        transport = await self.connect_with_acks()
+        ack = await transport.receive()
+        self.assertEqual(ack['type'], 'connection_ack')
+        ping = await transport.receive()
+        self.assertDictEqual(ping, {'type': 'ping', 'payload': {'bytes': len(json.dumps(ack).encode())}})
+        await transport.send({'type': 'start', 'id': "1", 'payload': {'query': "query { __typename }"}})
+        self.assertTrue(await transport._comm.receive_nothing(0.1))
+        await transport.send({'type': 'pong', 'payload': ping['payload']})
+        self.assertEqual((await transport.receive())['type'], 'data')
+        await transport.disconnect()
+
+    @override_settings(SUBSCRIPTION_SEND_WINDOW=1, SUBSCRIPTION_ACK_TIMEOUT=0.1)
+    async def test_stalled(self):
+        """clients not acknowledging within the timeout are disconnected"""
+        transport = await self.connect_with_acks()
+        self.assertEqual((await transport.receive())['type'], 'connection_ack')
+        self.assertEqual((await transport.receive())['type'], 'ping')
+        output = await transport._comm.receive_output(timeout=5)
+        self.assertDictEqual(output, {'type': 'websocket.close', 'code': SLOW_CONSUMER_CLOSE_CODE})
+        await transport.disconnect()
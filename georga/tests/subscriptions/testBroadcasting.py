@@ -0,0 +1,99 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import asyncio
+from unittest.mock import patch
+
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from ...broadcasting import BroadcastBuffer, broadcasts
+from ...schemas import TestSubscription
+
+GROUP = "TestSubscriptionEvents"  # group of TestSubscription
+MUTATION = """
+    mutation ($message: String!) {
+        testSubscriptionEvent(message: $message) {
+            response
+        }
+    }
+"""
+
+
+class BroadcastBufferTestCase(TestCase):
+    def setUp(self):
+        self.buffer = BroadcastBuffer()
+        patcher = patch.object(self.buffer, 'send')
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def payloads(self, call):
+        return [message['payload'] for _layer, _group, message in call.args[0]]
+
+    def test_commit(self):
+        """broadcasts are sent after the commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.buffer.add(TestSubscription, GROUP, "message")
+                self.send.assert_not_called()
+        self.send.assert_called_once()
+
+    def test_rollback(self):
+        """broadcasts of rolled back savepoints are dropped"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.add(TestSubscription, GROUP, "committed")
+            try:
+                with transaction.atomic():
+                    self.buffer.add(TestSubscription, GROUP, "rolled back")
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(self.send.call_count, 1)
+        self.assertEqual(len(self.payloads(self.send.call_args)), 1)
+
+    def test_batch(self):
+        """committed broadcasts of a batch are sent with one call"""
+        with self.buffer.batch():
+            with self.captureOnCommitCallbacks(execute=True):
+                for message in ["first", "second"]:
+                    self.buffer.add(TestSubscription, GROUP, message)
+                with self.buffer.batch():
+                    self.buffer.add(TestSubscription, GROUP, "nested")
+            self.send.assert_not_called()
+        self.send.assert_called_once()
+        self.assertEqual(len(self.payloads(self.send.call_args)), 3)
+
+
+class BroadcastSendTestCase(SimpleTestCase):
+    def setUp(self):
+        self.buffer = BroadcastBuffer()
+        patcher = patch.object(self.buffer, 'group_send', side_effect=ConnectionError)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failing_send(self):
+        """failing channel layer calls are logged"""
+        with self.assertLogs('georga.broadcasting', level='ERROR'):
+            self.buffer.send([BroadcastBuffer.message(TestSubscription, GROUP, "message")])
+
+    def test_failing_task(self):
+        """failing send tasks are logged and released"""
+        async def send():
+            self.buffer.send([BroadcastBuffer.message(TestSubscription, GROUP, "message")])
+            self.assertEqual(len(self.buffer.tasks), 1)
+            await asyncio.gather(*self.buffer.tasks, return_exceptions=True)
+        with self.assertLogs('georga.broadcasting', level='ERROR'):
+            asyncio.run(send())
+        self.assertSetEqual(self.buffer.tasks, set())
+
+
+class BroadcastRequestTestCase(TransactionTestCase):
+    def test_batched_mutations(self):
+        """broadcasts of the mutations of a request are sent with one call"""
+        with patch.object(broadcasts, 'send') as send:
+            response = self.client.post("/graphql", [
+                {'id': str(n), 'query': MUTATION, 'variables': {'message': str(n)}} for n in range(3)
+            ], content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        send.assert_called_once()
+        self.assertEqual(len(send.call_args.args[0]), 3)
@@ -0,0 +1,112 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import threading
+from contextlib import contextmanager
+from os import listdir
+from os.path import isfile, join
+
+from django.test import SimpleTestCase
+from graphql_jwt.testcases import JSONWebTokenTestCase
+
+from ...coalescing import ChangeCoalescer
+from ...models import Person
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+
+
+class ChangeCoalescerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.sent = []
+        self.coalescer = ChangeCoalescer(window=60)
+
+    def tearDown(self):
+        if self.coalescer.timer:
+            self.coalescer.timer.cancel()
+
+    def send(self, key, state):
+        return lambda action: self.sent.append((key, action, state))
+
+    def test_latest_state(self):
+        """changes of the same object within the window are sent once with the latest state"""
+        for state in range(3):
+            self.coalescer.add('shift', 'UPDATED', self.send('shift', state))
+        self.coalescer.add('role', 'UPDATED', self.send('role', 0))
+        self.assertListEqual(self.sent, [])
+        self.coalescer.flush()
+        self.assertListEqual(self.sent, [('shift', 'UPDATED', 2), ('role', 'UPDATED', 0)])
+        self.assertDictEqual(self.coalescer.metrics, {
+            'events': 4, 'coalesced': 2, 'sent': 2, 'pending': 0})
+
+    def test_actions(self):
+        """created objects stay created, deletions win"""
+        self.coalescer.add('shift', 'CREATED', self.send('shift', 0))
+        self.coalescer.add('shift', 'UPDATED', self.send('shift', 1))
+        self.coalescer.add('role', 'UPDATED', self.send('role', 0))
+        self.coalescer.add('role', 'DELETED', self.send('role', 1))
+        self.coalescer.flush()
+        self.assertListEqual(self.sent, [('shift', 'CREATED', 1), ('role', 'DELETED', 1)])
+
+    def test_failing_send(self):
+        """a failing notification does not prevent the others from being sent"""
+        def fail(action):
+            raise RuntimeError(action)
+        self.coalescer.add('shift', 'UPDATED', fail)
+        self.coalescer.add('role', 'UPDATED', self.send('role', 0))
+        with self.assertLogs('georga.coalescing', level='ERROR'):
+            self.coalescer.flush()
+        self.assertListEqual(self.sent, [('role', 'UPDATED', 0)])
+
+    def test_batch(self):
+        """pending changes are sent within one batch"""
+        @contextmanager
+        def batch():
+            self.sent.append('begin')
+            yield
+            self.sent.append('end')
+        coalescer = ChangeCoalescer(window=60, batch=batch)
+        coalescer.add('shift', 'UPDATED', self.send('shift', 0))
+        coalescer.add('role', 'UPDATED', self.send('role', 0))
+        coalescer.flush()
+        self.assertListEqual(self.sent, ['begin', ('shift', 'UPDATED', 0), ('role', 'UPDATED', 0), 'end'])
+
+    def test_window(self):
+        """pending changes are sent after the window"""
+        sent = threading.Event()
+        coalescer = ChangeCoalescer(window=0.01)
+        coalescer.add('shift', 'UPDATED', lambda action: sent.set())
+        self.assertTrue(sent.wait(5))
+        self.assertIsNone(coalescer.timer)
+
+
+class SubscriptionMetricsTestCase(JSONWebTokenTestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+    operation = """
+        query {
+            getSubscriptionMetrics {
+                changeEvents
+                coalescedChanges
+                sentChanges
+                pendingChanges
+                websocketConnections
+                droppedMessages
+                connections {
+                    queuedMessages
+                }
+            }
+        }
+    """
+
+    def test_staff_only(self):
+        """metrics are readable for staff only"""
+        for email, permitted in [("admin@georga.test", True), ("helper.001@georga.test", False)]:
+            with self.subTest(email=email):
+                self.client.authenticate(Person.objects.get(email=email))
+                result = self.client.execute(self.operation)
+                if permitted:
+                    self.assertIsNone(result.errors)
+                    self.assertSetEqual(set(result.data['getSubscriptionMetrics']), {
+                        'changeEvents', 'coalescedChanges', 'sentChanges', 'pendingChanges',
+                        'websocketConnections', 'droppedMessages', 'connections'})
+                else:
+                    self.assertIsNotNone(result.errors)
@@ -0,0 +1,122 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+from os import listdir
+from os.path import isfile, join
+
+from django.test import SimpleTestCase, override_settings
+from graphql_jwt.testcases import JSONWebTokenTestCase
+
+from ...eventlog import EventLog, get_event_log
+from ...models import Participant, Person, Shift
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+ADMIN_USER = "organization.admin.1@frenchbluecircle.test"  # email of organization admin
+HELPER_USER = "helper.001@georga.test"  # email of helper
+
+
+class EventLogTestCase(SimpleTestCase):
+    def test_read_after(self):
+        """only events after the last seen event are returned"""
+        log = EventLog(size=10)
+        ids = [log.append(1, {'n': n}) for n in range(3)]
+        log.append(2, {'n': 3})
+        self.assertEqual(log.read(1), ([(id, {'n': n}) for n, id in enumerate(ids)], True))
+        self.assertEqual(log.read(1, ids[0]), ([(id, {'n': n + 1}) for n, id in enumerate(ids[1:])], True))
+        self.assertEqual(log.read(1, ids[-1]), ([], True))
+
+    def test_bounded(self):
+        """discarded events require a resync"""
+        log = EventLog(size=2)
+        ids = [log.append(1, {'n': n}) for n in range(4)]
+        self.assertEqual(len(log.read(1)[0]), 2)
+        self.assertFalse(log.read(1)[1])
+        self.assertFalse(log.read(1, ids[0])[1])
+        self.assertTrue(log.read(1, ids[1])[1])
+        self.assertFalse(log.read(1, "invalid")[1])
+
+    def test_epoch(self):
+        """ids issued before a restart require a resync"""
+        id = EventLog(size=10).append(1, {'n': 0})
+        log = EventLog(size=10)
+        log.append(1, {'n': 1})
+        self.assertEqual(log.read(1, id), ([], False))
+        self.assertNotEqual(log.read(1)[0][0][0], id)
+
+
+class ListChangeEventsTestCase(JSONWebTokenTestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+    operation = """
+        query ($organization: ID!, $after: String) {
+            listChangeEvents(organization: $organization, after: $after) {
+                events {
+                    eventId
+                    model
+                    action
+                    id
+                    data
+                }
+                lastEventId
+                resync
+            }
+        }
+    """
+
+    def setUp(self):
+        get_event_log.cache_clear()
+
+    def tearDown(self):
+        get_event_log.cache_clear()
+
+    def save(self, instance):
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+
+    def list_change_events(self, email, organization, after=None):
+        self.client.authenticate(Person.objects.get(email=email))
+        result = self.client.execute(self.operation, variables={
+            'organization': organization.gid, 'after': after})
+        self.assertIsNone(result.errors)
+        return result.data['listChangeEvents']
+
+    def test_missed_events(self):
+        """missed events are returned after the last seen event"""
+        shifts = Shift.objects.filter(
+            task__operation__project__organization__persons_subscribed__email=HELPER_USER)[:2]
+        organization = shifts[0].task.operation.project.organization
+        self.save(shifts[0])
+        seen = self.list_change_events(HELPER_USER, organization)
+        self.assertEqual(len(seen['events']), 1)
+        self.save(shifts[1])
+        missed = self.list_change_events(HELPER_USER, organization, seen['lastEventId'])
+        self.assertFalse(missed['resync'])
+        self.assertListEqual([event['id'] for event in missed['events']], [shifts[1].gid])
+        self.assertEqual(missed['events'][0]['model'], 'Shift')
+        self.assertEqual(missed['events'][0]['action'], 'UPDATED')
+        self.assertEqual(missed['lastEventId'], missed['events'][0]['eventId'])
+
+    def test_permitted_events(self):
+        """participant events are returned only to admins and the participating person"""
+        participant = Participant.objects.filter(
+            shift__task__operation__project__organization__persons_subscribed__email=ADMIN_USER
+        ).exclude(person__email=HELPER_USER).first()
+        organization = participant.shift.task.operation.project.organization
+        self.save(participant)
+        events = self.list_change_events(ADMIN_USER, organization)['events']
+        self.assertListEqual([event['id'] for event in events], [participant.gid])
+        if organization.id in Person.objects.get(email=HELPER_USER).organization_ids:
+            self.assertListEqual(self.list_change_events(HELPER_USER, organization)['events'], [])
+
+    @override_settings(SUBSCRIPTION_EVENT_LOG_SIZE=2)
+    def test_resync(self):
+        """a resync is required if missed events were discarded"""
+        shifts = Shift.objects.filter(
+            task__operation__project__organization__persons_subscribed__email=HELPER_USER)[:3]
+        organization = shifts[0].task.operation.project.organization
+        self.save(shifts[0])
+        seen = self.list_change_events(HELPER_USER, organization)
+        self.save(shifts[1])
+        self.save(shifts[2])
+        self.save(shifts[0])
+        missed = self.list_change_events(HELPER_USER, organization, seen['lastEventId'])
+        self.assertTrue(missed['resync'])
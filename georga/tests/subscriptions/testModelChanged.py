@@ -0,0 +1,290 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import asyncio
+from datetime import timedelta
+from os import listdir
+from os.path import isfile, join
+from unittest.mock import patch
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels_graphql_ws.client import GraphqlWsClient, GraphqlWsResponseError
+from channels_graphql_ws.testing import GraphqlWsTransport
+from django.test import TestCase
+from django.urls import path
+from django.utils import timezone
+
+from ...asgi import MyGraphqlWsConsumer
+from ...broadcasting import broadcasts
+from ...models import Message, Organization, Participant, Person, Role, Shift, Task
+from ...schemas import MessageChangedSubscription, ParticipantChangedSubscription, ShiftChangedSubscription
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+ADMIN_USER = "organization.admin.1@frenchbluecircle.test"  # email of organization admin
+HELPER_USER = "helper.001@georga.test"  # email of helper
+
+SHIFT_CHANGED = """
+    subscription ($organization: ID, $operation: ID) {
+        shiftChanged(organization: $organization, operation: $operation) {
+            action
+            id
+            task
+            state
+        }
+    }
+"""
+PARTICIPANT_CHANGED = """
+    subscription ($organization: ID, $operation: ID) {
+        participantChanged(organization: $organization, operation: $operation) {
+            action
+            id
+            acceptance
+        }
+    }
+"""
+
+
+def application(user):
+    """Returns the websocket application with the authenticated user."""
+    router = URLRouter([path("graphql", MyGraphqlWsConsumer.as_asgi())])
+
+    async def app(scope, receive, send):
+        return await router(dict(scope, user=user), receive, send)
+    return app
+
+
+class ModelChangedSubscriptionTestCase(TestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+
+    def committed(self, func):
+        """Returns func for async tests, executing its on_commit callbacks."""
+        @database_sync_to_async
+        def run(*args, **kwargs):
+            with self.captureOnCommitCallbacks(execute=True):
+                return func(*args, **kwargs)
+        return run
+
+    async def connect(self, email):
+        user = await database_sync_to_async(Person.objects.get)(email=email)
+        client = GraphqlWsClient(GraphqlWsTransport(application(user), "graphql"))
+        await client.connect_and_init()
+        return client
+
+    async def subscribe(self, client, query, variables, subscription, group):
+        """Subscribes and waits for the subscription to join the group."""
+        msg_id = await client.subscribe(query, variables=variables, wait_confirmation=False)
+        # subscribe() of the subscription is executed asynchronously
+        group = subscription._group_name(group)
+        async with asyncio.timeout(5):
+            while not get_channel_layer().groups.get(group):
+                await asyncio.sleep(0.01)
+        return msg_id
+
+    async def test_shift_changed(self):
+        """shift changes are published to the organization and operation of the shift"""
+        shift = await database_sync_to_async(
+            Shift.objects.select_related('task__operation__project__organization').first)()
+        operation = shift.task.operation
+        organization = operation.project.organization
+        for variables, group in [
+            ({'organization': organization.gid}, f"organization.{organization.id}"),
+            ({'operation': operation.gid}, f"operation.{operation.id}"),
+        ]:
+            with self.subTest(variables=variables):
+                client = await self.connect(HELPER_USER)
+                msg_id = await self.subscribe(
+                    client, SHIFT_CHANGED, variables, ShiftChangedSubscription, group)
+                await self.committed(shift.save)()
+                response = await client.receive(assert_id=msg_id, assert_type="data")
+                self.assertDictEqual(response['data']['shiftChanged'], {
+                    'action': 'UPDATED',
+                    'id': shift.gid,
+                    'task': shift.task.gid,
+                    'state': shift.state,
+                })
+                await client.finalize()
+
+    async def test_shift_changed_all_organizations(self):
+        """without filter, clients join the groups of all their organizations"""
+        user = await database_sync_to_async(Person.objects.get)(email=HELPER_USER)
+        organization_ids = await database_sync_to_async(lambda: user.organization_ids)()
+        shift = await database_sync_to_async(Shift.objects.filter(
+            task__operation__project__organization__in=organization_ids).last)()
+        organization_id = await database_sync_to_async(lambda: shift.task.operation.project.organization_id)()
+        client = await self.connect(HELPER_USER)
+        msg_id = await self.subscribe(
+            client, SHIFT_CHANGED, {}, ShiftChangedSubscription, f"organization.{organization_id}")
+        await self.committed(shift.save)()
+        response = await client.receive(assert_id=msg_id, assert_type="data")
+        self.assertEqual(response['data']['shiftChanged']['id'], shift.gid)
+        await client.finalize()
+
+    async def test_shift_changed_other_operation(self):
+        """changes in other operations are not published"""
+        shift = await database_sync_to_async(Shift.objects.select_related('task__operation').first)()
+        other = await database_sync_to_async(
+            Shift.objects.exclude(task__operation=shift.task.operation).first)()
+        operation = shift.task.operation
+        client = await self.connect(ADMIN_USER)
+        msg_id = await self.subscribe(
+            client, SHIFT_CHANGED, {'operation': operation.gid},
+            ShiftChangedSubscription, f"operation.{operation.id}")
+        await self.committed(other.save)()
+        await self.committed(shift.save)()
+        response = await client.receive(assert_id=msg_id, assert_type="data")
+        self.assertEqual(response['data']['shiftChanged']['id'], shift.gid)
+        await client.finalize()
+
+    async def test_subscription_not_permitted(self):
+        """subscriptions to foreign organizations and admin only scopes are denied"""
+        user = await database_sync_to_async(Person.objects.get)(email=HELPER_USER)
+        organization_ids = await database_sync_to_async(lambda: user.organization_ids)()
+        foreign = await database_sync_to_async(
+            Organization.objects.exclude(id__in=organization_ids).first)()
+        participant = await database_sync_to_async(
+            Participant.objects.select_related('shift__task__operation').first)()
+        for query, variables in [
+            (PARTICIPANT_CHANGED, {'organization': foreign.gid}),
+            (SHIFT_CHANGED, {'organization': foreign.gid}),
+            (SHIFT_CHANGED, {'organization': foreign.gid, 'operation': participant.shift.task.operation.gid}),
+            (PARTICIPANT_CHANGED, {'operation': participant.shift.task.operation.gid}),
+        ]:
+            with self.subTest(variables=variables):
+                client = await self.connect(HELPER_USER)
+                msg_id = await client.subscribe(query, variables=variables, wait_confirmation=False)
+                with self.assertRaises(GraphqlWsResponseError):
+                    await client.receive(assert_id=msg_id)
+                await client.finalize()
+
+    async def test_participant_deleted(self):
+        """participant deletions are published to admins of the operation"""
+        participant = await database_sync_to_async(
+            Participant.objects.select_related('shift__task__operation').filter(
+                shift__task__operation__project__organization__persons_subscribed__email=ADMIN_USER).first)()
+        participant_gid = participant.gid
+        operation = participant.shift.task.operation
+        client = await self.connect(ADMIN_USER)
+        msg_id = await self.subscribe(
+            client, PARTICIPANT_CHANGED, {'operation': operation.gid},
+            ParticipantChangedSubscription, f"operation.{operation.id}.admin")
+        await self.committed(participant.delete)()
+        response = await client.receive(assert_id=msg_id, assert_type="data")
+        self.assertEqual(response['data']['participantChanged']['action'], 'DELETED')
+        self.assertEqual(response['data']['participantChanged']['id'], participant_gid)
+        await client.finalize()
+
+    async def test_participant_changed_person(self):
+        """participants are published to the participating person"""
+        participant = await database_sync_to_async(
+            Participant.objects.select_related('person').filter(person__email=HELPER_USER).first)()
+        client = await self.connect(HELPER_USER)
+        msg_id = await self.subscribe(
+            client, PARTICIPANT_CHANGED, {}, ParticipantChangedSubscription, f"person.{participant.person.id}")
+        await self.committed(participant.save)()
+        response = await client.receive(assert_id=msg_id, assert_type="data")
+        self.assertEqual(response['data']['participantChanged']['id'], participant.gid)
+        await client.finalize()
+
+    async def receive_all(self, client, msg_id, field, count):
+        """Returns the actions by id of `count` notifications."""
+        actions = {}
+        for _ in range(count):
+            response = await client.receive(assert_id=msg_id, assert_type="data")
+            actions[response['data'][field]['id']] = response['data'][field]['action']
+        return actions
+
+    async def test_shifts_created_in_bulk(self):
+        """shifts created with bulk operations are published"""
+        task = await database_sync_to_async(Task.objects.select_related('operation').first)()
+        operation = task.operation
+        client = await self.connect(ADMIN_USER)
+        msg_id = await self.subscribe(
+            client, SHIFT_CHANGED, {'operation': operation.gid},
+            ShiftChangedSubscription, f"operation.{operation.id}")
+        start = timezone.now() + timedelta(days=1)
+        shifts = await self.committed(task.create_shifts)([
+            {'start_time': start + timedelta(days=day), 'end_time': start + timedelta(days=day, hours=8)}
+            for day in range(2)
+        ])
+        actions = await self.receive_all(client, msg_id, 'shiftChanged', len(shifts))
+        self.assertDictEqual(actions, {shift.gid: 'CREATED' for shift in shifts})
+        await client.finalize()
+
+    async def test_shifts_soft_deleted_in_cascade(self):
+        """shifts flagged by the soft deletion cascade of their task are published"""
+        task = await database_sync_to_async(
+            Task.objects.select_related('operation').filter(shift__isnull=False).first)()
+        operation = task.operation
+        shifts = await database_sync_to_async(lambda: [shift.gid for shift in Shift.objects.filter(task=task)])()
+        client = await self.connect(ADMIN_USER)
+        msg_id = await self.subscribe(
+            client, SHIFT_CHANGED, {'operation': operation.gid},
+            ShiftChangedSubscription, f"operation.{operation.id}")
+        await self.committed(task.delete)()
+        actions = await self.receive_all(client, msg_id, 'shiftChanged', len(shifts))
+        self.assertDictEqual(actions, {gid: 'DELETED' for gid in shifts})
+        await client.finalize()
+
+    async def test_participants_transitioned_in_bulk(self):
+        """participants transitioned with one update are published"""
+        participant = await database_sync_to_async(
+            Participant.objects.select_related('shift__task__operation').filter(
+                shift__task__operation__project__organization__persons_subscribed__email=ADMIN_USER,
+                admin_acceptance='PENDING').first)()
+        operation = participant.shift.task.operation
+        client = await self.connect(ADMIN_USER)
+        msg_id = await self.subscribe(
+            client, PARTICIPANT_CHANGED, {'operation': operation.gid},
+            ParticipantChangedSubscription, f"operation.{operation.id}.admin")
+        await self.committed(Participant.bulk_transition)(
+            Participant.objects.filter(pk=participant.pk), 'admin_accept')
+        response = await client.receive(assert_id=msg_id, assert_type="data")
+        self.assertEqual(response['data']['participantChanged']['action'], 'UPDATED')
+        self.assertEqual(response['data']['participantChanged']['id'], participant.gid)
+        await client.finalize()
+
+    def test_admin_groups(self):
+        """admins join only the topmost level of their admin rights"""
+        user = Person.objects.get(email=ADMIN_USER)
+        organization_ids = user.admin_organization_ids
+        self.assertTrue(organization_ids)
+        groups = ParticipantChangedSubscription.get_groups(user)
+        self.assertCountEqual(groups, [
+            f"person.{user.id}",
+            *(f"organization.{id}.admin" for id in organization_ids),
+        ])
+        self.assertCountEqual(ShiftChangedSubscription.get_groups(user), [
+            f"organization.{id}" for id in user.organization_ids])
+
+    def test_message_scopes(self):
+        """scopes of messages are fetched for all models of their scopes"""
+        shift = Shift.objects.select_related('task__operation__project').first()
+        task = shift.task
+        operation = task.operation
+        project = operation.project
+        expected = (project.organization_id, project.id, operation.id)
+        messages = [Message(scope=scope) for scope in [project.organization, project, operation, task, shift]]
+        with self.assertNumQueries(4):
+            scopes = MessageChangedSubscription.get_scopes(messages)
+        self.assertListEqual(scopes, [
+            (project.organization_id, None, None), (project.organization_id, project.id, None),
+            expected, expected, expected])
+
+    def test_cascade_without_instances(self):
+        """soft deletion cascades broadcast the descendants without loading them as instances"""
+        task = Task.objects.filter(shift__isnull=False).first()
+        shifts = [shift.gid for shift in Shift.objects.filter(task=task)]
+        loaded = [patch.object(model, 'from_db', side_effect=AssertionError) for model in [Shift, Role, Participant]]
+        for patcher in loaded:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        with patch.object(broadcasts, 'add') as add, self.captureOnCommitCallbacks(execute=True):
+            task.delete()
+        changes = {
+            payload['fields']['id']: payload['fields']['action']
+            for subscription, _group, payload in (call.args for call in add.call_args_list)
+            if subscription is ShiftChangedSubscription
+        }
+        self.assertDictEqual(changes, {gid: 'DELETED' for gid in shifts})
@@ -0,0 +1,134 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import asyncio
+import time
+from os import listdir
+from os.path import isfile, join
+from unittest.mock import patch
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels_graphql_ws.client import GraphqlWsClient
+from channels_graphql_ws.testing import GraphqlWsTransport
+from django.test import SimpleTestCase, TestCase
+from graphql_jwt.exceptions import PermissionDenied
+
+from ...models import Operation, Person
+from ...presence import Presence, get_presence
+from ...schemas import PresenceChangedSubscription, list_present_persons
+from .testModelChanged import application
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+ADMIN_USER = "organization.admin.1@frenchbluecircle.test"  # email of organization admin
+HELPER_USER = "helper.001@georga.test"  # email of helper
+
+PRESENCE_CHANGED = """
+    subscription ($operation: ID!) {
+        presenceChanged(operation: $operation) {
+            action
+            person
+        }
+    }
+"""
+
+
+class PresenceTestCase(SimpleTestCase):
+    def test_connections(self):
+        """persons are online as long as any of their connections is present"""
+        presence = Presence(ttl=60)
+        self.assertEqual(presence.touch(1, 10, "a"), (True, set()))
+        self.assertEqual(presence.touch(1, 10, "b"), (False, set()))
+        self.assertEqual(presence.touch(1, 10, "a"), (False, set()))
+        self.assertEqual(presence.touch(1, 20, "c"), (True, set()))
+        self.assertSetEqual(presence.online(1), {10, 20})
+        self.assertSetEqual(presence.online(2), set())
+        self.assertEqual(presence.leave(1, 10, "a"), (False, set()))
+        self.assertEqual(presence.leave(1, 10, "b"), (True, set()))
+        self.assertSetEqual(presence.online(1), {20})
+
+    def test_leave_absent(self):
+        """persons leave only by removing a present connection"""
+        presence = Presence(ttl=60)
+        self.assertEqual(presence.leave(1, 10, "a"), (False, set()))
+        presence.touch(1, 10, "a")
+        self.assertEqual(presence.leave(1, 10, "a"), (True, set()))
+        self.assertEqual(presence.leave(1, 10, "a"), (False, set()))
+
+    def test_ttl(self):
+        """entries without heartbeat expire"""
+        presence = Presence(ttl=0.01)
+        presence.touch(1, 10, "a")
+        presence.touch(1, 20, "b")
+        time.sleep(0.02)
+        self.assertSetEqual(presence.online(1), set())
+        self.assertEqual(presence.touch(1, 10, "a"), (True, {10, 20}))
+        self.assertEqual(presence.leave(1, 10, "a"), (True, set()))
+
+
+class PresenceChangedSubscriptionTestCase(TestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+
+    def setUp(self):
+        get_presence.cache_clear()
+
+    def tearDown(self):
+        get_presence.cache_clear()
+
+    def get_operation(self):
+        admin = Person.objects.get(email=ADMIN_USER)
+        helper = Person.objects.get(email=HELPER_USER)
+        return Operation.objects.filter(
+            id__in=admin.admin_operation_ids, project__organization__in=helper.organization_ids).first()
+
+    async def connect(self, email):
+        user = await database_sync_to_async(Person.objects.get)(email=email)
+        client = GraphqlWsClient(GraphqlWsTransport(application(user), "graphql"))
+        await client.connect_and_init()
+        return user, client
+
+    async def test_presence_changed(self):
+        """admins receive the persons going online and offline"""
+        operation = await database_sync_to_async(self.get_operation)()
+        admin, admin_client = await self.connect(ADMIN_USER)
+        msg_id = await admin_client.subscribe(
+            PRESENCE_CHANGED, variables={'operation': operation.gid}, wait_confirmation=False)
+        group = PresenceChangedSubscription._group_name(f"presence.{operation.id}")
+        async with asyncio.timeout(5):
+            while not get_channel_layer().groups.get(group):
+                await asyncio.sleep(0.01)
+
+        helper, helper_client = await self.connect(HELPER_USER)
+        await helper_client.subscribe(
+            PRESENCE_CHANGED, variables={'operation': operation.gid}, wait_confirmation=False)
+        response = await admin_client.receive(assert_id=msg_id, assert_type="data")
+        self.assertDictEqual(response['data']['presenceChanged'], {'action': 'JOINED', 'person': helper.gid})
+        persons = await database_sync_to_async(list_present_persons)(admin, operation.gid)
+        self.assertListEqual(sorted(person.person for person in persons), sorted([admin.gid, helper.gid]))
+
+        await helper_client.finalize()
+        response = await admin_client.receive(assert_id=msg_id, assert_type="data")
+        self.assertDictEqual(response['data']['presenceChanged'], {'action': 'LEFT', 'person': helper.gid})
+        persons = await database_sync_to_async(list_present_persons)(admin, operation.gid)
+        self.assertListEqual([person.person for person in persons], [admin.gid])
+        await admin_client.finalize()
+
+    def test_expired(self):
+        """admins receive the persons gone offline by expired entries"""
+        operation = self.get_operation()
+        helper = Person.objects.get(email=HELPER_USER)
+        admin = Person.objects.get(email=ADMIN_USER)
+        presence = get_presence()
+        presence.touch(operation.id, helper.id, "helper")
+        presence.operations[operation.id][presence.member(helper.id, "helper")] = 0
+        with patch.object(PresenceChangedSubscription, 'broadcast_presence') as broadcast_presence:
+            PresenceChangedSubscription.join(admin, operation.id, "admin")
+        self.assertListEqual(
+            [(call.args[0], call.args[2]) for call in broadcast_presence.call_args_list],
+            [(helper, 'LEFT'), (admin, 'JOINED')])
+
+    def test_list_present_persons_admins_only(self):
+        """only admins of the operation may list the present persons"""
+        operation = self.get_operation()
+        with self.assertRaises(PermissionDenied):
+            list_present_persons(Person.objects.get(email=HELPER_USER), operation.gid)
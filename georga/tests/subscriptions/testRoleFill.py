@@ -0,0 +1,140 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import asyncio
+from os import listdir
+from os.path import isfile, join
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels_graphql_ws.client import GraphqlWsClient, GraphqlWsResponseError
+from channels_graphql_ws.testing import GraphqlWsTransport
+from django.test import TestCase
+
+from ...models import Participant, Person, Role
+from ...schemas import RoleFillChangedSubscription
+from .testModelChanged import application
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+HELPER_USER = "helper.001@georga.test"  # email of helper
+
+ROLE_FILL_CHANGED = """
+    subscription ($shift: ID, $task: ID, $operation: ID) {
+        roleFillChanged(shift: $shift, task: $task, operation: $operation) {
+            role
+            participantsAccepted
+            participantsDeclined
+            participantsPending
+        }
+    }
+"""
+
+
+class RoleFillChangedSubscriptionTestCase(TestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+
+    def test_fill_state(self):
+        """fill states match the participant counts of RoleManager"""
+        for acceptance, admin_acceptance, state in [
+            ('ACCEPTED', 'NONE', 'accepted'),
+            ('ACCEPTED', 'ACCEPTED', 'accepted'),
+            ('ACCEPTED', 'PENDING', 'pending'),
+            ('PENDING', 'PENDING', 'pending'),
+            ('PENDING', 'ACCEPTED', 'pending'),
+            ('DECLINED', 'ACCEPTED', 'declined'),
+            ('ACCEPTED', 'DECLINED', 'declined'),
+            ('PENDING', 'NONE', None),
+        ]:
+            with self.subTest(acceptance=acceptance, admin_acceptance=admin_acceptance):
+                self.assertEqual(Participant.fill_state(acceptance, admin_acceptance), state)
+
+    def get_participant(self, **filters):
+        user = Person.objects.get(email=HELPER_USER)
+        return Participant.objects.select_related('role__shift').filter(
+            role__shift__isnull=False,
+            role__shift__task__operation__project__organization__in=user.organization_ids,
+            **filters).first()
+
+    def committed(self, func):
+        """Returns func for async tests, executing its on_commit callbacks."""
+        @database_sync_to_async
+        def run(*args, **kwargs):
+            with self.captureOnCommitCallbacks(execute=True):
+                return func(*args, **kwargs)
+        return run
+
+    async def connect(self):
+        user = await database_sync_to_async(Person.objects.get)(email=HELPER_USER)
+        client = GraphqlWsClient(GraphqlWsTransport(application(user), "graphql"))
+        await client.connect_and_init()
+        return client
+
+    async def subscribe_shift(self, shift):
+        """Subscribes to the roles of the shift and waits for the group."""
+        client = await self.connect()
+        msg_id = await client.subscribe(ROLE_FILL_CHANGED, variables={'shift': shift.gid}, wait_confirmation=False)
+        group = RoleFillChangedSubscription._group_name(f"roles.shift.{shift.id}")
+        async with asyncio.timeout(5):
+            while not get_channel_layer().groups.get(group):
+                await asyncio.sleep(0.01)
+        return client, msg_id
+
+    async def test_role_fill_changed_transition(self):
+        """transitions of participants push the deltas of the fill levels"""
+        participant = await database_sync_to_async(self.get_participant)(
+            acceptance='PENDING', admin_acceptance='ACCEPTED')
+        client, msg_id = await self.subscribe_shift(participant.role.shift)
+
+        def accept():
+            participant.accept()
+            participant.save()
+        await self.committed(accept)()
+        response = await client.receive(assert_id=msg_id, assert_type="data")
+        self.assertDictEqual(response['data']['roleFillChanged'], {
+            'role': participant.role.gid,
+            'participantsAccepted': 1,
+            'participantsDeclined': 0,
+            'participantsPending': -1,
+        })
+        await client.finalize()
+
+    async def test_role_fill_changed_bulk_transition(self):
+        """bulk transitions push the summed deltas per role"""
+        participant = await database_sync_to_async(self.get_participant)(
+            acceptance='ACCEPTED', admin_acceptance='PENDING')
+        client, msg_id = await self.subscribe_shift(participant.role.shift)
+        queryset = Participant.objects.filter(
+            role=participant.role, acceptance='ACCEPTED', admin_acceptance='PENDING')
+        count = await database_sync_to_async(queryset.count)()
+        await self.committed(Participant.bulk_transition)(queryset, 'admin_decline')
+        response = await client.receive(assert_id=msg_id, assert_type="data")
+        self.assertDictEqual(response['data']['roleFillChanged'], {
+            'role': participant.role.gid,
+            'participantsAccepted': 0,
+            'participantsDeclined': count,
+            'participantsPending': -count,
+        })
+        await client.finalize()
+
+    async def test_role_fill_changed_create_delete(self):
+        """created and deleted participants push the deltas of the fill levels"""
+        participant = await database_sync_to_async(self.get_participant)()
+        client, msg_id = await self.subscribe_shift(participant.role.shift)
+        role = await database_sync_to_async(Role.objects.get)(pk=participant.role_id)
+        person = await database_sync_to_async(Person.objects.exclude(participant__role=role).first)()
+        created = await self.committed(Participant.objects.create)(
+            role=role, shift_id=role.shift_id, person=person, acceptance='DECLINED')
+        response = await client.receive(assert_id=msg_id, assert_type="data")
+        self.assertEqual(response['data']['roleFillChanged']['participantsDeclined'], 1)
+        await self.committed(created.delete)()
+        response = await client.receive(assert_id=msg_id, assert_type="data")
+        self.assertEqual(response['data']['roleFillChanged']['participantsDeclined'], -1)
+        await client.finalize()
+
+    async def test_role_fill_changed_scope_required(self):
+        """exactly one of shift, task or operation has to be provided"""
+        client = await self.connect()
+        msg_id = await client.subscribe(ROLE_FILL_CHANGED, variables={}, wait_confirmation=False)
+        with self.assertRaises(GraphqlWsResponseError):
+            await client.receive(assert_id=msg_id)
+        await client.finalize()
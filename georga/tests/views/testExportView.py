@@ -0,0 +1,74 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+import csv
+import json
+from io import StringIO
+from os import listdir
+from os.path import isfile, join
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.shortcuts import get_token
+
+from ...models import Operation, Organization, Participant, Person
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+ORGANIZATION_ADMIN_USER = "organization.admin.1@frenchbluecircle.test"  # email of organization admin
+
+
+class ExportViewTestCase(TestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+
+    def get(self, url, user=None):
+        headers = {}
+        if user:
+            headers = {jwt_settings.JWT_AUTH_HEADER_NAME: (
+                f"{jwt_settings.JWT_AUTH_HEADER_PREFIX} {get_token(user)}"
+            )}
+        return self.client.get(url, **headers)
+
+    def test_login_required(self):
+        """non authenticated user gets an authentication error"""
+        operation = Operation.objects.first()
+        response = self.get(f"/export/operation/{operation.gid}/participants.csv")
+        self.assertEqual(response.status_code, 401)
+
+    def test_unknown_format(self):
+        """unknown formats are not found"""
+        operation = Operation.objects.first()
+        user = Person.objects.get(email=ORGANIZATION_ADMIN_USER)
+        response = self.get(f"/export/operation/{operation.gid}/participants.xml", user)
+        self.assertEqual(response.status_code, 404)
+
+    def test_participants_csv(self):
+        """permitted participants of an operation are streamed as csv"""
+        for email in [ORGANIZATION_ADMIN_USER, "helper.001@georga.test"]:
+            user = Person.objects.get(email=email)
+            operation = Operation.objects.filter(task__shift__participant__isnull=False).first()
+            expected = Participant.filter_permitted(user, 'read').filter(shift__task__operation=operation)
+            with self.subTest(user=user):
+                response = self.get(f"/export/operation/{operation.gid}/participants.csv", user)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.streaming)
+                rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+                self.assertSetEqual({row['uuid'] for row in rows}, {str(p.uuid) for p in expected})
+                self.assertEqual(len(rows), expected.count())
+
+    def test_subscribers_ndjson(self):
+        """permitted subscribers of an organization are streamed as ndjson"""
+        user = Person.objects.get(email=ORGANIZATION_ADMIN_USER)
+        organization = Organization.objects.filter(persons_subscribed__isnull=False).first()
+        expected = Person.filter_permitted(user, 'read').filter(organizations_subscribed=organization)
+        with CaptureQueriesContext(connection) as context:
+            response = self.get(f"/export/organization/{organization.gid}/subscribers.ndjson", user)
+            lines = b"".join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertTrue(rows)
+        self.assertSetEqual({row['email'] for row in rows}, set(expected.values_list('email', flat=True)))
+        # assert one query for all rows
+        exports = [query for query in context.captured_queries
+                   if 'georga_person_organizations_subscribed' in query['sql']]
+        self.assertEqual(len(exports), 1)
@@ -0,0 +1,123 @@
+# For copyright and license terms, see COPYRIGHT.md (top level of repository)
+# Repository: https://github.com/georga-app/georga-server-django
+
+from os import listdir
+from os.path import isfile, join
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.shortcuts import get_token
+
+from ...models import Person
+
+FIXTURES_DIR = join("georga", "fixtures")  # fixtures directory
+SUPERADMIN_USER = "admin@georga.test"  # email of superadmin user
+
+
+class GraphQLViewTestCase(TestCase):
+    fixtures = sorted([f for f in listdir(FIXTURES_DIR) if isfile(join(FIXTURES_DIR, f))])
+
+    def setUp(self):
+        user = Person.objects.get(email=SUPERADMIN_USER)
+        self.headers = {
+            jwt_settings.JWT_AUTH_HEADER_NAME: (
+                f"{jwt_settings.JWT_AUTH_HEADER_PREFIX} {get_token(user)}"
+            ),
+        }
+
+    def post(self, data, user=None):
+        headers = self.headers
+        if user:
+            headers = {jwt_settings.JWT_AUTH_HEADER_NAME: (
+                f"{jwt_settings.JWT_AUTH_HEADER_PREFIX} {get_token(user)}"
+            )}
+        return self.client.post(
+            '/graphql', data, content_type="application/json", **headers)
+
+    def test_single_request(self):
+        """single operations return a single result"""
+        # execute operation
+        response = self.post({"query": "{ getPersonProfile { email } }"})
+        # assert single result
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["getPersonProfile"]["email"], SUPERADMIN_USER)
+
+    def test_batch_request(self):
+        """batched operations return a list of results in the same order"""
+        # execute operations
+        response = self.post([
+            {"id": 1, "query": "{ getPersonProfile { email } }"},
+            {"id": 2, "query": "{ listRoles (first: 1) { edges { node { id } } } }"},
+            {"id": 3, "query": "{ invalidField }"},
+        ])
+        # assert results for all operations
+        self.assertEqual(response.status_code, 400)
+        results = response.json()
+        self.assertEqual([result["id"] for result in results], [1, 2, 3])
+        self.assertEqual([result["status"] for result in results], [200, 200, 400])
+        self.assertEqual(results[0]["data"]["getPersonProfile"]["email"], SUPERADMIN_USER)
+        self.assertEqual(len(results[1]["data"]["listRoles"]["edges"]), 1)
+        self.assertIn("errors", results[2])
+
+    @override_settings(GRAPHQL_BATCH_MAX_SIZE=2)
+    def test_batch_max_size(self):
+        """batches exceeding the maximum size are rejected"""
+        # execute operations
+        response = self.post([{"query": "{ getPersonProfile { email } }"}] * 3)
+        # assert error
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("limited", response.json()["errors"][0]["message"])
+
+    @override_settings(GRAPHQL_COALESCING=True)
+    def test_coalesced_reads(self):
+        """identical reads within the freshness window share one execution"""
+        data = {"query": "{ listRoles { edges { node { id name } } } }"}
+        # execute operation twice
+        with CaptureQueriesContext(connection) as first:
+            first_response = self.post(data)
+        with CaptureQueriesContext(connection) as second:
+            second_response = self.post(data)
+        # assert same result with less queries
+        self.assertEqual(first_response.json(), second_response.json())
+        self.assertLess(len(second.captured_queries), len(first.captured_queries))
+
+    def update_role(self):
+        """Returns the read operation of a role and the mutation changing it."""
+        query = {"query": "{ listRoles (first: 1) { edges { node { id name } } } }"}
+        role = self.post(query).json()["data"]["listRoles"]["edges"][0]["node"]
+        mutation = {"query": (
+            f'mutation {{ updateRole (input: {{ id: "{role["id"]}", name: "Changed" }}) {{ errors {{ field }} }} }}'
+        )}
+        return query, mutation
+
+    @override_settings(GRAPHQL_COALESCING=True)
+    def test_coalesced_reads_invalidated(self):
+        """committed mutations discard shared results"""
+        query, mutation = self.update_role()
+        # execute mutation
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post(mutation)
+        # assert result of the mutation
+        response = self.post(query)
+        self.assertEqual(response.json()["data"]["listRoles"]["edges"][0]["node"]["name"], "Changed")
+
+    @override_settings(GRAPHQL_COALESCING=True)
+    def test_coalesced_reads_batch_mutation(self):
+        """reads following a mutation in a batch are not shared"""
+        query, mutation = self.update_role()
+        # execute batch without committing
+        response = self.post([mutation, query])
+        # assert result of the mutation
+        self.assertEqual(response.json()[1]["data"]["listRoles"]["edges"][0]["node"]["name"], "Changed")
+
+    @override_settings(GRAPHQL_COALESCING=True)
+    def test_coalesced_reads_user_scoped(self):
+        """reads of user scoped types are not shared between users"""
+        data = {"query": "{ getPersonProfile { email } }"}
+        for email in [SUPERADMIN_USER, "helper.001@georga.test"]:
+            # execute operation
+            response = self.post(data, user=Person.objects.get(email=email))
+            # assert result of the user
+            self.assertEqual(response.json()["data"]["getPersonProfile"]["email"], email)
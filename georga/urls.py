@@ -2,15 +2,25 @@
 # Repository: https://github.com/georga-app/georga-server-django
 
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.contrib import admin
 from django.views.decorators.csrf import csrf_exempt
 
 from .schemas import schema
+from .views import (
+    GeorgaGraphQLView,
+    OperationParticipantsExportView,
+    OrganizationSubscribersExportView,
+)
 
 urlpatterns = [
     # GraphQL
-    path('graphql', csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path('graphql', csrf_exempt(GeorgaGraphQLView.as_view(graphiql=True, schema=schema))),
+
+    # Exports
+    path('export/operation/<str:id>/participants.<str:format>',
+         OperationParticipantsExportView.as_view()),
+    path('export/organization/<str:id>/subscribers.<str:format>',
+         OrganizationSubscribersExportView.as_view()),
 
     # Admin view
     path('admin/', admin.site.urls),
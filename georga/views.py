@@ -1,10 +1,263 @@
 # For copyright and license terms, see COPYRIGHT.md (top level of repository)
 # Repository: https://github.com/georga-app/georga-server-django
 
+import csv
+import json
 import logging
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.views import View
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.views import GraphQLView, HttpError
+from graphql import OperationType, get_operation_ast, parse
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_relay import from_global_id
+
+from .broadcasting import broadcasts
+from .coalescing import SingleFlight, coalescing_key
+from .models import Participant, Person
+from .schemas import RequestLoader, UUIDDjangoModelFormMutation
 
 logger = logging.getLogger('forms')
 
+coalesced_reads = SingleFlight(window=settings.GRAPHQL_COALESCING_WINDOW)
+
+
+class GeorgaGraphQLView(GraphQLView):
+    """
+    GraphQLView with support for array-batched requests and coalesced reads.
+
+    A JSON array of operations in the request body is executed as a batch,
+    other requests are executed as usual, so GraphiQL stays available.
+    The response is a JSON array with one result per operation in the same
+    order, each with the `id` of the operation and its `status`.
+
+    Batching:
+    - Shares the request context (user, loaders) for all operations.
+    - Limits the number of operations to `settings.GRAPHQL_BATCH_MAX_SIZE`.
+    - Rolls back mutations with errors only for the affected operation.
+    - Discards request loaders after mutations to avoid stale values.
+
+    Coalescing:
+    - Identical concurrent read operations share one execution, keyed by
+      document hash, variables and permission fingerprint of the user.
+    - Results are shared for `settings.GRAPHQL_COALESCING_WINDOW` seconds.
+    - Shared results are discarded, when a mutation was committed.
+    - Read operations following a mutation in a batch are not coalesced.
+    - Can be disabled via `settings.GRAPHQL_COALESCING`.
+
+    Broadcasting:
+    - Subscription broadcasts of committed mutations are sent at the end of
+      the request with one channel layer call (see `BroadcastBuffer`).
+
+    Idempotency:
+    - Locks of idempotency keys, whose mutation was rolled back, are
+      released at the end of the request.
+
+    Note:
+        Operations are executed sequentially, as the synchronous executor
+        and the database connection of the request are not thread safe.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            with broadcasts.batch():
+                return super().dispatch(request, *args, **kwargs)
+        finally:
+            UUIDDjangoModelFormMutation.release_idempotency_locks(request)
+
+    def parse_body(self, request):
+        # execute a JSON array of operations as a batch
+        self.batch = (
+            self.get_content_type(request) == "application/json"
+            and request.body.lstrip()[:1] == b"["
+        )
+        data = super().parse_body(request)
+        # limit the number of operations
+        if self.batch and len(data) > settings.GRAPHQL_BATCH_MAX_SIZE:
+            raise HttpError(HttpResponseBadRequest(
+                f"Batch requests are limited to {settings.GRAPHQL_BATCH_MAX_SIZE} operations."))
+        return data
+
+    def can_display_graphiql(self, request, data):
+        return not self.batch and super().can_display_graphiql(request, data)
+
+    def get_response(self, request, data, show_graphiql=False):
+        if self.batch and not isinstance(data, dict):
+            raise HttpError(HttpResponseBadRequest(
+                "Batch requests should receive a list of objects."))
+        # roll back mutations with errors only for the affected operation
+        if self.batch:
+            setattr(request, MUTATION_ERRORS_FLAG, False)
+        return super().get_response(request, data, show_graphiql)
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name,
+                                show_graphiql=False):
+        execute = partial(
+            super().execute_graphql_request,
+            request, data, query, variables, operation_name, show_graphiql)
+        # share one execution for identical concurrent read operations
+        key = self._coalescing_key(request, query, variables, operation_name)
+        result = coalesced_reads.do(key, execute) if key else execute()
+        if result and not key and not self._is_query(query, operation_name):
+            # discard shared results read before the mutation
+            request.mutated = True
+            transaction.on_commit(coalesced_reads.invalidate)
+            # discard request loaders after mutations to avoid stale values
+            if self.batch:
+                RequestLoader.reset(request)
+        return result
+
+    def _coalescing_key(self, request, query, variables, operation_name):
+        if not settings.GRAPHQL_COALESCING or not isinstance(query, str):
+            return None
+        # read the own writes of previous operations in the batch
+        if getattr(request, 'mutated', False):
+            return None
+        # authenticate the user in advance to derive the permission fingerprint
+        if not request.user.is_authenticated:
+            try:
+                user = authenticate(request=request)
+            except JSONWebTokenError:
+                return None
+            if user is not None:
+                request.user = user
+        return coalescing_key(
+            self.schema.graphql_schema, request.user, query, variables, operation_name)
+
+    @staticmethod
+    def _is_query(query, operation_name):
+        try:
+            operation_ast = get_operation_ast(parse(query), operation_name)
+        except Exception:
+            return False
+        return operation_ast is not None and operation_ast.operation == OperationType.QUERY
+
+
+class Echo:
+    """
+    Pseudo buffer, which returns written values instead of storing them.
+    """
+    def write(self, value):
+        return value
+
+
+class ExportView(View):
+    """
+    Streaming export of permitted entries as CSV or NDJSON.
+
+    Subclasses define the `model`, the exported `columns` as mapping of column
+    names to lookups and the `scope` as lookup from the model to the uuid of
+    the scope object. The format is given by the `format` URL parameter, the
+    scope object by the GlobalID in the `id` URL parameter.
+
+    Streaming:
+    - Filters the permitted entries once with `Model.filter_permitted()`.
+    - Iterates a server-side cursor in chunks of `settings.EXPORT_CHUNK_SIZE`.
+    - Writes the response row by row, so memory usage stays flat.
+
+    Authentication:
+    - Requires a JWT in the Authorization header or a session.
+    """
+    model = None
+    scope = None
+    columns = {}
+    filename = "export"
+    content_types = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    def get(self, request, id, format):
+        if format not in self.content_types:
+            raise Http404
+        # authenticate the user
+        user = request.user
+        if not user.is_authenticated:
+            try:
+                user = authenticate(request=request)
+            except JSONWebTokenError:
+                user = None
+            if user is None:
+                return HttpResponse("Authentication required.", status=401)
+        # filter the permitted entries
+        try:
+            _type, uuid = from_global_id(id)
+            queryset = self.model.objects.filter(**{self.scope: uuid})
+        except (ValueError, ValidationError):
+            raise Http404
+        permitted = self.model.filter_permitted(user, 'read')
+        queryset = queryset \
+            .filter(pk__in=permitted.values('pk')) \
+            .order_by('pk') \
+            .values_list(*self.columns.values())
+        rows = queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+        # stream the rows
+        response = StreamingHttpResponse(
+            getattr(self, f"stream_{format}")(rows), content_type=self.content_types[format])
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}.{format}"'
+        return response
+
+    def stream_csv(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.columns.keys())
+        for row in rows:
+            yield writer.writerow(row)
+
+    def stream_ndjson(self, rows):
+        for row in rows:
+            yield json.dumps(dict(zip(self.columns, row)), default=str) + "\n"
+
+
+class OperationParticipantsExportView(ExportView):
+    """
+    Export of the participants of an operation.
+    """
+    model = Participant
+    scope = 'shift__task__operation__uuid'
+    filename = "participants"
+    columns = {
+        'uuid': 'uuid',
+        'email': 'person__email',
+        'first_name': 'person__first_name',
+        'last_name': 'person__last_name',
+        'mobile_phone': 'person__mobile_phone',
+        'task': 'shift__task__name',
+        'shift_start_time': 'shift__start_time',
+        'shift_end_time': 'shift__end_time',
+        'role': 'role__name',
+        'acceptance': 'acceptance',
+        'admin_acceptance': 'admin_acceptance',
+    }
+
+
+class OrganizationSubscribersExportView(ExportView):
+    """
+    Export of the persons subscribed to an organization.
+    """
+    model = Person
+    scope = 'organizations_subscribed__uuid'
+    filename = "subscribers"
+    columns = {
+        'uuid': 'uuid',
+        'email': 'email',
+        'title': 'title',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'occupation': 'occupation',
+        'street': 'street',
+        'number': 'number',
+        'postal_code': 'postal_code',
+        'city': 'city',
+        'private_phone': 'private_phone',
+        'mobile_phone': 'mobile_phone',
+    }
+
+
 # class RegistrationDoneView(TemplateView):
 #     template_name = 'django_registration/registration_complete.html'
 #